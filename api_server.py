@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import inspect
+import json
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from cli import resolve_stations, search_fields
+from parts_database import JOURNAL_MODES, ConflictError, PartsDatabase, QueryStats
+
+# PartsDatabase methods POST /batch may call, with their arguments given by name
+WRITE_OPERATIONS = ('store_part', 'edit_part', 'delete_part', 'store_module', 'save_module', 'delete_module',
+                    'store_station', 'save_station', 'delete_station')
+# the results by which those that print their error instead of raising it report a failure
+FAILED_RESULTS = {'save_module': None, 'save_station': None, 'delete_part': False, 'delete_module': False}
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY = 16 * 1024 * 1024
+# rows read from the cursor per chunk of a streamed response
+STREAM_ROWS = 500
+# a sorted search page has at most this many rows, a larger ?limit is cut down to it
+MAX_PAGE_SIZE = 10000
+KEEP_ALIVE_SECONDS = 30
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Rows:
+    # a result sent as {"headers": [...], "rows": [[...], ...]} in chunks straight from the
+    # cursor, so a large search or rollup is never held in memory as a whole
+    def __init__(self, headers, query, params=()):
+        self.headers = headers
+        self.query = query
+        self.params = params
+
+
+class RequestMetrics:
+    # count, errors, latency histogram and in-flight requests per route, served by GET /metrics
+    BUCKETS_MS = QueryStats.BUCKETS_MS
+
+    def __init__(self):
+        self.started = time.time()
+        self.in_flight = 0
+        self.routes = {}
+
+    def record(self, route, status, seconds):
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                          'buckets': [0] * (len(self.BUCKETS_MS) + 1)}
+        ms = seconds * 1000
+        entry['count'] += 1
+        entry['errors'] += status >= 400
+        entry['total_ms'] += ms
+        entry['max_ms'] = max(entry['max_ms'], ms)
+        entry['buckets'][next((i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound), -1)] += 1
+
+    def snapshot(self):
+        routes = {}
+        for route, entry in sorted(self.routes.items()):
+            routes[route] = dict(entry, mean_ms=entry['total_ms'] / entry['count'],
+                                 buckets=dict(zip([f"<={bound}" for bound in self.BUCKETS_MS] + ['inf'],
+                                                  entry['buckets'])))
+        return {'uptime_seconds': time.time() - self.started, 'in_flight': self.in_flight, 'routes': routes}
+
+
+class ApiServer:
+    # Local HTTP/JSON service over a parts database. Reads run on a pool of read-only
+    # (query_only) connections, one request per connection at a time; every write goes through the one
+    # writer connection on its own thread, so writes are serialized here instead of
+    # competing for the database lock. WAL (on a local disk) lets the readers go on while it writes.
+    def __init__(self, path="parts.db", readers=4, stats=None, **pragmas):
+        self.path = path
+        self.stats = stats
+        self.metrics = RequestMetrics()
+        self.writer = PartsDatabase(path, stats=stats, check_same_thread=False, **pragmas)
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='api-writer')
+        self.pending_writes = 0
+        self.readers = [PartsDatabase(path, auto_migrate=False, stats=stats, check_same_thread=False,
+                                      **dict(pragmas, query_only='ON'))
+                        for _ in range(readers)]
+        self._read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='api-reader')
+        self._pool = None
+        self.server = None
+        self.port = None
+        self.routes = [
+            ('GET', re.compile(r'/search/(parts|modules|stations)'), 'GET /search/{table}', self.search),
+            ('GET', re.compile(r'/parts/(\d+)'), 'GET /parts/{id}', self.get_part),
+            ('GET', re.compile(r'/modules/(\d+)'), 'GET /modules/{id}', self.get_module),
+            ('GET', re.compile(r'/stations/(\d+)'), 'GET /stations/{id}', self.get_station),
+            ('GET', re.compile(r'/where-used/(parts|modules)/(\d+)'), 'GET /where-used/{table}/{id}',
+             self.where_used),
+            ('GET', re.compile(r'/rollup'), 'GET /rollup', self.rollup),
+            ('GET', re.compile(r'/similar'), 'GET /similar', self.similar),
+            ('POST', re.compile(r'/batch'), 'POST /batch', self.batch),
+            ('GET', re.compile(r'/metrics'), 'GET /metrics', self.get_metrics),
+        ]
+
+    async def start(self, host='127.0.0.1', port=8765):
+        # port 0 picks a free one, self.port tells which
+        self._pool = asyncio.Queue()
+        for db in self.readers:
+            self._pool.put_nowait(db)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self._read_executor.shutdown()
+        self._write_executor.shutdown()
+        for db in self.readers:
+            db.close()
+        self.writer.close()
+
+    async def read(self, fn, *args):
+        # fn(db, *args) on a pooled read connection
+        db = await self._pool.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._read_executor, fn, db, *args)
+        finally:
+            self._pool.put_nowait(db)
+
+    async def write(self, fn, *args):
+        # fn(db, *args) on the writer connection, after the writes queued before it
+        self.pending_writes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._write_executor, fn, self.writer, *args)
+        finally:
+            self.pending_writes -= 1
+
+    # routes, each returns a json-able result or Rows
+
+    async def search(self, request, table):
+        options = {key: values[-1] for key, values in request['query'].items()}
+        fields_values = search_fields(table, options)
+        sort = options.get('sort')
+        if sort is None:
+            return Rows(PartsDatabase.TABLE_COLUMNS[table], *(await self.read(
+                lambda db: db.search_query(table, fields_values))))
+        # one keyset page, "next" is the "after" of the page that follows
+        after = json.loads(options['after']) if 'after' in options else None
+        if after is not None and not (isinstance(after, list) and len(after) == 2):
+            raise ValueError("after must be the [value, id] \"next\" of the previous page")
+        limit = int(options.get('limit', 256))
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_PAGE_SIZE)
+        rows, cursor = await self.read(lambda db: db.search_page(
+            table, fields_values, sort, options.get('desc') in ('1', 'true'), after, limit))
+        return {'headers': PartsDatabase.TABLE_COLUMNS[table], 'rows': rows, 'next': cursor}
+
+    async def get_part(self, request, part_id):
+        return self.record('parts', await self.read(PartsDatabase.get_part, int(part_id)))
+
+    async def get_module(self, request, module_id):
+        def contents(db):
+            module = self.record('modules', db.get_module(int(module_id)))
+            return dict(module, headers=db.MODULE_CONTENTS_HEADERS, rows=db.search_module_contents(int(module_id)))
+        return await self.read(contents)
+
+    async def get_station(self, request, station_id):
+        def contents(db):
+            station = self.record('stations', db.get_station(int(station_id)))
+            return dict(station, headers=db.STATION_CONTENTS_HEADERS,
+                        rows=db.search_station_contents(int(station_id)))
+        return await self.read(contents)
+
+    async def where_used(self, request, table, row_id):
+        query = PartsDatabase.part_where_used_query if table == 'parts' else PartsDatabase.module_where_used_query
+        return Rows(PartsDatabase.WHERE_USED_HEADERS, *query(int(row_id)))
+
+    async def rollup(self, request):
+        # ?station=ID_OR_NAME[=COUNT], repeated for every station
+        stations = request['query'].get('station')
+        if not stations:
+            raise HttpError(400, "give the stations to roll up as ?station=ID[=COUNT]")
+        demand = await self.read(resolve_stations, stations)
+        return Rows(PartsDatabase.ROLLUP_HEADERS, *PartsDatabase.rollup_query(demand))
+
+    async def similar(self, request):
+        # ?spec=...[&exclude=PART_ID], parts with the same or a close normalized spec
+        spec = request['query'].get('spec', [''])[-1]
+        exclude = request['query'].get('exclude', [None])[-1]
+        matches = await self.read(PartsDatabase.similar_parts, spec, exclude)
+        return {'headers': ('similarity',) + PartsDatabase.TABLE_COLUMNS['parts'],
+                'rows': [(ratio,) + row for ratio, row in matches]}
+
+    async def batch(self, request):
+        # {"operations": [{"op": "store_part", "args": {...}}, ...]} run in one transaction:
+        # an exception, or an operation returning its failure result, rolls all of them
+        # back (409). Returns the result of every operation.
+        operations = request['json'].get('operations')
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+            raise HttpError(400, "the body must be {\"operations\": [{\"op\": ..., \"args\": {...}}, ...]}")
+        for number, operation in enumerate(operations, start=1):
+            op = operation.get('op')
+            if op not in WRITE_OPERATIONS:
+                raise HttpError(400, f"op must be one of {', '.join(WRITE_OPERATIONS)}")
+            args = operation.get('args', {})
+            if not isinstance(args, dict):
+                raise ValueError(f"operation {number} ({op}): args must be an object")
+            try:
+                inspect.signature(getattr(PartsDatabase, op)).bind(None, **args)
+            except TypeError as e:
+                raise ValueError(f"operation {number} ({op}): {e}") from None
+
+        def run(db):
+            results = []
+            with db.transaction():
+                for number, operation in enumerate(operations, start=1):
+                    op = operation['op']
+                    result = getattr(db, op)(**operation.get('args', {}))
+                    if op in FAILED_RESULTS and result is FAILED_RESULTS[op]:
+                        raise HttpError(409, f"operation {number} ({op}) failed, none of the batch was saved")
+                    results.append(result)
+            return results
+        return {'results': await self.write(run)}
+
+    async def get_metrics(self, request):
+        snapshot = self.metrics.snapshot()
+        snapshot['readers'] = {'size': len(self.readers), 'idle': self._pool.qsize()}
+        snapshot['pending_writes'] = self.pending_writes
+        if self.stats is not None:
+            snapshot['queries'] = self.stats.snapshot()
+        return snapshot
+
+    @staticmethod
+    def record(table, row):
+        if row is None:
+            raise KeyError(f"no {table[:-1]} with this id")
+        return dict(zip(PartsDatabase.TABLE_COLUMNS[table], row))
+
+    # http
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # idle, gone, or not speaking http
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader, writer):
+        # Serves one request, returns whether the connection stays open for another.
+        line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+        if not line.strip():
+            return False
+        start = time.perf_counter()
+        method, target, version = line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        url = urlsplit(target)
+        route_name = 'unmatched'
+        self.metrics.in_flight += 1
+        status = 500
+        try:
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                keep_alive = False
+                raise HttpError(413, f"the body is larger than {MAX_BODY} bytes")
+            body = await reader.readexactly(length) if length else b''
+            handler, args, route_name = self.route(method, url.path, route_name)
+            request = {'query': parse_qs(url.query), 'headers': headers,
+                       'json': json.loads(body) if body else {}}
+            if not isinstance(request['json'], dict):
+                raise ValueError("the body must be a json object")
+            result = await handler(request, *args)
+            status = 200
+            if isinstance(result, Rows):
+                await self.send_rows(writer, result)
+            else:
+                await self.send(writer, status, result, keep_alive)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            status, message = self.error_status(e)
+            if status == 500:
+                print(e)
+            await self.send(writer, status, {'error': message}, keep_alive)
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.record(route_name, status, time.perf_counter() - start)
+        return keep_alive
+
+    def route(self, method, path, route_name):
+        allowed = False
+        for route_method, pattern, name, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                if route_method == method:
+                    return handler, match.groups(), name
+                allowed = True
+        if allowed:
+            raise HttpError(405, f"{method} is not allowed on {path}")
+        raise HttpError(404, f"no route for {path}")
+
+    @staticmethod
+    def error_status(e):
+        # bad input is raised as ValueError (or KeyError for a missing row) where the request
+        # is read and a write the data does not allow as ConflictError or IntegrityError,
+        # any other exception is a bug on this side
+        if isinstance(e, HttpError):
+            return e.status, str(e)
+        if isinstance(e, (ConflictError, sqlite3.IntegrityError)):
+            # a stale revision, or a write breaking a UNIQUE / foreign key / NOT NULL constraint
+            return 409, str(e)
+        if isinstance(e, KeyError):
+            return 404, e.args[0] if e.args else str(e)
+        if isinstance(e, ValueError):
+            return 400, str(e)
+        return 500, str(e)
+
+    @staticmethod
+    def encode(value):
+        return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    async def send(self, writer, status, result, keep_alive):
+        body = self.encode(result)
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                     .encode('latin-1') + body)
+        await writer.drain()
+
+    async def send_rows(self, writer, result):
+        # Chunked transfer encoding, one chunk per STREAM_ROWS rows. The read connection is
+        # held until the last row is sent; an error after the headers went out can only
+        # end the response, it is then cut short without the closing chunk.
+        loop = asyncio.get_running_loop()
+        db = await self._pool.get()
+        cursor = None
+        try:
+            cursor = await loop.run_in_executor(self._read_executor, db.conn.execute, result.query, result.params)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=utf-8\r\n"
+                         b"Transfer-Encoding: chunked\r\n\r\n")
+            self.write_chunk(writer, b'{"headers": ' + self.encode(result.headers) + b', "rows": [')
+            first = True
+            try:
+                while True:
+                    rows = await loop.run_in_executor(self._read_executor, cursor.fetchmany, STREAM_ROWS)
+                    if not rows:
+                        break
+                    self.write_chunk(writer, (b'' if first else b', ') + b', '.join(self.encode(row) for row in rows))
+                    first = False
+                    await writer.drain()
+            except sqlite3.Error as e:
+                print(e)
+                raise ConnectionAbortedError(str(e))
+            self.write_chunk(writer, b']}')
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            if cursor is not None:
+                await loop.run_in_executor(self._read_executor, cursor.close)
+            self._pool.put_nowait(db)
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write(f"{len(data):X}\r\n".encode('latin-1') + data + b"\r\n")
+
+
+async def serve(args):
+    stats = QueryStats(slow_ms=args.slow_ms) if args.query_stats else None
+    pragmas = {'journal_mode': args.journal_mode} if args.journal_mode else {}
+    api = await ApiServer(args.db, args.readers, stats, **pragmas).start(args.host, args.port)
+    print(f"serving {args.db} on http://{args.host}:{api.port}", file=sys.stderr)
+    try:
+        await api.server.serve_forever()
+    finally:
+        await api.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local HTTP/JSON API over a parts database.')
+    parser.add_argument('--db', default='parts.db', help='database file (default: parts.db)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--readers', type=int, default=4, help='read connections')
+    parser.add_argument('--query-stats', action='store_true', help='include per-statement timings in /metrics')
+    parser.add_argument('--slow-ms', type=float, default=100, help='log the query plan of statements slower than this')
+    parser.add_argument('--journal-mode', type=str.upper, choices=JOURNAL_MODES,
+                        help='default: DELETE for a database on a network share, WAL otherwise')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    except (sqlite3.Error, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from parts_database import PartsDatabase, normalize_spec
+
+# the module/station view scenarios load the Qt table models, without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+SIZES = {
+    'small': {'parts': 1000, 'modules': 100, 'stations': 10},
+    'medium': {'parts': 100000, 'modules': 10000, 'stations': 500},
+    'large': {'parts': 1000000, 'modules': 10000, 'stations': 1000},
+}
+
+# vocabulary for the synthetic catalog, close to what the real vendor catalogs contain
+PART_NAMES = ['電磁閥', '三通手動閥', '兩通手動閥', '氣缸', '薄型氣缸', '滑台氣缸', '真空吸盤', '真空發生器', '調壓閥',
+              '節流閥', '快速接頭', '消音器', '光電感測器', '近接開關', '壓力感測器', '光纖放大器', '步進馬達',
+              '伺服馬達', '減速機', '線性滑軌', '滾珠螺桿', '聯軸器', '軸承', '導向軸', '同步帶輪', '端子台',
+              '繼電器', '電源供應器', '按鈕開關', '指示燈']
+VENDORS = ['SMC', 'FESTO', 'CKD', '亞德客', 'MISUMI', 'THK', '上銀', 'Omron', 'Keyence', 'Panasonic', 'Oriental Motor',
+           '台達', 'NSK', 'IKO', 'Phoenix Contact']
+DESCRIPTIONS = ['無洩氣', '兩通閥', '三通閥', '接管孔徑Φ6', '接管孔徑Φ8', '接管孔徑Φ10', '耐壓1.0MPa', 'DC24V', 'AC220V',
+                '不鏽鋼', '鋁合金', '附磁石', '雙作動', '單作動', 'NPN輸出', 'PNP輸出', '檢出距離10mm', '防水IP67',
+                '附安裝座', '含導線2m']
+SPEC_PREFIXES = ['VHK', 'SY', 'CDQ2B', 'MXQ', 'ZP', 'AS', 'KQ2', 'E3Z', 'E2E', 'PSE', 'FX', 'HIWIN', 'SFU', 'BK',
+                 'MGN', 'LM']
+CATEGORIES = ['傳感器元件', '氣動元件', '機構元件', '電氣元件']
+BELONGINGS = ['Conveyor', 'Robot', 'Modbus']
+MODULE_WORDS = ['Input_stopper', 'input_lifter', 'Output_stopper', 'Transfer', 'Gripper', 'Buffer', 'Turntable',
+                'Pusher', 'Clamp', 'Vision']
+
+
+def generate(db, parts, modules, stations, parts_per_module=20, modules_per_station=12, seed=1):
+    # Fills an empty database with a reproducible random BOM: the same arguments always
+    # give the same rows.
+    rnd = random.Random(seed)
+    modules_per_station = min(modules_per_station, modules)
+    parts_per_module = min(parts_per_module, parts)
+
+    def part_rows():
+        for i in range(1, parts + 1):
+            prefix = rnd.choice(SPEC_PREFIXES)
+            spec = f"{prefix}{rnd.randint(1, 99)}-{i:07d}{rnd.choice(['F', 'S', 'N', ''])}"
+            yield (rnd.choice(['標準件', '非標準件']),
+                   rnd.choice(PART_NAMES),
+                   rnd.choice(VENDORS),
+                   "，".join(rnd.sample(DESCRIPTIONS, rnd.randint(1, 3))),
+                   spec,
+                   rnd.choice(CATEGORIES),
+                   normalize_spec(spec))
+
+    with db.transaction() as cursor:
+        cursor.executemany('''
+            INSERT INTO parts (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category,
+                               part_spec_norm)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', part_rows())
+        cursor.executemany("INSERT INTO modules (module_name, module_belonging) VALUES (?, ?)",
+                           ((f"{rnd.choice(MODULE_WORDS)}_{i}", rnd.choice(BELONGINGS))
+                            for i in range(1, modules + 1)))
+        cursor.executemany("INSERT INTO modules_parts (module_id, part_id, quantity) VALUES (?, ?, ?)",
+                           ((module_id, part_id, rnd.randint(1, 20))
+                            for module_id in range(1, modules + 1)
+                            for part_id in rnd.sample(range(1, parts + 1), parts_per_module)))
+        cursor.executemany("INSERT INTO stations (station_name) VALUES (?)",
+                           ((f"ST{i:04d}_{rnd.choice(MODULE_WORDS)}",) for i in range(1, stations + 1)))
+        cursor.executemany("INSERT INTO stations_modules (station_id, module_id, quantity) VALUES (?, ?, ?)",
+                           ((station_id, module_id, rnd.randint(1, 4))
+                            for station_id in range(1, stations + 1)
+                            for module_id in rnd.sample(range(1, modules + 1), modules_per_station)))
+    db.conn.execute("ANALYZE")
+
+
+def write_catalog(path, rows, seed=2):
+    rnd = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['標準件/非標準件', '零件名稱', '品牌', '零件描述', '規格型號', '類別'])
+        for i in range(rows):
+            writer.writerow([rnd.choice(['標準件', '非標準件']), rnd.choice(PART_NAMES), rnd.choice(VENDORS),
+                             "，".join(rnd.sample(DESCRIPTIONS, 2)), f"IMP{rnd.randint(1, 99)}-{i:07d}",
+                             rnd.choice(CATEGORIES)])
+
+
+def measure(fn, repeat):
+    times = []
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+        rows = len(result) if isinstance(result, (list, tuple)) else result
+    times.sort()
+    return {
+        'runs': repeat,
+        'min': times[0],
+        'median': statistics.median(times),
+        'p95': times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        'rows': rows,
+    }
+
+
+def scenarios(db, args, workdir):
+    rnd = random.Random(args.seed + 1)
+    module_id = rnd.randint(1, args.modules)
+    station_id = rnd.randint(1, args.stations)
+    station_ids = rnd.sample(range(1, args.stations + 1), min(10, args.stations))
+    # a save that changes the quantity of one part or module, the rest of the contents stays
+    part_id, part_quantity = db.search_module_parts(module_id)[0]
+    station_module_id, module_quantity = db.search_station_modules(station_id)[0]
+    module_change = [[{'id': part_id, 'quantity': part_quantity + 1}], [{'id': part_id, 'quantity': part_quantity}]]
+    station_change = [[{'id': station_module_id, 'quantity': module_quantity + 1}],
+                      [{'id': station_module_id, 'quantity': module_quantity}]]
+    module_name, module_belonging = db.search_module([('module_id', module_id)])[0][1:3]
+    station_name = db.search_station([('station_id', station_id)])[0][1]
+
+    # keyset cursor in the middle of the catalog sorted by name, for a page deep into a sorted search
+    db.cursor.execute("SELECT part_name, part_id FROM parts WHERE part_name IS NOT NULL ORDER BY part_name, part_id "
+                      "LIMIT 1 OFFSET ?", (args.parts // 2,))
+    middle = db.cursor.fetchone()
+    # an existing spec as it might be typed again: other case, spaces for dashes, last character missing
+    similar_spec = db.get_part(rnd.randint(1, args.parts))[5].lower().replace('-', ' ')[:-1]
+
+    def search(fields_values):
+        return lambda: db.search_part_ranked(fields_values)
+
+    def search_first_block(fields_values):
+        # what a search on the part page reads before it can show anything
+        def run():
+            db.search_cache.invalidate('parts')
+            return db.search_cached('parts', fields_values)[0]
+        return run
+
+    def view(load, cached):
+        # cold reads clear the catalog cache first, cached ones are served from it after the first run
+        def run():
+            from main import ModuleTableModel
+            if not cached:
+                db.catalog_cache.clear()
+            model = ModuleTableModel(headers=['h'] * 8, rows=load())
+            model.fetch_all()
+            return model.rowCount()
+        return run
+
+    def save(fn, changes):
+        # alternates between the changed and the original quantity, so every run writes
+        def run():
+            changes.reverse()
+            fn(changes[0])
+            return changes[0]
+        return run
+
+    # what-if batch: many demands of ten stations each, with the counts planning would ask for
+    demands = [{station: rnd.randint(1, 40) for station in rnd.sample(range(1, args.stations + 1),
+                                                                       min(10, args.stations))}
+               for _ in range(args.demands)]
+
+    def rollup_matrix_load():
+        from rollup_matrix import RollupMatrix
+        return RollupMatrix(db).station_parts.nnz
+
+    def rollup_matrix_batch():
+        return db.rollup_matrix().rollup_many(demands).shape[0]
+
+    def import_target():
+        target = os.path.join(workdir, 'import.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)
+        return PartsDatabase(target)
+
+    def import_catalog():
+        catalog = os.path.join(workdir, 'catalog.csv')
+        if not os.path.exists(catalog):
+            write_catalog(catalog, args.import_rows)
+        import_db = import_target()
+        try:
+            return import_db.store_from_excel(catalog)['inserted']
+        finally:
+            import_db.close()
+
+    def import_catalogs_parallel():
+        # the same number of rows spread over 4 files, read by worker processes
+        catalogs = [os.path.join(workdir, f'catalog_{i}.csv') for i in range(4)]
+        for seed, catalog in enumerate(catalogs, start=10):
+            if not os.path.exists(catalog):
+                write_catalog(catalog, args.import_rows // len(catalogs), seed)
+        import_db = import_target()
+        try:
+            return sum(report['inserted'] for report in import_db.import_catalogs(catalogs).values())
+        finally:
+            import_db.close()
+
+    runs = {
+        'search_part_name': search([('part_name', '電磁閥')]),
+        'search_part_vendor_name': search([('part_vendor', 'SMC'), ('part_name', '氣缸')]),
+        'search_part_spec_short': search([('part_spec', 'F')]),
+        'search_part_spec_token': search([('part_spec', '-00012')]),
+        'search_part_first_block': search_first_block((('part_name', '感測器'),)),
+        'search_sorted_first_page': lambda: db.search_page('parts', (), 'part_name')[0],
+        'search_sorted_middle_page': lambda: db.search_page('parts', (), 'part_name', after=middle)[0],
+        'search_sorted_filtered_page': lambda: db.search_page('parts', (('part_vendor', 'SMC'),), 'part_spec')[0],
+        'module_view': view(lambda: db.search_module_contents(module_id), False),
+        'module_view_cached': view(lambda: db.search_module_contents(module_id), True),
+        'station_view': view(lambda: db.search_station_contents(station_id), False),
+        'station_view_cached': view(lambda: db.search_station_contents(station_id), True),
+        'save_module': save(lambda changed: db.save_module(module_id, module_name, module_belonging, changed, []),
+                            module_change),
+        'save_station': save(lambda changed: db.save_station(station_id, station_name, changed, []), station_change),
+        'similar_parts': lambda: db.similar_parts(similar_spec),
+        'rollup_1_station': lambda: db.rollup_stations([station_id]),
+        'rollup_10_stations': lambda: db.rollup_stations(station_ids),
+        'import_csv': import_catalog,
+        'import_csv_parallel': import_catalogs_parallel,
+    }
+    if importlib.util.find_spec('scipy') is not None:
+        runs.update({
+            'rollup_matrix_load': rollup_matrix_load,
+            'rollup_matrix_batch': rollup_matrix_batch,
+        })
+    return runs
+
+
+def compare(results, baseline_path, tolerance):
+    # scenarios whose median got slower than the baseline by more than tolerance
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['scenarios']
+    regressions = []
+    for name, result in results['scenarios'].items():
+        if name in baseline and result['median'] > baseline[name]['median'] * (1 + tolerance):
+            regressions.append((name, baseline[name]['median'], result['median']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark PartsDatabase and the table models on a synthetic BOM.')
+    parser.add_argument('--size', choices=SIZES, default='small', help='preset for --parts/--modules/--stations')
+    parser.add_argument('--parts', type=int)
+    parser.add_argument('--modules', type=int)
+    parser.add_argument('--stations', type=int)
+    parser.add_argument('--parts-per-module', type=int, default=20)
+    parser.add_argument('--modules-per-station', type=int, default=12)
+    parser.add_argument('--import-rows', type=int, default=10000)
+    parser.add_argument('--demands', type=int, default=1000, help='demands in the rollup_matrix_batch scenario')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='run only these scenarios')
+    parser.add_argument('--db', help='database to generate into (or reuse if it already has parts), default a temp file')
+    parser.add_argument('-o', '--output', help='write the results as json here, default stdout')
+    parser.add_argument('--baseline', help='results json of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed median slowdown against the baseline')
+    args = parser.parse_args(argv)
+    for key, value in SIZES[args.size].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = PartsDatabase(args.db or os.path.join(workdir, 'bench.db'))
+        results = {
+            'config': {key: getattr(args, key) for key in ('size', 'parts', 'modules', 'stations', 'parts_per_module',
+                                                           'modules_per_station', 'import_rows', 'demands', 'seed',
+                                                           'repeat')},
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'scenarios': {},
+        }
+        try:
+            db.cursor.execute("SELECT COUNT(*) FROM parts")
+            if db.cursor.fetchone()[0] == 0:
+                start = time.perf_counter()
+                generate(db, args.parts, args.modules, args.stations, args.parts_per_module,
+                         args.modules_per_station, args.seed)
+                results['generate_seconds'] = time.perf_counter() - start
+            for name, fn in scenarios(db, args, workdir).items():
+                if args.only and name not in args.only:
+                    continue
+                results['scenarios'][name] = measure(fn, args.repeat)
+                print(f"{name:28} median {results['scenarios'][name]['median'] * 1000:9.2f} ms", file=sys.stderr)
+        finally:
+            db.close()
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"regression {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
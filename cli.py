@@ -0,0 +1,344 @@
+import argparse
+import csv
+import json
+import sys
+from itertools import islice
+
+from parts_database import JOURNAL_MODES, PartsDatabase, QueryStats
+
+# search options and the columns they filter
+PART_FIELDS = {
+    'name': 'part_name',
+    'vendor': 'part_vendor',
+    'description': 'part_description',
+    'spec': 'part_spec',
+    'category': 'part_category',
+    'standard': 'part_is_standard',
+}
+
+
+def open_output(path):
+    # Excel only detects utf-8 in a csv file with a BOM, stdout stays plain utf-8
+    if path in (None, '-'):
+        return sys.stdout
+    return open(path, 'w', newline='', encoding='utf-8-sig')
+
+
+def write_rows(path, header, rows):
+    out = open_output(path)
+    try:
+        writer = csv.writer(out, lineterminator='\n' if out is sys.stdout else '\r\n')
+        writer.writerow(header)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+
+def resolve_stations(db, stations):
+    # Stations are given by id or by exact name, optionally with how many of them are
+    # needed as STATION=COUNT (default 1). Returns the {station_id: count} demand.
+    demand = {}
+    for station in stations:
+        name, _, count = station.rpartition('=')
+        if not (name and count.isdigit()):
+            name, count = station, '1'
+        station_id = int(name) if name.isdigit() else db.station_ids([name])[0]
+        demand[station_id] = demand.get(station_id, 0) + int(count)
+    return demand
+
+
+def read_demands(db, path):
+    # what-if scenarios from a csv file of scenario,station,count rows (with a header row)
+    demands = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if row:
+                scenario, station, count = row[:3]
+                demand = demands.setdefault(scenario, {})
+                for station_id, count in resolve_stations(db, [f"{station}={count}"]).items():
+                    demand[station_id] = demand.get(station_id, 0) + count
+    return demands
+
+
+def search_fields(table, options):
+    # (field, value) pairs of a search from the option values, e.g. {'name': ..., 'vendor': ...}
+    if table == 'parts':
+        return [(field, options.get(option)) for option, field in PART_FIELDS.items()]
+    if table == 'modules':
+        return [('module_name', options.get('name')), ('module_belonging', options.get('category'))]
+    return [('station_name', options.get('name'))]
+
+
+def iter_pages(db, table, fields_values, sort, descending, page_size=1000):
+    # a sorted search read page by page, each page continuing at the previous one's keyset cursor
+    after = None
+    while True:
+        rows, after = db.search_page(table, fields_values, sort, descending, after, page_size)
+        yield from rows
+        if after is None:
+            return
+
+
+def import_counts(report):
+    return (f"inserted {report['inserted']}, updated {report['updated']}, unchanged {report['unchanged']}, "
+            f"rejected {len(report['rejected'])}")
+
+
+def print_rejected(path, report):
+    for sheet, row, reason in report['rejected']:
+        print(f"rejected {sheet or path}:{row}: {reason}", file=sys.stderr)
+
+
+def print_import_progress(path, report, done):
+    rows = report['inserted'] + report['updated'] + report['unchanged']
+    state = ' failed' if report['error'] else ' done' if done else ''
+    print(f"{path}: {rows} rows{state}", file=sys.stderr, flush=True)
+
+
+def cmd_import(db, args):
+    on_conflict = 'upsert' if args.upsert else 'skip'
+    if len(args.paths) == 1 and args.jobs is None:
+        report = db.store_from_excel(args.paths[0], on_conflict, args.sheet)
+        print_rejected(args.paths[0], report)
+        print(import_counts(report))
+        return
+    # several files are read in parallel, see PartsDatabase.import_catalogs
+    reports = db.import_catalogs(args.paths, on_conflict, args.sheet, args.jobs,
+                                 progress=print_import_progress if args.progress else None)
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': []}
+    failed = []
+    for path, report in reports.items():
+        print_rejected(path, report)
+        print(f"{path}: {import_counts(report)}")
+        if report['error']:
+            failed.append(f"{path}: {report['error']}")
+        for key in totals:
+            totals[key] += report[key]
+    print(f"total: {import_counts(totals)}")
+    if failed:
+        raise OSError("could not read " + "; ".join(failed))
+
+
+def cmd_search(db, args):
+    table = args.table
+    fields_values = search_fields(table, vars(args))
+    if args.sort and args.sort not in db.TABLE_COLUMNS[table]:
+        raise ValueError(f"--sort must be one of {', '.join(db.TABLE_COLUMNS[table])}")
+    if args.sort:
+        rows = iter_pages(db, table, fields_values, args.sort, args.desc)
+        if args.limit:
+            rows = islice(rows, args.limit)
+    else:
+        query, params = db.search_query(table, fields_values)
+        if args.limit:
+            query += " LIMIT ?"
+            params = list(params) + [args.limit]
+        rows = db.iter_rows(query, params)
+    write_rows(args.output, db.TABLE_COLUMNS[table], rows)
+
+
+def cmd_rollup(db, args):
+    if args.batch:
+        # all scenarios in one sparse matrix product, see rollup_matrix.RollupMatrix
+        demands = read_demands(db, args.batch)
+        matrix = db.rollup_matrix()
+        totals = matrix.rollup_many(list(demands.values()))
+        rows = ((scenario,) + row for number, scenario in enumerate(demands)
+                for row in matrix.rows(matrix.totals(totals[number])))
+        write_rows(args.output, ['scenario'] + db.ROLLUP_HEADERS, rows)
+        return
+    if not args.stations:
+        raise ValueError("give the stations to roll up or --batch")
+    demand = resolve_stations(db, args.stations)
+    write_rows(args.output, db.ROLLUP_HEADERS, db.iter_rows(*db.rollup_query(demand)))
+
+
+def print_progress(done, total):
+    print(f"\r{done}/{total} rows", end='' if done < total else '\n', file=sys.stderr, flush=True)
+
+
+def cmd_bom(db, args):
+    progress = print_progress if args.progress else None
+    if args.module is not None:
+        count = db.export_module(args.module, args.output, progress)
+    elif args.station is not None:
+        count = db.export_station(args.station, args.output, progress)
+    else:
+        count = db.export_rollup(resolve_stations(db, args.rollup), args.output, progress)
+    print(f"exported {count} rows to {args.output}")
+
+
+def cmd_where_used(db, args):
+    if args.module is not None:
+        query = db.module_where_used_query(args.module)
+    else:
+        query = db.part_where_used_query(args.part)
+    write_rows(args.output, db.WHERE_USED_HEADERS, db.iter_rows(*query))
+
+
+def cmd_export(db, args):
+    columns = db.TABLE_COLUMNS[args.table]
+    count = write_rows(args.output, columns,
+                       db.iter_rows(f"SELECT {', '.join(columns)} FROM {args.table} ORDER BY {columns[0]}"))
+    if args.output not in (None, '-'):
+        print(f"exported {count} rows to {args.output}")
+
+
+def cmd_similar(db, args):
+    write_rows(args.output, ('similarity',) + db.TABLE_COLUMNS['parts'],
+               ((ratio,) + row for ratio, row in db.similar_parts(args.spec, args.exclude)))
+
+
+def cmd_dedupe(db, args):
+    # the report lists every group, the part kept first; --merge GROUP_ID... then folds
+    # the rest of the named groups into it, after checking all of them still exist
+    groups = db.duplicate_parts()
+    write_rows(args.output, ('group', 'keep') + db.TABLE_COLUMNS['parts'] + ('modules',),
+               ((group_id, 'yes' if index == 0 else '', *row, modules)
+                for group_id, group in groups.items()
+                for index, (row, modules) in enumerate(group)))
+    if args.merge:
+        missing = [group_id for group_id in args.merge if group_id not in groups]
+        if missing:
+            raise ValueError(f"no duplicate group {', '.join(map(str, missing))}, run dedupe again for the current ids")
+        merge = [groups[group_id] for group_id in dict.fromkeys(args.merge)]
+        moved = sum(db.merge_parts(group[0][0][0], [row[0] for row, _ in group[1:]]) for group in merge)
+        removed = sum(len(group) - 1 for group in merge)
+        print(f"merged {removed} duplicate parts in {len(merge)} groups, moved {moved} module rows", file=sys.stderr)
+
+
+def cmd_vacuum(db, args):
+    before, after = db.vacuum()
+    print(f"{db.path}: {before} -> {after} bytes")
+
+
+def cmd_migrate(db, args):
+    for version, description in db.migrate(dry_run=args.dry_run):
+        print(f"{'pending' if args.dry_run else 'applied'} {version}: {description}")
+    print(f"schema version {db.schema_version()}")
+
+
+def cmd_totals(db, args):
+    if args.action == 'rebuild':
+        print(f"rebuilt station_part_totals: {db.rebuild_part_totals()} rows")
+        return
+    mismatches = db.check_part_totals()
+    if mismatches:
+        write_rows(args.output, ['station_id', 'part_id', 'stored', 'expected'], mismatches)
+        raise ValueError(f"{len(mismatches)} rows of station_part_totals differ, run totals rebuild")
+    print("station_part_totals is consistent")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='bommer', description='Batch BOM operations on a parts database.')
+    parser.add_argument('--db', default='parts.db', help='database file (default: parts.db)')
+    parser.add_argument('--query-stats', action='store_true', help='print per-statement timings as json to stderr')
+    parser.add_argument('--slow-ms', type=float, default=100, help='log the query plan of statements slower than this')
+    parser.add_argument('--journal-mode', type=str.upper, choices=JOURNAL_MODES,
+                        help='default: DELETE for a database on a network share, WAL otherwise (WAL needs every '
+                             'program using the file on one host); BOMMER_JOURNAL_MODE sets it too')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('import', help='import vendor catalogs (.xlsx or .csv)')
+    p.add_argument('paths', nargs='+', metavar='path')
+    p.add_argument('--sheet', help='only import this worksheet')
+    p.add_argument('--upsert', action='store_true', help='update standard/category of existing parts')
+    p.add_argument('--jobs', type=int, help='processes reading the files, default one per core (several files)')
+    p.add_argument('--progress', action='store_true', help='report progress per file on stderr')
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('search', help='search parts, modules or stations, written as csv')
+    p.add_argument('table', nargs='?', default='parts', choices=['parts', 'modules', 'stations'])
+    for option in PART_FIELDS:
+        p.add_argument(f'--{option}')
+    p.add_argument('--limit', type=int)
+    p.add_argument('--sort', metavar='COLUMN', help='sort by this column instead of relevance or id')
+    p.add_argument('--desc', action='store_true', help='sort descending')
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_search)
+
+    p = commands.add_parser('rollup', help='total part quantities needed to build stations, written as csv')
+    p.add_argument('stations', nargs='*', metavar='STATION[=COUNT]',
+                   help='station ids or names, one of each by default')
+    p.add_argument('--batch', metavar='CSV', help='roll up many what-if scenarios from scenario,station,count rows '
+                                                   '(needs numpy and scipy)')
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_rollup)
+
+    p = commands.add_parser('bom', help='export a module, a station or a station rollup to .xlsx or .csv')
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument('--module', type=int, help='module id')
+    target.add_argument('--station', type=int, help='station id')
+    target.add_argument('--rollup', nargs='+', metavar='STATION[=COUNT]', help='station ids or names')
+    p.add_argument('-o', '--output', required=True, help='.xlsx or .csv file')
+    p.add_argument('--progress', action='store_true', help='report progress on stderr')
+    p.set_defaults(func=cmd_bom)
+
+    p = commands.add_parser('where-used', help='modules and stations using a part or module, written as csv')
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument('--part', type=int, help='part id')
+    target.add_argument('--module', type=int, help='module id')
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_where_used)
+
+    p = commands.add_parser('export', help='dump a table as csv')
+    p.add_argument('table', choices=['parts', 'modules', 'stations'])
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('similar', help='parts with the same or a similar spec, written as csv')
+    p.add_argument('spec')
+    p.add_argument('--exclude', type=int, metavar='PART_ID', help='leave this part out')
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_similar)
+
+    p = commands.add_parser('dedupe', help='report parts with the same normalized spec, vendor and name, as csv')
+    p.add_argument('--merge', type=int, nargs='+', metavar='GROUP_ID',
+                   help='merge these groups of the report into their first part')
+    p.add_argument('-o', '--output', help='csv file, default stdout')
+    p.set_defaults(func=cmd_dedupe)
+
+    p = commands.add_parser('totals', help='check or rebuild the station part totals kept by triggers')
+    p.add_argument('action', choices=['check', 'rebuild'])
+    p.add_argument('-o', '--output', help='csv file for the rows that differ, default stdout')
+    p.set_defaults(func=cmd_totals)
+
+    p = commands.add_parser('vacuum', help='compact the database file')
+    p.set_defaults(func=cmd_vacuum)
+
+    p = commands.add_parser('migrate', help='bring the schema up to date')
+    p.add_argument('--dry-run', action='store_true', help='only list the pending migrations')
+    p.set_defaults(func=cmd_migrate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stats = QueryStats(slow_ms=args.slow_ms) if args.query_stats else None
+    pragmas = {'journal_mode': args.journal_mode} if args.journal_mode else {}
+    db = PartsDatabase(args.db, auto_migrate=args.command != 'migrate', stats=stats, **pragmas)
+    try:
+        args.func(db, args)
+    except BrokenPipeError:
+        # output piped into head and the like
+        sys.stderr.close()
+    except (KeyError, ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if stats is not None:
+            print(json.dumps(db.stats_snapshot(), ensure_ascii=False, indent=2), file=sys.stderr)
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
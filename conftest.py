@@ -0,0 +1,21 @@
+import pytest
+
+from parts_database import PartsDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = PartsDatabase(str(tmp_path / 'parts.db'))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def bom(db):
+    # two parts in one module, built twice into one station
+    parts = [db.store_part('標準件', f'part{i}', 'SMC', 'd', f'S-{i}', '氣動元件') for i in range(2)]
+    module_id = db.store_module('m1', 'Robot')
+    db.store_module_parts_many(module_id, [{'id': parts[0], 'quantity': 3}, {'id': parts[1], 'quantity': 5}])
+    station_id = db.store_station('s1')
+    db.store_station_modules(station_id, module_id, 2)
+    return parts, module_id, station_id
@@ -1,12 +1,21 @@
-import sqlite3
-from PyQt6.QtCore import Qt, QModelIndex, QVariant
-from PyQt6 import QtWidgets, uic
-from PyQt6.QtGui import QStandardItemModel, QStandardItem
-from PyQt6.QtWidgets import QAbstractItemView, QStyledItemDelegate, QComboBox, QTableView, QPushButton
+import time
+STARTUP_TIME = time.perf_counter()
+import os
+import queue
+import threading
+from concurrent.futures import Future, CancelledError
+from PyQt6.QtCore import Qt, QModelIndex, QPersistentModelIndex, QVariant, QAbstractTableModel, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QKeySequence, QShortcut
+from PyQt6 import QtWidgets
+from PyQt6.QtWidgets import QAbstractItemView, QStyledItemDelegate, QComboBox, QTableView, QPushButton, QDialog, \
+    QVBoxLayout, QHBoxLayout, QLabel, QFileDialog, QCheckBox, QSpinBox, QPlainTextEdit, QMessageBox, QProgressDialog
 import sys
+from collections import OrderedDict
 from functools import partial
 from enum import Enum
 from typing import Optional
+from main_window import Ui_Main_Window
+from parts_database import ConflictError, PartsDatabase, QueryStats, normalize_spec
 
 
 class ComboBoxDelegate(QStyledItemDelegate):
@@ -58,7 +67,522 @@ class PartStateMachine:
             self.state = PartPageState.SELECTED
 
 
-class ModuleTableModel(QStandardItemModel):
+def sort_key(value):
+    # orders cells like SQLite does: empty ones first, then numbers (also when typed in as text), then text
+    if value is None or value == '':
+        return 0, 0, ''
+    try:
+        return 1, float(value), ''
+    except (TypeError, ValueError):
+        return 2, 0, str(value)
+
+
+class LazyTableModel(QAbstractTableModel):
+    # Rows are fetched from SQLite in blocks of block_size as the view scrolls.
+    # Only max_blocks blocks are kept in memory; evicted blocks are re-read on demand.
+    # Each entry of self._rows is either an int (offset into the query result) or a
+    # list holding a row that only exists in the model (inserted, not yet saved).
+    # first_block lets the caller hand over rows 0..block_size-1 read elsewhere, and
+    # rows (instead of a query) serves an already complete result from memory.
+    # search=(table, fields_values) with sort=(column, descending) reads the search in SQL
+    # keyset paged instead of a query: each block is read from the cursor where the
+    # previous one ended, not by OFFSET, and sort() re-reads it in another order.
+    # page_loader(table, fields_values, sort, descending, after, page_size, callback, key)
+    # reads those pages off the GUI thread and calls callback((rows, cursor)); until an
+    # evicted block is back its rows show empty. Without a page_loader they are read here.
+    # begin_edit(row) puts one row in edit mode: flags() disables the others by comparing
+    # row numbers, and the values typed into it wait in a pending buffer until
+    # commit_edit() or cancel_edit(), so edit mode costs the same for any number of rows.
+    BLOCK_SIZE = 256
+
+    def __init__(self, db=None, query=None, params=(), headers=(), block_size=BLOCK_SIZE, max_blocks=64,
+                 first_block=None, rows=None, search=None, sort=None, page_loader=None, parent=None):
+        super().__init__(parent)
+        self._db = db
+        self._query = query
+        self._static = rows
+        self._params = list(params)
+        self._headers = list(headers)
+        self._block_size = block_size
+        self._max_blocks = max_blocks
+        self._blocks = OrderedDict()
+        self._edits = {}
+        self._rows = []
+        self._fetched = 0
+        self._exhausted = query is None and rows is None and sort is None
+        self._editing = None
+        self._pending = {}
+        self._search = search
+        self._page_loader = page_loader
+        self._sort = sort
+        self._cursors = {}
+        # blocks page_loader is reading, and a counter that tells the pages of an older order
+        self._loading = set()
+        self._generation = 0
+        if first_block is not None:
+            self._blocks[0] = list(first_block)
+            if sort is not None:
+                self._cursors[1] = self._cursor_after(self._blocks[0])
+        if not self._exhausted:
+            self.fetchMore(QModelIndex())
+
+    def _block(self, block_no):
+        if self._static is not None:
+            return self._static[block_no * self._block_size:(block_no + 1) * self._block_size]
+        block = self._blocks.get(block_no)
+        if block is None:
+            if self._sort is not None and self._page_loader is not None:
+                self._load_block(block_no)
+                rows = max(0, min(self._block_size, self._fetched - block_no * self._block_size))
+                return [[None] * len(self._headers)] * rows
+            if self._sort is not None:
+                block = self._search_block(block_no)
+            else:
+                cursor = self._db.conn.execute(self._query + " LIMIT ? OFFSET ?",
+                                               self._params + [self._block_size, block_no * self._block_size])
+                block = cursor.fetchall()
+            self._blocks[block_no] = block
+            while len(self._blocks) > self._max_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(block_no)
+        return block
+
+    def _cursor_after(self, block):
+        # the keyset cursor search_page gives after a block, None after the last one
+        if len(block) < self._block_size:
+            return None
+        columns = PartsDatabase.TABLE_COLUMNS[self._search[0]]
+        return block[-1][columns.index(self._sort[0])], block[-1][0]
+
+    def _load_block(self, block_no):
+        if block_no in self._loading:
+            return
+        self._loading.add(block_no)
+        table, fields_values = self._search
+        self._page_loader(table, fields_values, *self._sort, self._cursors.get(block_no), self._block_size,
+                          partial(self._block_loaded, self._generation, block_no))
+
+    def _block_loaded(self, generation, block_no, page):
+        if generation != self._generation:
+            return
+        self._loading.discard(block_no)
+        rows, self._cursors[block_no + 1] = page
+        self._blocks[block_no] = rows
+        while len(self._blocks) > self._max_blocks:
+            self._blocks.popitem(last=False)
+        if block_no * self._block_size < self._fetched:
+            # an evicted block is back
+            self._enabled_changed()
+        else:
+            self.fetchMore(QModelIndex())
+
+    def _search_block(self, block_no):
+        # blocks are first read in order, so the cursor a block starts at is always known
+        after = self._cursors.get(block_no)
+        if block_no and after is None:
+            return []
+        table, fields_values = self._search
+        sort, descending = self._sort
+        block, self._cursors[block_no + 1] = self._db.search_page(table, fields_values, sort, descending, after,
+                                                                  self._block_size)
+        return block
+
+    def _row_values(self, row):
+        ref = self._rows[row]
+        if isinstance(ref, list):
+            return ref
+        if ref in self._edits:
+            return self._edits[ref]
+        return self._block(ref // self._block_size)[ref % self._block_size]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        block_no = self._fetched // self._block_size
+        if self._sort is not None and self._page_loader is not None and block_no not in self._blocks:
+            # the rows are inserted once the page is in, see _block_loaded
+            if block_no and self._cursors.get(block_no) is None:
+                self._exhausted = True
+            else:
+                self._load_block(block_no)
+            return
+        block = self._block(block_no)
+        if len(block) < self._block_size:
+            self._exhausted = True
+        if block:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(block) - 1)
+            self._rows.extend(range(self._fetched, self._fetched + len(block)))
+            self._fetched += len(block)
+            self.endInsertRows()
+
+    def fetch_all(self):
+        # everything that can be read here, pages left to a page_loader come later
+        while self.canFetchMore():
+            fetched = self._fetched
+            self.fetchMore(QModelIndex())
+            if self._fetched == fetched:
+                break
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return QVariant()
+        if self._pending and index.column() in self._pending and index.row() == self.editing_row():
+            value = self._pending[index.column()]
+        else:
+            value = self._row_values(index.row())[index.column()]
+        return "" if value is None else str(value)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        if index.row() == self.editing_row():
+            self._pending[index.column()] = value
+            self.dataChanged.emit(index, index, [role])
+            return True
+        ref = self._rows[index.row()]
+        if isinstance(ref, list):
+            values = ref
+        else:
+            if ref not in self._edits:
+                self._edits[ref] = list(self._row_values(index.row()))
+            values = self._edits[ref]
+        values[index.column()] = value
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+        editing = self.editing_row()
+        if editing is None or index.row() == editing:
+            flags |= Qt.ItemFlag.ItemIsEnabled
+        return flags
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # A search is read again from its first page in the new order, rows that only
+        # exist in memory are sorted there.
+        # not while a single row is being edited, its unsaved values would be lost
+        if column < 0 or self._editing is not None:
+            return
+        descending = order == Qt.SortOrder.DescendingOrder
+        if self._search is not None and (self._db is not None or self._page_loader is not None):
+            table, fields_values = self._search
+            sort = (PartsDatabase.TABLE_COLUMNS[table][column], descending)
+            if self._page_loader is not None:
+                self._page_loader(table, fields_values, *sort, None, self._block_size, partial(self._sorted, sort),
+                                  key='sort')
+            else:
+                self._sorted(sort, self._db.search_page(table, fields_values, *sort, None, self._block_size))
+        elif self._query is None:
+            self.layoutAboutToBeChanged.emit()
+            order = sorted(range(len(self._rows)), key=lambda row: sort_key(self._row_values(row)[column]),
+                           reverse=descending)
+            new_rows = {old: new for new, old in enumerate(order)}
+            self._rows = [self._rows[row] for row in order]
+            for index in self.persistentIndexList():
+                self.changePersistentIndex(index, self.index(new_rows[index.row()], index.column()))
+            self.layoutChanged.emit()
+
+    def _sorted(self, sort, page):
+        # the first page of the new order is in, the rows start over from it
+        if self._editing is not None:
+            return
+        rows, cursor = page
+        self.beginResetModel()
+        self._sort = sort
+        self._query = None
+        self._static = None
+        self._generation += 1
+        self._loading = set()
+        self._blocks.clear()
+        self._blocks[0] = rows
+        self._cursors = {1: cursor}
+        self._edits = {}
+        self._rows = []
+        self._fetched = 0
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def editing_row(self):
+        # the row in edit mode, kept up to date by Qt as rows are inserted or removed above it
+        if self._editing is None:
+            return None
+        if not self._editing.isValid():
+            self._editing = None
+            self._pending = {}
+            return None
+        return self._editing.row()
+
+    def begin_edit(self, row):
+        self._editing = QPersistentModelIndex(self.index(row, 0))
+        self._pending = {}
+        self._enabled_changed()
+
+    def commit_edit(self):
+        # writes the pending values into the row and leaves edit mode, returns the row
+        row = self.editing_row()
+        pending = self._pending
+        self._editing = None
+        self._pending = {}
+        if row is not None:
+            for column, value in pending.items():
+                self.setData(self.index(row, column), value)
+        self._enabled_changed()
+        return row
+
+    def cancel_edit(self):
+        # drops the pending values, the row shows what it had before begin_edit
+        row = self.editing_row()
+        self._editing = None
+        self._pending = {}
+        self._enabled_changed()
+        return row
+
+    def _enabled_changed(self):
+        # one signal for the whole table, the view repaints only what is visible
+        if self._rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._rows) - 1, len(self._headers) - 1))
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        self.beginInsertRows(QModelIndex(), row, row + count - 1)
+        self._rows[row:row] = [[None] * len(self._headers) for _ in range(count)]
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or row + count > len(self._rows):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        for ref in self._rows[row:row + count]:
+            if not isinstance(ref, list):
+                self._edits.pop(ref, None)
+        del self._rows[row:row + count]
+        self.endRemoveRows()
+        return True
+
+
+class DatabaseWorker(QThread):
+    # Runs PartsDatabase calls on a connection owned by a background thread.
+    # submit(fn, *args) queues fn(db, *args) and returns a Future; the callback is
+    # invoked with the result on the GUI thread through job_done, the errback (if any)
+    # with the exception when fn raised. Submitting with a
+    # key supersedes the previous job with that key: it is dropped if still queued
+    # or interrupted if running, and its callback never fires.
+    job_done = pyqtSignal(object, object, object)
+    # emitted once the connection is open, with None or the exception that kept it from opening
+    ready = pyqtSignal(object)
+
+    def __init__(self, path="parts.db", parent=None, stats=None):
+        super().__init__(parent)
+        self.path = path
+        self.stats = stats
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._current = None
+        self._db = None
+        self.job_done.connect(self._deliver)
+
+    def submit(self, fn, *args, key=None, callback=None, errback=None):
+        future = Future()
+        with self._lock:
+            if key is not None:
+                previous = self._latest.get(key)
+                self._latest[key] = future
+                if previous is not None and not previous.cancel() and previous is self._current:
+                    self._db.conn.interrupt()
+        self._jobs.put((future, fn, args, key, callback, errback))
+        return future
+
+    def stop(self):
+        self._jobs.put(None)
+        self.wait()
+
+    def run(self):
+        try:
+            self._db = PartsDatabase(self.path, stats=self.stats)
+        except Exception as e:
+            self.ready.emit(e)
+            return
+        self.ready.emit(None)
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, fn, args, key, callback, errback = job
+            with self._lock:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._current = future
+            result = error = None
+            try:
+                result = fn(self._db, *args)
+            except Exception as e:
+                error = e
+            with self._lock:
+                self._current = None
+                superseded = key is not None and self._latest.get(key) is not future
+                if not superseded and key is not None:
+                    del self._latest[key]
+            if superseded:
+                future.set_exception(CancelledError())
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            self.job_done.emit(future, callback, errback)
+        self._db.close()
+
+    def _deliver(self, future, callback, errback):
+        error = future.exception()
+        if isinstance(error, CancelledError):
+            return
+        if error is not None:
+            if errback is not None:
+                errback(error)
+            else:
+                print(error)
+        elif callback is not None:
+            callback(future.result())
+
+
+class ExportWorker(QThread):
+    # Runs one PartsDatabase.export_* call on its own connection, so the database worker
+    # stays free for searches while a large export is written.
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object, object)
+
+    def __init__(self, db_path, method, args, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.method = method
+        self.args = args
+
+    def run(self):
+        db = PartsDatabase(self.db_path, auto_migrate=False)
+        try:
+            count = self.method(db, *self.args, progress=self.report)
+            self.done.emit(count, None)
+        except Exception as e:
+            self.done.emit(None, e)
+        finally:
+            db.close()
+
+    def report(self, done, total):
+        if self.isInterruptionRequested():
+            raise InterruptedError("export cancelled")
+        self.progress.emit(done, total)
+
+
+def run_export(parent, db_path, method, args, default_name):
+    # asks for the file, then writes it on an ExportWorker behind a progress dialog
+    path, selected_filter = QFileDialog.getSaveFileName(parent, "Export BOM", default_name,
+                                                        "Excel (*.xlsx);;CSV (*.csv)")
+    if not path:
+        return None
+    if not os.path.splitext(path)[1]:
+        path += '.csv' if 'csv' in selected_filter else '.xlsx'
+    progress = QProgressDialog("Exporting " + os.path.basename(path), "Cancel", 0, 0, parent)
+    progress.setWindowModality(Qt.WindowModality.WindowModal)
+    progress.setMinimumDuration(500)
+    worker = ExportWorker(db_path, method, tuple(args) + (path,), parent)
+    worker.progress.connect(partial(export_progress, progress))
+    worker.done.connect(partial(export_done, parent, progress))
+    progress.canceled.connect(worker.requestInterruption)
+    worker.finished.connect(worker.deleteLater)
+    worker.start()
+    return worker
+
+
+def export_progress(progress, done, total):
+    progress.setMaximum(total)
+    progress.setValue(done)
+
+
+def export_done(parent, progress, count, error):
+    progress.reset()
+    if error is not None and not isinstance(error, InterruptedError):
+        print(error)
+        QMessageBox.warning(parent, "Export BOM", str(error))
+
+
+class ModuleTableModel(LazyTableModel):
+    # Contents of a module or station, only the quantity (last column) is editable.
+    # Remembers what changed since the rows were loaded, so a save writes just that.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._removed = []
+
+    def _original(self, ref):
+        return self._block(ref // self._block_size)[ref % self._block_size]
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        loaded = [self._original(ref)[0] for ref in self._rows[row:row + count] if not isinstance(ref, list)]
+        if not super().removeRows(row, count, parent):
+            return False
+        self._removed.extend(loaded)
+        return True
+
+    def changes(self):
+        # (changed, removed): rows added or with a new quantity as {'id', 'quantity'},
+        # and the ids of loaded rows that were removed
+        last = len(self._headers) - 1
+        changed = []
+        for ref in self._rows:
+            if isinstance(ref, list):
+                changed.append({'id': ref[0], 'quantity': ref[last]})
+            elif ref in self._edits and str(self._edits[ref][last]) != str(self._original(ref)[last]):
+                changed.append({'id': self._edits[ref][0], 'quantity': self._edits[ref][last]})
+        readded = {str(item['id']) for item in changed}
+        removed = [item_id for item_id in self._removed if str(item_id) not in readded]
+        return changed, removed
+
+    def snapshot(self):
+        # the rows as they are now, to hand to commit_changes once they are saved
+        self.fetch_all()
+        return [list(self._row_values(row)) for row in range(len(self._rows))]
+
+    def commit_changes(self, saved=None):
+        # The saved rows (a snapshot, by default what is shown) become the new baseline.
+        # Changes made since the snapshot stay pending, what is shown does not change.
+        current = self.snapshot()
+        saved = current if saved is None else saved
+        baseline = {str(values[0]): ref for ref, values in enumerate(saved)}
+        rows, edits = [], {}
+        for values in current:
+            ref = baseline.pop(str(values[0]), None)
+            if ref is None:
+                rows.append(values)
+                continue
+            rows.append(ref)
+            if [str(value) for value in values] != [str(value) for value in saved[ref]]:
+                edits[ref] = values
+        self._static = saved
+        self._rows = rows
+        self._fetched = len(saved)
+        self._edits = edits
+        self._removed = [saved[ref][0] for ref in baseline.values()]
+
     def flags(self, index):
         if index.column() == self.columnCount()-1:
             return super().flags(index) | Qt.ItemFlag.ItemIsEditable
@@ -66,12 +590,190 @@ class ModuleTableModel(QStandardItemModel):
             return super().flags(index) & ~Qt.ItemFlag.ItemIsEditable
 
 
-class MainWindow(QtWidgets.QWidget):
-    def __init__(self, parent=None):
+class RollupDialog(QDialog):
+    def __init__(self, db, station_ids, station_names, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.station_ids = station_ids
+        self.setWindowTitle("BOM Rollup")
+        self.resize(760, 480)
+        query, params = db.rollup_query(station_ids)
+        self.model = LazyTableModel(db, query, params, PartsDatabase.ROLLUP_HEADERS)
+        self.tableView = QTableView(self)
+        self.tableView.setModel(self.model)
+        self.tableView.hideColumn(0)
+        self.tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
+        self.tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.export_pushButton = QPushButton("Export", self)
+        self.export_pushButton.clicked.connect(self.export)
+        self.close_pushButton = QPushButton("Close", self)
+        self.close_pushButton.clicked.connect(self.accept)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.export_pushButton)
+        buttons.addWidget(self.close_pushButton)
+        layout = QVBoxLayout(self)
+        kinds, quantity = db.rollup_summary(station_ids)
+        layout.addWidget(QLabel("站位: " + ", ".join(station_names), self))
+        layout.addWidget(self.tableView)
+        layout.addWidget(QLabel(f"零件種類: {kinds}    總數量: {quantity}", self))
+        layout.addLayout(buttons)
+
+    def export(self):
+        self.export_worker = run_export(self, self.db.path, PartsDatabase.export_rollup, (self.station_ids,),
+                                        "bom_rollup.xlsx")
+
+
+class WhereUsedDialog(QDialog):
+    # modules and stations using a part or module, the rows of *_where_used read by the worker
+    def __init__(self, rows, title, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Where Used")
+        self.resize(520, 400)
+        self.model = LazyTableModel(headers=PartsDatabase.WHERE_USED_HEADERS, rows=rows)
+        self.tableView = QTableView(self)
+        self.tableView.setModel(self.model)
+        self.tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
+        self.tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.close_pushButton = QPushButton("Close", self)
+        self.close_pushButton.clicked.connect(self.accept)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.close_pushButton)
+        layout = QVBoxLayout(self)
+        label = title if self.model.rowCount() else title + " (未使用)"
+        layout.addWidget(QLabel(label, self))
+        layout.addWidget(self.tableView)
+        layout.addLayout(buttons)
+
+
+class DiagnosticsDialog(QDialog):
+    # query statistics of the GUI and worker connections, opened with Ctrl+Shift+D
+    HEADERS = ['SQL', '次數', '總時間(ms)', '平均(ms)', '最大(ms)', '筆數']
+
+    def __init__(self, stats, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.setWindowTitle("Diagnostics")
+        self.resize(900, 600)
+        self.enabled_checkBox = QCheckBox("Record queries", self)
+        self.enabled_checkBox.setChecked(stats.enabled)
+        self.enabled_checkBox.toggled.connect(self.set_enabled)
+        self.slow_spinBox = QSpinBox(self)
+        self.slow_spinBox.setRange(0, 60000)
+        self.slow_spinBox.setSuffix(" ms")
+        self.slow_spinBox.setValue(int(stats.slow_ms))
+        self.slow_spinBox.valueChanged.connect(self.set_slow_ms)
+        self.tableView = QTableView(self)
+        self.tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
+        self.tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.slow_textEdit = QPlainTextEdit(self)
+        self.slow_textEdit.setReadOnly(True)
+        self.refresh_pushButton = QPushButton("Refresh", self)
+        self.refresh_pushButton.clicked.connect(self.refresh)
+        self.reset_pushButton = QPushButton("Reset", self)
+        self.reset_pushButton.clicked.connect(self.reset)
+        self.close_pushButton = QPushButton("Close", self)
+        self.close_pushButton.clicked.connect(self.accept)
+        options = QHBoxLayout()
+        options.addWidget(self.enabled_checkBox)
+        options.addStretch()
+        options.addWidget(QLabel("Slow query log from", self))
+        options.addWidget(self.slow_spinBox)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.refresh_pushButton)
+        buttons.addWidget(self.reset_pushButton)
+        buttons.addWidget(self.close_pushButton)
+        layout = QVBoxLayout(self)
+        layout.addLayout(options)
+        layout.addWidget(self.tableView, 3)
+        layout.addWidget(QLabel("Slow queries", self))
+        layout.addWidget(self.slow_textEdit, 2)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    def set_enabled(self, enabled):
+        self.stats.enabled = enabled
+
+    def set_slow_ms(self, value):
+        self.stats.slow_ms = value
+
+    def reset(self):
+        self.stats.reset()
+        self.refresh()
+
+    def refresh(self):
+        snapshot = self.stats.snapshot()
+        rows = [[entry['sql'], entry['count'], f"{entry['total_ms']:.1f}", f"{entry['mean_ms']:.2f}",
+                 f"{entry['max_ms']:.1f}", entry['rows']] for entry in snapshot['statements']]
+        self.tableView.setModel(LazyTableModel(headers=self.HEADERS, rows=rows))
+        self.tableView.setColumnWidth(0, 480)
+        lines = []
+        for entry in reversed(snapshot['slow']):
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(entry['time']))}  {entry['ms']:.1f} ms, "
+                         f"{entry['rows']} rows")
+            lines.append(entry['sql'])
+            lines.append(entry['params'])
+            lines.extend("    " + line for line in entry['plan'])
+            lines.append("")
+        self.slow_textEdit.setPlainText("\n".join(lines))
+
+
+def read_module(db, module_id):
+    # the revision is read before the contents, a change in between makes the save
+    # conflict instead of going unnoticed
+    module = db.get_module(module_id)
+    return module, None if module is None else db.search_module_contents(module_id)
+
+
+def read_station(db, station_id):
+    station = db.get_station(station_id)
+    return station, None if station is None else db.search_station_contents(station_id)
+
+
+def read_same_parts(db, values):
+    # parts of the same vendor whose spec, once normalized, the part being saved has;
+    # edits that keep the spec are not asked about. Near matches are left to the
+    # similar and dedupe commands, one digit apart is usually another model.
+    part_id, vendor, spec = values[0], values[3], values[5]
+    if part_id:
+        part = db.get_part(part_id)
+        if part is not None and normalize_spec(part[5]) == normalize_spec(spec):
+            return []
+    return db.similar_parts(spec, exclude_id=part_id or None, vendor=vendor or '', min_ratio=1.0)
+
+
+class MainWindow(QtWidgets.QWidget, Ui_Main_Window):
+    SEARCH_DEBOUNCE_MS = 250
+    # Main_stackedWidget page -> method that wires it up
+    PAGE_SETUP = {1: 'setup_part_page', 2: 'setup_module_page', 3: 'setup_station_page'}
+
+    def __init__(self, db_path="parts.db", parent=None):
         super(MainWindow, self).__init__(parent)
-        uic.loadUi('main_window.ui', self)
-
-        self.db = PartsDatabase()
+        self.setupUi(self)
+
+        # the database is opened on the worker thread so the window can paint first,
+        # the pages that need it stay disabled until then
+        self.db = None
+        # when the open finished, and what kept it from succeeding if it did not
+        self.db_ready_time = None
+        self.db_error = None
+        # recording starts from the diagnostics panel, or at launch with BOMMER_QUERY_STATS=1;
+        # until then both connections are plain ones, see set_query_stats
+        self.query_stats = QueryStats(enabled=bool(os.environ.get('BOMMER_QUERY_STATS')))
+        self.diagnostics_dialog = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
+        self.db_worker = DatabaseWorker(db_path, self, self.query_stats if self.query_stats.enabled else None)
+        self.db_worker.ready.connect(self.on_db_ready)
+        self.page_buttons = [self.jump2partPage_Button, self.jump2modulePage_Button, self.jump2stationPage_Button]
+        for button in self.page_buttons:
+            button.setEnabled(False)
+        self.db_worker.start()
+        self.pages_ready = set()
 
         self.Main_stackedWidget.currentChanged.connect(self.on_mainStack_changed)
         self.back2mainPage_Button_1.clicked.connect(partial(self.stackedWidget_jump, self.Main_stackedWidget, 0))
@@ -81,7 +783,50 @@ class MainWindow(QtWidgets.QWidget):
         self.jump2modulePage_Button.clicked.connect(partial(self.stackedWidget_jump, self.Main_stackedWidget, 2))
         self.jump2stationPage_Button.clicked.connect(partial(self.stackedWidget_jump, self.Main_stackedWidget, 3))
 
-        # part
+        self.exitButton.clicked.connect(self.close)
+
+    def on_db_ready(self, error):
+        # the worker has opened (and migrated) the database, the GUI's own read
+        # connection can skip that; the pages stay disabled when either cannot open it
+        if error is None:
+            try:
+                self.db = PartsDatabase(self.db_worker.path, auto_migrate=False, stats=self.db_worker.stats)
+            except Exception as e:
+                error = e
+        if error is not None:
+            print(error)
+            self.db_error = error
+            self.db_ready_time = time.perf_counter()
+            QMessageBox.critical(self, "Open Database", f"Cannot open {self.db_worker.path}:\n{error}")
+            return
+        for button in self.page_buttons:
+            button.setEnabled(True)
+        self.db_ready_time = time.perf_counter()
+
+    def show_diagnostics(self):
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.query_stats, self)
+            self.diagnostics_dialog.enabled_checkBox.toggled.connect(self.set_query_stats)
+        else:
+            self.diagnostics_dialog.refresh()
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def set_query_stats(self, enabled):
+        # swaps both connections for instrumented ones while recording, plain ones otherwise
+        stats = self.query_stats if enabled else None
+        self.db_worker.stats = stats
+        self.db_worker.submit(PartsDatabase.set_stats, stats)
+        if self.db is not None:
+            self.db.set_stats(stats)
+
+    def setup_page(self, index):
+        # pages are wired up the first time they are shown rather than at startup
+        if index in self.PAGE_SETUP and index not in self.pages_ready:
+            self.pages_ready.add(index)
+            getattr(self, self.PAGE_SETUP[index])()
+
+    def setup_part_page(self):
         self.part_tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
         self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.part_tableView.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
@@ -98,14 +843,18 @@ class MainWindow(QtWidgets.QWidget):
         self.part_savechange_pushButton.setEnabled(False)
         self.remove_part_pushButton.clicked.connect(self.partPage_remove_part)
         self.remove_part_pushButton.setEnabled(False)
+        self.where_used_part_pushButton.clicked.connect(self.partPage_where_used)
+        self.where_used_part_pushButton.setEnabled(False)
         part_choices = [self.part_category_comboBox.itemText(combo_index) for combo_index in range(self.part_category_comboBox.count())]
         self.part_cate_combo_delegate = ComboBoxDelegate(choices=part_choices)
         self.part_stan_combo_delegate = ComboBoxDelegate(choices=["標準件", "非標準件"])
         self.part_tableView.setItemDelegateForColumn(1, self.part_stan_combo_delegate)
         self.part_tableView.setItemDelegateForColumn(6, self.part_cate_combo_delegate)
-        self.part_editing_row = None
-        self.original_data = []
+        self.part_search_timer = self.debounce(self.partPage_live_search, self.part_name_lineEdit.textChanged,
+                                               self.part_spec_lineEdit.textChanged,
+                                               self.part_category_comboBox.currentTextChanged)
 
+    def setup_module_page(self):
         # moduleP1
         self.module_search_tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
         self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
@@ -119,13 +868,18 @@ class MainWindow(QtWidgets.QWidget):
         self.module_saveModule_pushButton.clicked.connect(self.save_new_module)
         self.module_cancelModule_pushButton.clicked.connect(self.cancel_new_module)
         self.module_removeModule_pushButton.clicked.connect(self.remove_module)
+        self.module_whereUsed_pushButton.clicked.connect(self.module_where_used)
         self.module_view_pushButton.setEnabled(False)
+        self.module_whereUsed_pushButton.setEnabled(False)
         self.module_removeModule_pushButton.setEnabled(False)
         self.module_saveModule_pushButton.setEnabled(False)
         self.module_cancelModule_pushButton.setEnabled(False)
         self.selected_module_id = None
         self.selected_module_name = None
         self.selected_module_belonging = None
+        self.selected_module_revision = None
+        self.module_search_timer = self.debounce(self.modulePage_live_search, self.module_name_lineEdit_1.textChanged,
+                                                 self.module_belonging_comboBox_1.currentTextChanged)
 
         # module P2
         self.module_content_tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
@@ -140,27 +894,36 @@ class MainWindow(QtWidgets.QWidget):
         self.module_addPart_pushButton.setEnabled(False)
         self.module_removePart_pushButton.clicked.connect(self.module_removePart)
         self.module_save_pushButton.clicked.connect(self.module_save_module)
+        self.module_export_pushButton.clicked.connect(self.module_export)
         self.module_searchPart_pushButton.clicked.connect(self.module_search_part)
         self.module_addPart_pushButton.clicked.connect(self.module_add_part)
         self.module_return_pushButton.clicked.connect(self.module_page_return)
+        self.module_part_search_timer = self.debounce(self.module_search_part, self.module_part_name_lineEdit.textChanged,
+                                                      self.module_part_spec_lineEdit.textChanged,
+                                                      self.module_part_category_comboBox.currentTextChanged)
 
+    def setup_station_page(self):
         # station p1
         self.station_search_tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
         self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-        self.station_search_tableView.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.station_search_tableView.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.station_search_tableView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.station_search_pushButton.clicked.connect(self.stationPage_searchStation)
         self.view_station_pushButton.clicked.connect(self.station_view)
+        self.station_rollup_pushButton.clicked.connect(self.station_rollup)
         self.station_newStation_pushButton.clicked.connect(self.create_new_station)
         self.station_saveStation_pushButton.clicked.connect(self.save_new_station)
         self.station_cancelStation_pushButton.clicked.connect(self.cancel_new_station)
         self.station_removeStation_pushButton.clicked.connect(self.remove_station)
         self.view_station_pushButton.setEnabled(False)
+        self.station_rollup_pushButton.setEnabled(False)
         self.station_removeStation_pushButton.setEnabled(False)
         self.station_saveStation_pushButton.setEnabled(False)
         self.station_cancelStation_pushButton.setEnabled(False)
         self.selected_station_id = None
         self.selected_station_name = None
+        self.selected_station_revision = None
+        self.station_search_timer = self.debounce(self.stationPage_live_search, self.station_name_lineEdit_1.textChanged)
 
         # station p2
         self.station_content_tableView.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignLeft)
@@ -176,13 +939,61 @@ class MainWindow(QtWidgets.QWidget):
         self.station_add_module_pushButton.setEnabled(False)
         self.station_remove_module_pushButton.clicked.connect(self.station_removeModule)
         self.station_save_pushButton.clicked.connect(self.station_save_station)
+        self.station_export_pushButton.clicked.connect(self.station_export)
         self.station_module_search_pushButton.clicked.connect(self.station_search_module)
         self.station_add_module_pushButton.clicked.connect(self.station_add_module)
         self.station_return_pushButton.clicked.connect(self.station_page_return)
-
-        self.exitButton.clicked.connect(self.close)
+        self.station_module_search_timer = self.debounce(self.station_search_module,
+                                                         self.station_module_name_lineEdit.textChanged,
+                                                         self.station_module_belonging_comboBox.currentTextChanged)
+
+    def closeEvent(self, event):
+        self.db_worker.stop()
+        if self.db is not None:
+            self.db.close()
+        super().closeEvent(event)
+
+    def search_async(self, key, table, fields_values, headers, callback):
+        # Small results come back complete (and cached by the worker's PartsDatabase);
+        # for large ones only the first block is read there, in id order, and the model
+        # has the worker read the next ones by keyset as the view scrolls.
+        self.db_worker.submit(PartsDatabase.search_cached, table, fields_values, LazyTableModel.BLOCK_SIZE, key=key,
+                              callback=partial(self.search_done, table, fields_values, headers, callback))
+
+    def search_done(self, table, fields_values, headers, callback, result):
+        rows, complete = result
+        if complete:
+            model = LazyTableModel(self.db, headers=headers, rows=rows, search=(table, fields_values),
+                                   page_loader=self.load_page)
+        else:
+            model = LazyTableModel(self.db, headers=headers, first_block=rows, search=(table, fields_values),
+                                   sort=(PartsDatabase.TABLE_COLUMNS[table][0], False), page_loader=self.load_page)
+        callback(model)
+
+    def load_page(self, table, fields_values, sort, descending, after, page_size, callback, key=None):
+        # a keyset page of a search model, read by the worker as searches are; the first
+        # page of a header click's order is keyed, so a newer click supersedes it
+        self.db_worker.submit(PartsDatabase.search_page, table, fields_values, sort, descending, after, page_size,
+                              key=f'{table}_{key}' if key else None, callback=callback)
+
+    @staticmethod
+    def show_model(view, model):
+        # new results come in their default order, so the old sort indicator is cleared
+        view.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        view.setModel(model)
+
+    def debounce(self, slot, *signals):
+        # run slot once typing has paused instead of on every keystroke
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        timer.timeout.connect(slot)
+        for signal in signals:
+            signal.connect(timer.start)
+        return timer
 
     def on_mainStack_changed(self, index):
+        self.setup_page(index)
         if index == 1:
             self.part_tableView.setModel(None)
         elif index == 2:
@@ -198,7 +1009,6 @@ class MainWindow(QtWidgets.QWidget):
     def partPage_searchPart(self):
         # todo: check if old model still take memory
         fields = ['part_name', 'part_spec', 'part_category']
-        fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別']
         name = self.part_name_lineEdit.text()
         spec = self.part_spec_lineEdit.text()
         cate = self.part_category_comboBox.currentText()
@@ -210,15 +1020,16 @@ class MainWindow(QtWidgets.QWidget):
             cate = None
         values = [name, spec, cate]
         fields_values = list(zip(fields, values))
-        results = self.db.search_part(fields_values)
-        if not results:
-            return
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(fields_all)
-        for row in results:
-            items = [QStandardItem(str(field)) for field in row]
-            model.appendRow(items)
-        self.part_tableView.setModel(model)
+        fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別']
+        self.search_async('part_search', 'parts', fields_values, fields_all, self.partPage_show_results)
+
+    def partPage_live_search(self):
+        # don't replace the table under a row that is being edited
+        if self.part_statemachine is None or self.part_statemachine.state not in (PartPageState.EDIT, PartPageState.NEW):
+            self.partPage_searchPart()
+
+    def partPage_show_results(self, model):
+        self.show_model(self.part_tableView, model)
         self.part_tableView.hideColumn(0)
         selection_model = self.part_tableView.selectionModel()
         selection_model.selectionChanged.connect(lambda: self.update_button(self.part_tableView))
@@ -229,20 +1040,8 @@ class MainWindow(QtWidgets.QWidget):
         index = self.part_tableView.currentIndex()
 
         model = self.part_tableView.model()
-        for row in range(model.rowCount()):
-            for column in range(model.columnCount()):
-                cellIndex = model.index(row, column)
-                item = model.itemFromIndex(cellIndex)
-                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEnabled)
-
         if index.isValid():
-            self.original_data = []
-            self.part_editing_row = index.row()
-            for column in range(model.columnCount()):
-                cellIndex = model.index(self.part_editing_row, column)
-                item = model.itemFromIndex(cellIndex)
-                self.original_data.append(item.text())
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
+            model.begin_edit(index.row())
             self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
             self.part_statemachine.click_edit()
             self.part_update_buttons(self.part_statemachine.state)
@@ -250,70 +1049,112 @@ class MainWindow(QtWidgets.QWidget):
     def partPage_cancel_edit(self):
         model = self.part_tableView.model()
         if self.part_statemachine.state == PartPageState.EDIT:
-            for row in range(model.rowCount()):
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(row, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
-
-            if self.part_editing_row is not None and self.original_data:
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(self.part_editing_row, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setText(self.original_data[column])
+            model.cancel_edit()
             self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
             self.part_statemachine.click_cancel()
             self.part_update_buttons(self.part_statemachine.state)
-            self.part_editing_row = None
         elif self.part_statemachine.state == PartPageState.NEW:
-            model.removeRow(0)
+            row = model.cancel_edit()
+            if row is not None:
+                model.removeRow(row)
             self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
             self.part_statemachine.click_cancel()
             self.part_update_buttons(self.part_statemachine.state)
 
     def partPage_save_edit(self):
+        # the worker looks for the same part first, the save button waits for it
         model = self.part_tableView.model()
+        row = model.editing_row()
+        if row is None:
+            self.partPage_commit_edit(model)
+            return
+        values = [model.index(row, column).data() for column in range(model.columnCount())]
+        self.part_savechange_pushButton.setEnabled(False)
+        self.db_worker.submit(read_same_parts, values, callback=partial(self.partPage_same_parts, model, values))
+
+    def partPage_same_parts(self, model, values, similar):
+        if model is not self.part_tableView.model() or model.editing_row() is None:
+            return
+        self.part_update_buttons(self.part_statemachine.state)
+        row = model.editing_row()
+        if values != [model.index(row, column).data() for column in range(model.columnCount())]:
+            # edited again while the worker looked
+            self.partPage_save_edit()
+            return
+        if similar and not self.confirm_similar(similar):
+            return
+        self.partPage_commit_edit(model)
+
+    def partPage_commit_edit(self, model):
         if self.part_statemachine.state == PartPageState.EDIT:
-            if self.part_editing_row is not None:
-                cmd = []
-                for column in range(0, model.columnCount()):
-                    cellIndex = model.index(self.part_editing_row, column)
-                    item = model.itemFromIndex(cellIndex)
-                    cmd.append(item.text())
-                self.db.edit_part(cmd[1], cmd[2], cmd[3], cmd[4], cmd[5], cmd[6], cmd[0])
-                self.part_editing_row = None
+            row = model.commit_edit()
+            if row is not None:
+                cmd = [model.index(row, column).data() for column in range(model.columnCount())]
+                self.db_worker.submit(PartsDatabase.edit_part, cmd[1], cmd[2], cmd[3], cmd[4], cmd[5], cmd[6], cmd[0])
                 self.part_statemachine.click_save()
                 self.part_update_buttons(self.part_statemachine.state)
-            for row in range(model.rowCount()):
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(row, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
             self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         elif self.part_statemachine.state == PartPageState.NEW:
-            if not model.data(model.index(0, 0)):
-                if any(model.data(model.index(0, column)) for column in range(model.columnCount())):
-                    self.db.store_part(*["" if model.data(model.index(0, i)) is None else model.data(model.index(0, i)) for i in range(1, 7)])
+            row = model.commit_edit()
+            if row is not None and not model.data(model.index(row, 0)):
+                if any(model.data(model.index(row, column)) for column in range(model.columnCount())):
+                    self.db_worker.submit(PartsDatabase.store_part, *["" if model.data(model.index(row, i)) is None else model.data(model.index(row, i)) for i in range(1, 7)])
             self.part_statemachine.click_save()
             self.part_update_buttons(self.part_statemachine.state)
-            for row in range(model.rowCount()):
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(row, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
             self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
 
+    def confirm_similar(self, similar):
+        # asks before saving a part the read_same_parts rows say already exists
+        lines = [f"{row[0]}  {row[3]}  {row[2]}  {row[5]}" for _, row in similar[:5]]
+        if len(similar) > 5:
+            lines.append(f"... {len(similar) - 5} more")
+        answer = QMessageBox.question(self, "Same part exists",
+                                      "Parts of this vendor with the same spec already exist:\n" + "\n".join(lines) +
+                                      "\nSave anyway?")
+        return answer == QMessageBox.StandardButton.Yes
+
     def partPage_remove_part(self):
         index = self.part_tableView.currentIndex()
         model = self.part_tableView.model()
         if index.isValid():
-            row = index.row()
-            item = model.itemFromIndex(model.index(row, 0))
-            if self.db.delete_part(item.text()):
-                model.removeRow(row)
+            part_id = model.index(index.row(), 0).data()
+            self.db_worker.submit(PartsDatabase.delete_part, part_id,
+                                  callback=partial(self.partPage_part_removed, model, index.row(), part_id))
             self.part_statemachine.click_remove()
             self.part_update_buttons(self.part_statemachine.state)
 
+    def partPage_part_removed(self, model, row, part_id, deleted):
+        if deleted:
+            if row < model.rowCount() and model.index(row, 0).data() == part_id:
+                model.removeRow(row)
+            return
+        self.db_worker.submit(PartsDatabase.part_where_used, part_id,
+                              callback=partial(self.partPage_part_used, model, row, part_id))
+
+    def partPage_part_used(self, model, row, part_id, used):
+        if used and self.confirm_cascade("Remove Part", model.index(row, 2).data(), used):
+            self.db_worker.submit(PartsDatabase.delete_part, part_id, True,
+                                  callback=partial(self.partPage_part_removed, model, row, part_id))
+
+    def confirm_cascade(self, title, name, used):
+        modules = sum(1 for kind, *_ in used if kind == '模組')
+        stations = len(used) - modules
+        text = f"{name} is used by {modules} module(s) and {stations} station(s).\nRemove it from them as well?"
+        answer = QMessageBox.question(self, title, text)
+        return answer == QMessageBox.StandardButton.Yes
+
+    def partPage_where_used(self):
+        index = self.part_tableView.currentIndex()
+        model = self.part_tableView.model()
+        if index.isValid() and model.index(index.row(), 0).data():
+            part_id = model.index(index.row(), 0).data()
+            title = f"{model.index(index.row(), 2).data()} {model.index(index.row(), 5).data()}"
+            self.db_worker.submit(PartsDatabase.part_where_used, part_id,
+                                  callback=partial(self.show_where_used, title))
+
+    def show_where_used(self, title, rows):
+        WhereUsedDialog(rows, title, self).exec()
+
     def partPage_new(self):
         try:
             if self.part_tableView.model():
@@ -322,43 +1163,25 @@ class MainWindow(QtWidgets.QWidget):
                 self.part_tableView.selectRow(0)
 
                 index = self.part_tableView.currentIndex()
-                # disable all
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEnabled)
-                # enable selected
+                # disable all but the new row
                 if index.isValid():
-                    self.part_editing_row = index.row()
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(self.part_editing_row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
+                    model.begin_edit(index.row())
                     self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
                     self.part_statemachine.click_new()
                     self.part_update_buttons(self.part_statemachine.state)
 
             else:
                 fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別']
-                model = QStandardItemModel()
-                model.setRowCount(1)
-                model.setColumnCount(7)
-                for column in range(7):
-                    index = model.index(0, column, QModelIndex())
-                    model.setData(index, "")
-                model.setHorizontalHeaderLabels(fields_all)
-                self.part_tableView.setModel(model)
+                model = LazyTableModel(headers=fields_all)
+                model.insertRow(0)
+                model.begin_edit(0)
+                self.show_model(self.part_tableView, model)
                 self.part_tableView.hideColumn(0)
                 self.part_tableView.selectRow(0)
                 if not self.part_statemachine:
                     self.part_statemachine = PartStateMachine()
                 self.part_statemachine.click_new()
                 self.part_update_buttons(self.part_statemachine.state)
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(0, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
                 self.part_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
         except Exception as e:
             print(e)
@@ -379,6 +1202,7 @@ class MainWindow(QtWidgets.QWidget):
         self.part_cancalEdit_pushButton.setEnabled(cancel)
         self.part_savechange_pushButton.setEnabled(save)
         self.remove_part_pushButton.setEnabled(remove)
+        self.where_used_part_pushButton.setEnabled(remove)
 
     def update_button(self, tableview: QTableView):
         if tableview.model() is not None and tableview.selectionModel().hasSelection():
@@ -387,7 +1211,6 @@ class MainWindow(QtWidgets.QWidget):
 
     def modulePage_searchModule(self):
         fields = ['module_name', 'module_belonging']
-        fields_all = ['id', '名稱', '歸屬']
         name = self.module_name_lineEdit_1.text()
         belong = self.module_belonging_comboBox_1.currentText()
         if name == '':
@@ -396,15 +1219,15 @@ class MainWindow(QtWidgets.QWidget):
             belong = None
         values = [name, belong]
         fields_values = list(zip(fields, values))
-        results = self.db.search_module(fields_values)
-        if not results:
-            return
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(fields_all)
-        for row in results:
-            items = [QStandardItem(str(field)) for field in row]
-            model.appendRow(items)
-        self.module_search_tableView.setModel(model)
+        fields_all = ['id', '名稱', '歸屬']
+        self.search_async('module_search', 'modules', fields_values, fields_all, self.modulePage_show_results)
+
+    def modulePage_live_search(self):
+        if not self.module_saveModule_pushButton.isEnabled():
+            self.modulePage_searchModule()
+
+    def modulePage_show_results(self, model):
+        self.show_model(self.module_search_tableView, model)
         self.module_search_tableView.hideColumn(0)
         self.module_view_pushButton.setEnabled(False)
         self.module_removeModule_pushButton.setEnabled(False)
@@ -415,24 +1238,30 @@ class MainWindow(QtWidgets.QWidget):
         selection_model.selectionChanged.connect(self.module_remove_button_update)
 
     def module_view(self):
-        fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別', '數量']
-        field = ['part_id']
         row = self.module_search_tableView.selectionModel().currentIndex().row()
         self.selected_module_id = self.module_search_tableView.model().index(row, 0).data()
         if not self.selected_module_id:
             return
         self.selected_module_name = self.module_search_tableView.model().index(row, 1).data()
         self.selected_module_belonging = self.module_search_tableView.model().index(row, 2).data()
-        ret_value = self.db.search_module_parts(self.selected_module_id)
-        model = ModuleTableModel()
-        model.setHorizontalHeaderLabels(fields_all)
-        for part_id, part_quantity in ret_value:
-            fields_values = list(zip(field, [part_id]))
-            results = self.db.search_part(fields_values)
-            row_items = [QStandardItem(str(item)) for item in results[0]]
-            row_items.append(QStandardItem(str(part_quantity)))
-            model.appendRow(row_items)
-        self.module_content_tableView.setModel(model)
+        self.module_load_contents()
+
+    def module_load_contents(self):
+        self.db_worker.submit(read_module, self.selected_module_id, key='module_contents',
+                              callback=partial(self.module_contents_loaded, self.selected_module_id))
+
+    def module_contents_loaded(self, module_id, result):
+        if module_id != self.selected_module_id:
+            return
+        fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別', '數量']
+        module, rows = result
+        if module is None:
+            self.module_missing()
+            return
+        self.selected_module_name, self.selected_module_belonging, self.selected_module_revision = module[1:4]
+        model = ModuleTableModel(headers=fields_all, rows=rows)
+        model.fetch_all()
+        self.show_model(self.module_content_tableView, model)
         self.module_content_tableView.hideColumn(0)
         self.stackedWidget_jump(self.module_stackedWidget, 1)
         self.module_name_lineEdit_2.setText(self.selected_module_name if self.selected_module_name else "")
@@ -441,6 +1270,13 @@ class MainWindow(QtWidgets.QWidget):
         selection_model.selectionChanged.connect(self.module_remove_part_button_update)
         self.module_searchPart_tableView.setModel(None)
 
+    def module_missing(self):
+        # the module was deleted by someone else since it was listed
+        print(f"module {self.selected_module_id} no longer exists")
+        self.selected_module_id = None
+        self.module_page_return()
+        self.modulePage_searchModule()
+
     def create_new_module(self):
         try:
             if self.module_search_tableView.model():
@@ -450,38 +1286,20 @@ class MainWindow(QtWidgets.QWidget):
                 model.insertRow(0)
                 self.module_search_tableView.selectRow(0)
                 index = self.module_search_tableView.currentIndex()
-                # disable all
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEnabled)
-                # enable selected
+                # disable all but the new row
                 if index.isValid():
-                    editing_row = index.row()
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(editing_row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
+                    model.begin_edit(index.row())
                     self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
                     self.module_saveModule_pushButton.setEnabled(True)
                     self.module_cancelModule_pushButton.setEnabled(True)
             else:
                 fields_all = ['id', '名稱', '歸屬']
-                model = QStandardItemModel()
-                model.setRowCount(1)
-                model.setColumnCount(3)
-                for column in range(3):
-                    index = model.index(0, column, QModelIndex())
-                    model.setData(index, "")
-                model.setHorizontalHeaderLabels(fields_all)
-                self.module_search_tableView.setModel(model)
+                model = LazyTableModel(headers=fields_all)
+                model.insertRow(0)
+                model.begin_edit(0)
+                self.show_model(self.module_search_tableView, model)
                 self.module_search_tableView.hideColumn(0)
                 self.module_search_tableView.selectRow(0)
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(0, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
                 self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
                 self.module_saveModule_pushButton.setEnabled(True)
                 self.module_cancelModule_pushButton.setEnabled(True)
@@ -493,12 +1311,8 @@ class MainWindow(QtWidgets.QWidget):
             model = self.module_search_tableView.model()
             row = self.module_search_tableView.selectionModel().currentIndex().row()
             if not self.module_search_tableView.model().index(row, 0).data():
+                model.cancel_edit()
                 model.removeRow(row)
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
                 self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
                 self.module_saveModule_pushButton.setEnabled(False)
                 self.module_cancelModule_pushButton.setEnabled(False)
@@ -508,8 +1322,31 @@ class MainWindow(QtWidgets.QWidget):
         selected_row = self.module_search_tableView.selectionModel().currentIndex().row()
         module_id = model.index(selected_row, 0).data()
         if module_id:
-            self.db.delete_module(module_id)
-        model.removeRow(selected_row)
+            self.db_worker.submit(PartsDatabase.delete_module, module_id,
+                                  callback=partial(self.module_removed, model, selected_row, module_id))
+        else:
+            model.removeRow(selected_row)
+
+    def module_removed(self, model, row, module_id, deleted):
+        if deleted:
+            if row < model.rowCount() and model.index(row, 0).data() == module_id:
+                model.removeRow(row)
+            return
+        self.db_worker.submit(PartsDatabase.module_where_used, module_id,
+                              callback=partial(self.module_used, model, row, module_id))
+
+    def module_used(self, model, row, module_id, used):
+        if used and self.confirm_cascade("Remove Module", model.index(row, 1).data(), used):
+            self.db_worker.submit(PartsDatabase.delete_module, module_id, True,
+                                  callback=partial(self.module_removed, model, row, module_id))
+
+    def module_where_used(self):
+        model = self.module_search_tableView.model()
+        row = self.module_search_tableView.selectionModel().currentIndex().row()
+        module_id = model.index(row, 0).data()
+        if module_id:
+            self.db_worker.submit(PartsDatabase.module_where_used, module_id,
+                                  callback=partial(self.show_where_used, model.index(row, 1).data()))
 
     def save_new_module(self):
         model = self.module_search_tableView.model()
@@ -518,31 +1355,29 @@ class MainWindow(QtWidgets.QWidget):
             name = model.index(selected_row, 1).data()
             belonging = model.index(selected_row, 2).data()
             if name and belonging:
-                self.db.store_module(name, belonging)
-                values = [name, belonging]
-                fields = ['module_name', 'module_belonging']
-                fields_values = list(zip(fields, values))
-                results = self.db.search_module(fields_values)
-                index = model.index(selected_row, 0)
-                model.setData(index, results[0][0])
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
-                self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-                self.module_saveModule_pushButton.setEnabled(False)
-                self.module_cancelModule_pushButton.setEnabled(False)
-                self.module_view_button_update()
+                self.db_worker.submit(PartsDatabase.store_module, name, belonging,
+                                      callback=partial(self.module_saved, model))
+
+    def module_saved(self, model, module_id):
+        row = model.commit_edit()
+        if row is not None:
+            model.setData(model.index(row, 0), module_id)
+        self.module_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.module_saveModule_pushButton.setEnabled(False)
+        self.module_cancelModule_pushButton.setEnabled(False)
+        self.module_view_button_update()
 
     def module_view_button_update(self):
         if self.module_search_tableView.model() is not None and self.module_search_tableView.selectionModel().hasSelection():
             if self.module_search_tableView.model().index(self.module_search_tableView.selectionModel().currentIndex().row(), 0).data():
                 self.module_view_pushButton.setEnabled(True)
+                self.module_whereUsed_pushButton.setEnabled(True)
             else:
                 self.module_view_pushButton.setEnabled(False)
+                self.module_whereUsed_pushButton.setEnabled(False)
         else:
             self.module_view_pushButton.setEnabled(False)
+            self.module_whereUsed_pushButton.setEnabled(False)
 
     def module_remove_button_update(self):
         if self.module_search_tableView.model() is not None and self.module_search_tableView.selectionModel().hasSelection():
@@ -563,7 +1398,6 @@ class MainWindow(QtWidgets.QWidget):
     def module_search_part(self):
         try:
             fields = ['part_name', 'part_spec', 'part_category']
-            fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別']
             name = self.module_part_name_lineEdit.text()
             spec = self.module_part_spec_lineEdit.text()
             cate = self.module_part_category_comboBox.currentText()
@@ -575,22 +1409,18 @@ class MainWindow(QtWidgets.QWidget):
                 cate = None
             values = [name, spec, cate]
             fields_values = list(zip(fields, values))
-            results = self.db.search_part(fields_values)
-            if not results:
-                return
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(fields_all)
-            for row in results:
-                items = [QStandardItem(str(field)) for field in row]
-                model.appendRow(items)
-            self.module_searchPart_tableView.setModel(model)
-            self.module_searchPart_tableView.hideColumn(0)
-            selection_model = self.module_searchPart_tableView.selectionModel()
-            self.module_addPart_pushButton.setEnabled(False)
-            selection_model.selectionChanged.connect(self.module_add_part_button_update)
+            fields_all = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別']
+            self.search_async('module_part_search', 'parts', fields_values, fields_all, self.module_show_part_results)
         except Exception as e:
             print(e)
 
+    def module_show_part_results(self, model):
+        self.show_model(self.module_searchPart_tableView, model)
+        self.module_searchPart_tableView.hideColumn(0)
+        selection_model = self.module_searchPart_tableView.selectionModel()
+        self.module_addPart_pushButton.setEnabled(False)
+        selection_model.selectionChanged.connect(self.module_add_part_button_update)
+
     def module_add_part(self):
         selected_row = self.module_searchPart_tableView.currentIndex().row()
         source_model = self.module_searchPart_tableView.model()
@@ -619,20 +1449,45 @@ class MainWindow(QtWidgets.QWidget):
 
     def module_save_module(self):
         try:
-            parts = []
             model = self.module_content_tableView.model()
             module_name = self.module_name_lineEdit_2.text()
             module_cate = self.module_belonging_comboBox_2.currentText()
-
-            for row in range(model.rowCount()):
-                part_id = model.index(row, 0).data()
-                quantity = model.index(row, 7).data()
-                parts.append({'id': part_id, 'quantity': quantity})
-
-            self.db.edit_module_parts(self.selected_module_id, parts)
-            self.db.edit_module(module_name, module_cate, self.selected_module_id)
+            changed, removed = model.changes()
+            saved = model.snapshot()
+            # one save at a time: a second one would still carry the revision this one replaces
+            self.module_save_pushButton.setEnabled(False)
+            self.db_worker.submit(PartsDatabase.save_module, self.selected_module_id, module_name, module_cate,
+                                  changed, removed, self.selected_module_revision,
+                                  callback=partial(self.module_contents_saved, model, saved),
+                                  errback=self.module_save_failed)
         except Exception as e:
             print(e)
+            self.module_save_pushButton.setEnabled(True)
+
+    def module_contents_saved(self, model, saved, revision):
+        self.module_save_pushButton.setEnabled(True)
+        if revision is not None:
+            model.commit_changes(saved)
+            if model is self.module_content_tableView.model():
+                self.selected_module_revision = revision
+
+    def module_save_failed(self, error):
+        print(error)
+        self.module_save_pushButton.setEnabled(True)
+        if isinstance(error, ConflictError) and self.confirm_reload("Save Module", self.selected_module_name):
+            self.module_load_contents()
+
+    def confirm_reload(self, title, name):
+        answer = QMessageBox.question(self, title,
+                                      f"{name} was changed by someone else since it was opened.\n"
+                                      f"Reload it? Your unsaved changes will be lost.")
+        return answer == QMessageBox.StandardButton.Yes
+
+    def module_export(self):
+        # exports the module as saved in the database, unsaved edits are not included
+        if self.selected_module_id:
+            self.export_worker = run_export(self, self.db.path, PartsDatabase.export_module,
+                                            (self.selected_module_id,), f"{self.selected_module_name}.xlsx")
 
     def module_page_return(self):
         self.module_search_tableView.setModel(None)
@@ -641,43 +1496,53 @@ class MainWindow(QtWidgets.QWidget):
     # station
     def stationPage_searchStation(self):
         fields = ['station_name']
-        fields_all = ['id', '名稱']
         name = self.station_name_lineEdit_1.text()
         if name == '':
             name = None
         values = [name]
         fields_values = list(zip(fields, values))
-        results = self.db.search_station(fields_values)
-        if not results:
-            return
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(fields_all)
-        for row in results:
-            items = [QStandardItem(str(field)) for field in row]
-            model.appendRow(items)
-        self.station_search_tableView.setModel(model)
+        fields_all = ['id', '名稱']
+        self.search_async('station_search', 'stations', fields_values, fields_all, self.stationPage_show_results)
+
+    def stationPage_live_search(self):
+        if not self.station_saveStation_pushButton.isEnabled():
+            self.stationPage_searchStation()
+
+    def stationPage_show_results(self, model):
+        self.show_model(self.station_search_tableView, model)
         self.station_search_tableView.hideColumn(0)
         self.view_station_pushButton.setEnabled(False)
+        self.station_rollup_pushButton.setEnabled(False)
         selection_model = self.station_search_tableView.selectionModel()
         selection_model.selectionChanged.connect(self.station_view_button_update)
+        selection_model.selectionChanged.connect(self.station_rollup_button_update)
 
     def station_view(self):
         try:
-            fields_all = ['id', '名稱', '歸屬', '數量']
-            field = ['module_id']
             row = self.station_search_tableView.selectionModel().currentIndex().row()
             self.selected_station_id = self.station_search_tableView.model().index(row, 0).data()
             self.selected_station_name = self.station_search_tableView.model().index(row, 1).data()
-            ret_value = self.db.search_station_modules(self.selected_station_id)
-            model = ModuleTableModel()
-            model.setHorizontalHeaderLabels(fields_all)
-            for module_id, module_quantity in ret_value:
-                fields_values = list(zip(field, [module_id]))
-                results = self.db.search_module(fields_values)
-                row_items = [QStandardItem(str(item)) for item in results[0]]
-                row_items.append(QStandardItem(str(module_quantity)))
-                model.appendRow(row_items)
-            self.station_content_tableView.setModel(model)
+            self.station_load_contents()
+        except Exception as e:
+            print(e)
+
+    def station_load_contents(self):
+        self.db_worker.submit(read_station, self.selected_station_id, key='station_contents',
+                              callback=partial(self.station_contents_loaded, self.selected_station_id))
+
+    def station_contents_loaded(self, station_id, result):
+        if station_id != self.selected_station_id:
+            return
+        try:
+            fields_all = ['id', '名稱', '歸屬', '數量']
+            station, rows = result
+            if station is None:
+                self.station_missing()
+                return
+            self.selected_station_name, self.selected_station_revision = station[1:3]
+            model = ModuleTableModel(headers=fields_all, rows=rows)
+            model.fetch_all()
+            self.show_model(self.station_content_tableView, model)
             self.station_content_tableView.hideColumn(0)
             self.stackedWidget_jump(self.station_stackedWidget, 1)
             self.station_name_lineEdit_2.setText(self.selected_station_name if self.selected_station_name else "")
@@ -687,6 +1552,37 @@ class MainWindow(QtWidgets.QWidget):
         except Exception as e:
             print(e)
 
+    def station_missing(self):
+        print(f"station {self.selected_station_id} no longer exists")
+        self.selected_station_id = None
+        self.station_page_return()
+        self.stationPage_searchStation()
+
+    def selected_stations(self):
+        model = self.station_search_tableView.model()
+        stations = []
+        for index in self.station_search_tableView.selectionModel().selectedRows(0):
+            station_id = model.index(index.row(), 0).data()
+            if station_id:
+                stations.append((station_id, model.index(index.row(), 1).data()))
+        return stations
+
+    def station_rollup(self):
+        try:
+            stations = self.selected_stations()
+            if stations:
+                dialog = RollupDialog(self.db, [station_id for station_id, name in stations],
+                                      [name for station_id, name in stations], self)
+                dialog.exec()
+        except Exception as e:
+            print(e)
+
+    def station_rollup_button_update(self):
+        if self.station_search_tableView.model() is not None and self.station_search_tableView.selectionModel().hasSelection():
+            self.station_rollup_pushButton.setEnabled(bool(self.selected_stations()))
+        else:
+            self.station_rollup_pushButton.setEnabled(False)
+
     def create_new_station(self):
         try:
             if self.station_search_tableView.model():
@@ -696,38 +1592,20 @@ class MainWindow(QtWidgets.QWidget):
                 model.insertRow(0)
                 self.station_search_tableView.selectRow(0)
                 index = self.station_search_tableView.currentIndex()
-                # disable all
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEnabled)
-                # enable selected
+                # disable all but the new row
                 if index.isValid():
-                    editing_row = index.row()
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(editing_row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
+                    model.begin_edit(index.row())
                     self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
                     self.station_saveStation_pushButton.setEnabled(True)
                     self.station_cancelStation_pushButton.setEnabled(True)
             else:
                 fields_all = ['id', '名稱']
-                model = QStandardItemModel()
-                model.setRowCount(1)
-                model.setColumnCount(2)
-                for column in range(2):
-                    index = model.index(0, column, QModelIndex())
-                    model.setData(index, "")
-                model.setHorizontalHeaderLabels(fields_all)
-                self.station_search_tableView.setModel(model)
+                model = LazyTableModel(headers=fields_all)
+                model.insertRow(0)
+                model.begin_edit(0)
+                self.show_model(self.station_search_tableView, model)
                 self.station_search_tableView.hideColumn(0)
                 self.station_search_tableView.selectRow(0)
-                for column in range(model.columnCount()):
-                    cellIndex = model.index(0, column)
-                    item = model.itemFromIndex(cellIndex)
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
                 self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
                 self.station_saveStation_pushButton.setEnabled(True)
                 self.station_cancelStation_pushButton.setEnabled(True)
@@ -739,12 +1617,8 @@ class MainWindow(QtWidgets.QWidget):
             model = self.station_search_tableView.model()
             row = self.station_search_tableView.selectionModel().currentIndex().row()
             if not model.index(row, 0).data():
+                model.cancel_edit()
                 model.removeRow(row)
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
                 self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
                 self.station_saveStation_pushButton.setEnabled(False)
                 self.station_cancelStation_pushButton.setEnabled(False)
@@ -754,7 +1628,7 @@ class MainWindow(QtWidgets.QWidget):
         selected_row = self.station_search_tableView.selectionModel().currentIndex().row()
         station_id = model.index(selected_row, 0).data()
         if station_id:
-            self.db.delete_station(station_id)
+            self.db_worker.submit(PartsDatabase.delete_station, station_id)
         model.removeRow(selected_row)
 
     def save_new_station(self):
@@ -763,22 +1637,17 @@ class MainWindow(QtWidgets.QWidget):
         if not model.index(selected_row, 0).data():
             name = model.index(selected_row, 1).data()
             if name :
-                self.db.store_station(name)
-                values = [name]
-                fields = ['module_name']
-                fields_values = list(zip(fields, values))
-                results = self.db.search_station(fields_values)
-                index = model.index(selected_row, 0)
-                model.setData(index, results[0][0])
-                for row in range(model.rowCount()):
-                    for column in range(model.columnCount()):
-                        cellIndex = model.index(row, column)
-                        item = model.itemFromIndex(cellIndex)
-                        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
-                self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-                self.station_saveStation_pushButton.setEnabled(False)
-                self.station_cancelStation_pushButton.setEnabled(False)
-                self.station_view_button_update()
+                self.db_worker.submit(PartsDatabase.store_station, name,
+                                      callback=partial(self.station_saved, model))
+
+    def station_saved(self, model, station_id):
+        row = model.commit_edit()
+        if row is not None:
+            model.setData(model.index(row, 0), station_id)
+        self.station_search_tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.station_saveStation_pushButton.setEnabled(False)
+        self.station_cancelStation_pushButton.setEnabled(False)
+        self.station_view_button_update()
 
     def station_view_button_update(self):
         if self.station_search_tableView.model() is not None and self.station_search_tableView.selectionModel().hasSelection():
@@ -802,7 +1671,6 @@ class MainWindow(QtWidgets.QWidget):
     def station_search_module(self):
         try:
             fields = ['module_name', 'module_belonging']
-            fields_all = ['id', '名稱', '歸屬']
             name = self.station_module_name_lineEdit.text()
             cate = self.station_module_belonging_comboBox.currentText()
             if name == '':
@@ -811,22 +1679,19 @@ class MainWindow(QtWidgets.QWidget):
                 cate = None
             values = [name, cate]
             fields_values = list(zip(fields, values))
-            results = self.db.search_module(fields_values)
-            if not results:
-                return
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(fields_all)
-            for row in results:
-                items = [QStandardItem(str(field)) for field in row]
-                model.appendRow(items)
-            self.station_search_module_tableView.setModel(model)
-            self.station_search_module_tableView.hideColumn(0)
-            selection_model = self.station_search_module_tableView.selectionModel()
-            self.station_add_module_pushButton.setEnabled(False)
-            selection_model.selectionChanged.connect(self.station_add_module_button_update)
+            fields_all = ['id', '名稱', '歸屬']
+            self.search_async('station_module_search', 'modules', fields_values, fields_all,
+                              self.station_show_module_results)
         except Exception as e:
             print(e)
 
+    def station_show_module_results(self, model):
+        self.show_model(self.station_search_module_tableView, model)
+        self.station_search_module_tableView.hideColumn(0)
+        selection_model = self.station_search_module_tableView.selectionModel()
+        self.station_add_module_pushButton.setEnabled(False)
+        selection_model.selectionChanged.connect(self.station_add_module_button_update)
+
     def station_add_module(self):
         selected_row = self.station_search_module_tableView.currentIndex().row()
         source_model = self.station_search_module_tableView.model()
@@ -855,243 +1720,45 @@ class MainWindow(QtWidgets.QWidget):
 
     def station_save_station(self):
         try:
-            modules = []
             model = self.station_content_tableView.model()
             station_name = self.station_name_lineEdit_2.text()
-
-            for row in range(model.rowCount()):
-                module_id = model.index(row, 0).data()
-                quantity = model.index(row, 3).data()
-                modules.append({'id': module_id, 'quantity': quantity})
-            self.db.edit_station_modules(self.selected_station_id, modules)
-            self.db.edit_station(station_name, self.selected_station_id)
+            changed, removed = model.changes()
+            saved = model.snapshot()
+            self.station_save_pushButton.setEnabled(False)
+            self.db_worker.submit(PartsDatabase.save_station, self.selected_station_id, station_name,
+                                  changed, removed, self.selected_station_revision,
+                                  callback=partial(self.station_contents_saved, model, saved),
+                                  errback=self.station_save_failed)
         except Exception as e:
             print(e)
+            self.station_save_pushButton.setEnabled(True)
+
+    def station_contents_saved(self, model, saved, revision):
+        self.station_save_pushButton.setEnabled(True)
+        if revision is not None:
+            model.commit_changes(saved)
+            if model is self.station_content_tableView.model():
+                self.selected_station_revision = revision
+
+    def station_save_failed(self, error):
+        print(error)
+        self.station_save_pushButton.setEnabled(True)
+        if isinstance(error, ConflictError) and self.confirm_reload("Save Station", self.selected_station_name):
+            self.station_load_contents()
+
+    def station_export(self):
+        if self.selected_station_id:
+            self.export_worker = run_export(self, self.db.path, PartsDatabase.export_station,
+                                            (self.selected_station_id,), f"{self.selected_station_name}.xlsx")
 
     def station_page_return(self):
         self.station_search_tableView.setModel(None)
         self.view_station_pushButton.setEnabled(False)
+        self.station_rollup_pushButton.setEnabled(False)
         self.stackedWidget_jump(self.station_stackedWidget, 0)
 
 
-class PartsDatabase:
-    def __init__(self):
-        self.conn = sqlite3.connect("parts.db")
-        self.cursor = self.conn.cursor()
-        self.create_table()
-
-    def create_table(self):
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS parts (
-            part_id INTEGER PRIMARY KEY UNIQUE,
-            part_is_standard text,
-            part_name text,
-            part_vendor text,
-            part_description text,
-            part_spec text,
-            part_category text,
-            unique (part_name, part_vendor, part_description, part_spec)
-        )
-        ''')
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS modules (
-            module_id INTEGER PRIMARY KEY,
-            module_name text UNIQUE,
-            module_belonging text
-        )
-        ''')
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS modules_parts (
-            module_id INTEGER,
-            part_id INTEGER,
-            quantity INTEGER,
-            FOREIGN KEY(module_id) REFERENCES modules(module_id),
-            FOREIGN KEY(part_id) REFERENCES parts(part_id),
-            unique (module_id, part_id)
-        )
-        ''')
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS stations (
-            station_id INTEGER PRIMARY KEY,
-            station_name text UNIQUE
-        )
-        ''')
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS stations_modules (
-            station_id INTEGER,
-            module_id INTEGER,
-            quantity INTEGER,
-            FOREIGN KEY(station_id) REFERENCES stations(station_id),
-            FOREIGN KEY(module_id) REFERENCES modules(module_id),
-            unique (station_id, module_id)
-        )
-        ''')
-
-        self.conn.commit()
-
-    def store_part(self, part_is_standard, part_name, part_vendor, part_description, part_spec, part_category):
-        self.cursor.execute('''
-           INSERT INTO parts (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category) VALUES(?, ?, ?, ?, ?, ?)
-        ''', (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category))
-        self.conn.commit()
-
-    def store_from_excel(self):
-        self.cursor.execute(f"PRAGMA table_info(parts)")
-        table_info = self.cursor.fetchall()
-
-    def store_module(self, module_name, module_belonging):
-        self.cursor.execute('''
-           INSERT INTO modules (module_name, module_belonging) VALUES(?, ?)
-        ''', (module_name, module_belonging))
-        self.conn.commit()
-
-    def store_module_parts(self, module_id, part_id, quantity):
-        self.cursor.execute('''
-           INSERT INTO modules_parts (module_id, part_id, quantity) VALUES(?, ?, ?)
-        ''', (module_id, part_id, quantity))
-        self.conn.commit()
-
-    def store_station(self, station_name):
-        self.cursor.execute('''
-           INSERT INTO stations (station_name) VALUES(?)
-        ''', (station_name,))
-        self.conn.commit()
-
-    def store_station_modules(self, station_id, module_id, quantity):
-        self.cursor.execute('''
-           INSERT INTO stations_modules (station_id, module_id, quantity) VALUES(?, ?, ?)
-        ''', (station_id, module_id, quantity))
-        self.conn.commit()
-
-    def delete_part(self, part_id) -> bool:
-        query = "DELETE FROM parts WHERE part_id = ?"
-        try:
-            self.cursor.execute(query, part_id)
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(e)
-            return False
-
-    def delete_module(self, module_id):
-        self.cursor.execute("DELETE FROM modules_parts WHERE module_id = ?", (module_id,))
-        self.cursor.execute("DELETE FROM modules WHERE module_id = ?", (module_id,))
-        self.conn.commit()
-
-    def delete_station(self, station_id):
-        self.cursor.execute("DELETE FROM stations_modules WHERE station_id = ?", (station_id,))
-        self.cursor.execute("DELETE FROM stations WHERE station_id = ?", (station_id,))
-        self.conn.commit()
-
-    def search_part(self, fields_values):
-        query = "SELECT * FROM parts"
-        conditions = []
-        values = []
-        for field, value in fields_values:
-            if value is not None:
-                conditions.append(f"{field} LIKE ?")
-                values.append(f"%{value}%")
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        self.cursor.execute(query, values)
-        return self.cursor.fetchall()
-
-    def search_module(self, fields_values):
-        query = "SELECT * FROM modules"
-        conditions = []
-        values = []
-        for field, value in fields_values:
-            if value is not None:
-                conditions.append(f"{field} LIKE ?")
-                values.append(f"%{value}%")
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        self.cursor.execute(query, values)
-        return self.cursor.fetchall()
-
-    def search_module_parts(self, module_id):
-        try:
-            self.cursor.execute('''
-                SELECT part_id, quantity
-                FROM modules_parts
-                WHERE module_id = ?
-            ''', (module_id,))
-        except Exception as e:
-            print(e)
-        return self.cursor.fetchall()
-
-    def search_station(self, fields_values):
-        query = "SELECT * FROM stations"
-        conditions = []
-        values = []
-        for field, value in fields_values:
-            if value is not None:
-                conditions.append(f"{field} LIKE ?")
-                values.append(f"%{value}%")
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        self.cursor.execute(query, values)
-        return self.cursor.fetchall()
-
-    def search_station_modules(self, station_id):
-        try:
-            self.cursor.execute('''
-                SELECT module_id, quantity
-                FROM stations_modules
-                WHERE station_id = ?
-            ''', (station_id,))
-        except Exception as e:
-            print(e)
-        return self.cursor.fetchall()
-
-    def edit_part(self, part_is_standard, part_name, part_vendor, part_description, part_spec, part_category, part_id):
-        sql = "UPDATE parts SET part_is_standard = ?, part_name = ?, part_vendor = ?, part_description = ?, part_spec = ?, part_category = ? WHERE part_id = ?"
-        self.cursor.execute(sql, (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category, part_id))
-        self.conn.commit()
-
-    def edit_module(self, module_name, module_cate, module_id):
-        try:
-            sql = "UPDATE modules SET module_name = ?, module_belonging = ? WHERE module_id = ?"
-            self.cursor.execute(sql, (module_name, module_cate, module_id))
-            self.conn.commit()
-        except Exception as e:
-            print(e)
-
-    def edit_module_parts(self, module_id, parts):
-        self.cursor.execute('BEGIN TRANSACTION')
-        try:
-            self.cursor.execute("DELETE FROM modules_parts WHERE module_id = ?", (module_id,))
-            for part in parts:
-                self.store_module_parts(module_id, part['id'], part['quantity'])
-            self.conn.commit()
-        except sqlite3.Error as e:
-            self.conn.rollback()
-
-    def edit_station(self, station_name, module_id):
-        try:
-            sql = "UPDATE stations SET station_name = ? WHERE station_id = ?"
-            self.cursor.execute(sql, (station_name, module_id))
-            self.conn.commit()
-        except Exception as e:
-            print(e)
-
-    def edit_station_modules(self, station_id, modules):
-        self.cursor.execute('BEGIN TRANSACTION')
-        try:
-            self.cursor.execute("DELETE FROM stations_modules WHERE station_id = ?", (station_id,))
-            for module in modules:
-                self.store_station_modules(station_id, module['id'], module['quantity'])
-            self.conn.commit()
-        except sqlite3.Error as e:
-            print(e)
-            self.conn.rollback()
-
-    def close(self):
-        self.conn.close()
-
-
-if __name__ == '__main__':
-    db = PartsDatabase()
+def seed_demo_data(db):
     try:
         db.store_part("標準件", "三通手動閥", "SMC", "無洩氣，兩通閥，接管孔徑1(P)Φ8/2(A)Φ8", "VHK3-08F-08F", "氣動元件")
         db.store_part("標準件", "兩通手動閥", "SMC", "無洩氣，兩通閥，接管孔徑1(P)Φ8/2(A)Φ8", "VHK2-08F-08F", "氣動元件")
@@ -1106,8 +1773,24 @@ if __name__ == '__main__':
     ret = db.search_part([("part_vendor", "SMC"), ("part_name", "三通手動閥")])
     for i in ret:
         print(i)
-    db.close()
+
+
+def report_startup_time(window, shown_time):
+    # --startup-time: how long the first paint and the database took since the process started
+    if window.db_ready_time is None:
+        QTimer.singleShot(10, partial(report_startup_time, window, shown_time))
+        return
+    outcome = "ready" if window.db_error is None else f"failed to open ({window.db_error})"
+    print(f"window shown after {(shown_time - STARTUP_TIME) * 1000:.0f} ms, "
+          f"database {outcome} after {(window.db_ready_time - STARTUP_TIME) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
+    window.db_worker.submit(seed_demo_data)
     window.show()
+    if '--startup-time' in sys.argv:
+        # runs once the event loop is up, i.e. after the first paint
+        QTimer.singleShot(0, lambda: report_startup_time(window, time.perf_counter()))
     sys.exit(app.exec())
@@ -65,11 +65,15 @@ class Ui_Main_Window(object):
         self.part_tableView.setStyleSheet("QHeaderView::section {\n"
 "    text-align: center;\n"
 "}")
+        self.part_tableView.setSortingEnabled(True)
         self.part_tableView.setObjectName("part_tableView")
         self.part_tableView.verticalHeader().setVisible(False)
         self.remove_part_pushButton = QtWidgets.QPushButton(parent=self.PartPage)
         self.remove_part_pushButton.setGeometry(QtCore.QRect(690, 220, 75, 23))
         self.remove_part_pushButton.setObjectName("remove_part_pushButton")
+        self.where_used_part_pushButton = QtWidgets.QPushButton(parent=self.PartPage)
+        self.where_used_part_pushButton.setGeometry(QtCore.QRect(690, 260, 75, 23))
+        self.where_used_part_pushButton.setObjectName("where_used_part_pushButton")
         self.part_savechange_pushButton = QtWidgets.QPushButton(parent=self.PartPage)
         self.part_savechange_pushButton.setGeometry(QtCore.QRect(690, 180, 75, 23))
         self.part_savechange_pushButton.setObjectName("part_savechange_pushButton")
@@ -111,11 +115,15 @@ class Ui_Main_Window(object):
         self.module_search_pushButton.setObjectName("module_search_pushButton")
         self.module_search_tableView = QtWidgets.QTableView(parent=self.module_search_page)
         self.module_search_tableView.setGeometry(QtCore.QRect(10, 40, 701, 431))
+        self.module_search_tableView.setSortingEnabled(True)
         self.module_search_tableView.setObjectName("module_search_tableView")
         self.module_search_tableView.verticalHeader().setVisible(False)
         self.module_view_pushButton = QtWidgets.QPushButton(parent=self.module_search_page)
         self.module_view_pushButton.setGeometry(QtCore.QRect(10, 480, 111, 23))
         self.module_view_pushButton.setObjectName("module_view_pushButton")
+        self.module_whereUsed_pushButton = QtWidgets.QPushButton(parent=self.module_search_page)
+        self.module_whereUsed_pushButton.setGeometry(QtCore.QRect(130, 480, 111, 23))
+        self.module_whereUsed_pushButton.setObjectName("module_whereUsed_pushButton")
         self.module_newModule_pushButton = QtWidgets.QPushButton(parent=self.module_search_page)
         self.module_newModule_pushButton.setGeometry(QtCore.QRect(450, 10, 101, 23))
         self.module_newModule_pushButton.setObjectName("module_newModule_pushButton")
@@ -148,6 +156,7 @@ class Ui_Main_Window(object):
         self.module_belonging_comboBox_2.addItem("")
         self.module_content_tableView = QtWidgets.QTableView(parent=self.module_view_page)
         self.module_content_tableView.setGeometry(QtCore.QRect(10, 40, 641, 191))
+        self.module_content_tableView.setSortingEnabled(True)
         self.module_content_tableView.setObjectName("module_content_tableView")
         self.module_content_tableView.verticalHeader().setVisible(False)
         self.module_part_name_lineEdit = QtWidgets.QLineEdit(parent=self.module_view_page)
@@ -176,6 +185,7 @@ class Ui_Main_Window(object):
         self.module_searchPart_pushButton.setObjectName("module_searchPart_pushButton")
         self.module_searchPart_tableView = QtWidgets.QTableView(parent=self.module_view_page)
         self.module_searchPart_tableView.setGeometry(QtCore.QRect(10, 271, 641, 201))
+        self.module_searchPart_tableView.setSortingEnabled(True)
         self.module_searchPart_tableView.setObjectName("module_searchPart_tableView")
         self.module_searchPart_tableView.verticalHeader().setVisible(False)
         self.module_addPart_pushButton = QtWidgets.QPushButton(parent=self.module_view_page)
@@ -187,6 +197,9 @@ class Ui_Main_Window(object):
         self.module_save_pushButton = QtWidgets.QPushButton(parent=self.module_view_page)
         self.module_save_pushButton.setGeometry(QtCore.QRect(10, 480, 75, 23))
         self.module_save_pushButton.setObjectName("module_save_pushButton")
+        self.module_export_pushButton = QtWidgets.QPushButton(parent=self.module_view_page)
+        self.module_export_pushButton.setGeometry(QtCore.QRect(95, 480, 75, 23))
+        self.module_export_pushButton.setObjectName("module_export_pushButton")
         self.module_return_pushButton = QtWidgets.QPushButton(parent=self.module_view_page)
         self.module_return_pushButton.setGeometry(QtCore.QRect(660, 480, 61, 23))
         self.module_return_pushButton.setObjectName("module_return_pushButton")
@@ -211,8 +224,12 @@ class Ui_Main_Window(object):
         self.view_station_pushButton = QtWidgets.QPushButton(parent=self.search_station_page)
         self.view_station_pushButton.setGeometry(QtCore.QRect(10, 480, 111, 23))
         self.view_station_pushButton.setObjectName("view_station_pushButton")
+        self.station_rollup_pushButton = QtWidgets.QPushButton(parent=self.search_station_page)
+        self.station_rollup_pushButton.setGeometry(QtCore.QRect(130, 480, 111, 23))
+        self.station_rollup_pushButton.setObjectName("station_rollup_pushButton")
         self.station_search_tableView = QtWidgets.QTableView(parent=self.search_station_page)
         self.station_search_tableView.setGeometry(QtCore.QRect(10, 40, 701, 431))
+        self.station_search_tableView.setSortingEnabled(True)
         self.station_search_tableView.setObjectName("station_search_tableView")
         self.station_search_tableView.verticalHeader().setVisible(False)
         self.station_newStation_pushButton = QtWidgets.QPushButton(parent=self.search_station_page)
@@ -238,6 +255,7 @@ class Ui_Main_Window(object):
         self.station_name_lineEdit_2.setObjectName("station_name_lineEdit_2")
         self.station_content_tableView = QtWidgets.QTableView(parent=self.view_station_page)
         self.station_content_tableView.setGeometry(QtCore.QRect(10, 40, 631, 181))
+        self.station_content_tableView.setSortingEnabled(True)
         self.station_content_tableView.setObjectName("station_content_tableView")
         self.station_content_tableView.verticalHeader().setVisible(False)
         self.station_module_name_lineEdit = QtWidgets.QLineEdit(parent=self.view_station_page)
@@ -254,6 +272,7 @@ class Ui_Main_Window(object):
         self.station_module_search_pushButton.setObjectName("station_module_search_pushButton")
         self.station_search_module_tableView = QtWidgets.QTableView(parent=self.view_station_page)
         self.station_search_module_tableView.setGeometry(QtCore.QRect(10, 261, 631, 211))
+        self.station_search_module_tableView.setSortingEnabled(True)
         self.station_search_module_tableView.setObjectName("station_search_module_tableView")
         self.station_search_module_tableView.verticalHeader().setVisible(False)
         self.station_add_module_pushButton = QtWidgets.QPushButton(parent=self.view_station_page)
@@ -265,6 +284,9 @@ class Ui_Main_Window(object):
         self.station_save_pushButton = QtWidgets.QPushButton(parent=self.view_station_page)
         self.station_save_pushButton.setGeometry(QtCore.QRect(10, 480, 75, 23))
         self.station_save_pushButton.setObjectName("station_save_pushButton")
+        self.station_export_pushButton = QtWidgets.QPushButton(parent=self.view_station_page)
+        self.station_export_pushButton.setGeometry(QtCore.QRect(95, 480, 75, 23))
+        self.station_export_pushButton.setObjectName("station_export_pushButton")
         self.station_module_belonging_comboBox = QtWidgets.QComboBox(parent=self.view_station_page)
         self.station_module_belonging_comboBox.setGeometry(QtCore.QRect(220, 230, 81, 22))
         self.station_module_belonging_comboBox.setObjectName("station_module_belonging_comboBox")
@@ -311,6 +333,7 @@ class Ui_Main_Window(object):
         self.search_part_pushButton.setText(_translate("Main_Window", "Search"))
         self.new_part_pushButton.setText(_translate("Main_Window", "New"))
         self.remove_part_pushButton.setText(_translate("Main_Window", "Remove"))
+        self.where_used_part_pushButton.setText(_translate("Main_Window", "Where Used"))
         self.part_savechange_pushButton.setText(_translate("Main_Window", "Save"))
         self.edit_part_pushButton.setText(_translate("Main_Window", "Edit"))
         self.part_cancalEdit_pushButton.setText(_translate("Main_Window", "Cancel"))
@@ -323,6 +346,7 @@ class Ui_Main_Window(object):
         self.module_belonging_comboBox_1.setItemText(3, _translate("Main_Window", "Modbus"))
         self.module_search_pushButton.setText(_translate("Main_Window", "Search"))
         self.module_view_pushButton.setText(_translate("Main_Window", "View Module"))
+        self.module_whereUsed_pushButton.setText(_translate("Main_Window", "Where Used"))
         self.module_newModule_pushButton.setText(_translate("Main_Window", "New Module"))
         self.module_removeModule_pushButton.setText(_translate("Main_Window", "Remove"))
         self.module_saveModule_pushButton.setText(_translate("Main_Window", "Save"))
@@ -342,10 +366,12 @@ class Ui_Main_Window(object):
         self.module_addPart_pushButton.setText(_translate("Main_Window", "Add"))
         self.module_removePart_pushButton.setText(_translate("Main_Window", "Remove"))
         self.module_save_pushButton.setText(_translate("Main_Window", "Save"))
+        self.module_export_pushButton.setText(_translate("Main_Window", "Export"))
         self.module_return_pushButton.setText(_translate("Main_Window", "Return"))
         self.station_name_label_1.setText(_translate("Main_Window", "站位名稱"))
         self.station_search_pushButton.setText(_translate("Main_Window", "Search"))
         self.view_station_pushButton.setText(_translate("Main_Window", "View Station"))
+        self.station_rollup_pushButton.setText(_translate("Main_Window", "BOM Rollup"))
         self.station_newStation_pushButton.setText(_translate("Main_Window", "New Station"))
         self.station_removeStation_pushButton.setText(_translate("Main_Window", "Remove"))
         self.station_saveStation_pushButton.setText(_translate("Main_Window", "Save"))
@@ -357,6 +383,7 @@ class Ui_Main_Window(object):
         self.station_add_module_pushButton.setText(_translate("Main_Window", "Add"))
         self.station_remove_module_pushButton.setText(_translate("Main_Window", "Remove"))
         self.station_save_pushButton.setText(_translate("Main_Window", "Save"))
+        self.station_export_pushButton.setText(_translate("Main_Window", "Export"))
         self.station_module_belonging_comboBox.setItemText(0, _translate("Main_Window", "Conveyor"))
         self.station_module_belonging_comboBox.setItemText(1, _translate("Main_Window", "Robot"))
         self.station_module_belonging_comboBox.setItemText(2, _translate("Main_Window", "Modbus"))
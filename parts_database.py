@@ -0,0 +1,1805 @@
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+
+# diameter signs written for Φ in specs, after NFKC and casefolding
+DIAMETER_SIGNS = str.maketrans({'⌀': 'φ', '∅': 'φ', 'ø': 'φ', 'ϕ': 'φ', 'Ф': 'φ', 'ф': 'φ'})
+
+
+def normalize_spec(text):
+    # The comparison key of a spec (or vendor): NFKC folds full-width characters,
+    # casefolding and the diameter signs (Greek, Cyrillic Ф, ⌀...) the variants of a
+    # letter, and everything but letters and digits (whitespace, dashes...) is dropped,
+    # so "VHK2-08F-08F", "vhk2 08f 08f" and "ＶＨＫ２－０８Ｆ－０８Ｆ" all become "vhk208f08f".
+    # A dot or slash between two digits is kept: "1.5KΩ" is not "15KΩ", nor "1/2" "12".
+    if text is None:
+        return ''
+    text = unicodedata.normalize('NFKC', str(text)).casefold().translate(DIAMETER_SIGNS)
+    kept = []
+    for i, char in enumerate(text):
+        if unicodedata.category(char)[0] in 'LN':
+            kept.append(char)
+        elif char in './' and 0 < i < len(text) - 1 and text[i - 1].isdecimal() and text[i + 1].isdecimal():
+            kept.append(char)
+    return ''.join(kept)
+
+
+def fts5_trigram_available():
+    # whether this SQLite has FTS5 with the trigram tokenizer (3.34 and later), asked of a
+    # throwaway in-memory database so no lock is taken on the real one
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE t USING fts5(a, tokenize='trigram')")
+    except sqlite3.Error:
+        return False
+    return True
+
+
+# file systems whose files other hosts write too, WAL's shared-memory index does not work there
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', 'ncpfs', '9p', 'fuse.sshfs', 'ceph',
+                       'glusterfs', 'fuse.glusterfs', 'davfs', 'fuse.davfs2'}
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+
+
+def is_network_path(path):
+    # whether path is on a network share: a UNC path or a remote drive on Windows, a
+    # NETWORK_FILESYSTEMS mount where /proc/mounts tells (elsewhere only UNC paths are known)
+    if path in ('', ':memory:'):
+        return False
+    path = os.path.realpath(path)
+    if os.name == 'nt':
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        if drive.startswith(('\\\\', '//')):
+            return True
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == 4  # DRIVE_REMOTE
+    try:
+        with open('/proc/mounts', encoding='utf-8', errors='replace') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    mount_point, fs_type = '', ''
+    for point, kind in mounts:
+        point = point.replace('\\040', ' ')
+        inside = path == point or path.startswith(point.rstrip('/') + '/')
+        if inside and len(point) > len(mount_point):
+            mount_point, fs_type = point, kind
+    return fs_type in NETWORK_FILESYSTEMS
+
+
+class SearchCache:
+    # LRU of complete search results keyed on (table, fields_values). A search whose
+    # values only extend those of a cached one (more characters typed) can be answered
+    # by filtering the cached rows, see PartsDatabase.search_cached.
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, table, fields_values):
+        key = (table, fields_values)
+        rows = self._entries.get(key)
+        if rows is not None:
+            self._entries.move_to_end(key)
+        return rows
+
+    def find_superset(self, table, fields_values):
+        for (cached_table, cached_fields_values), rows in reversed(self._entries.items()):
+            if cached_table == table and self._narrows(cached_fields_values, fields_values):
+                return rows
+        return None
+
+    @staticmethod
+    def _narrows(cached, fields_values):
+        if [field for field, value in cached] != [field for field, value in fields_values]:
+            return False
+        for (field, old), (_, value) in zip(cached, fields_values):
+            if old is None:
+                continue
+            if value is None:
+                return False
+            if field.endswith('_id'):
+                if str(value) != str(old):
+                    return False
+            elif not str(value).startswith(str(old)):
+                return False
+        return True
+
+    def put(self, table, fields_values, rows):
+        self._entries[(table, fields_values)] = rows
+        self._entries.move_to_end((table, fields_values))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table):
+        for key in [key for key in self._entries if key[0] == table]:
+            del self._entries[key]
+
+
+class CatalogCache:
+    # Read-through cache of rows keyed on (kind, id), e.g. ('module_contents', 3), shared
+    # by every connection of the process to the same file. Bounded by the number of rows
+    # held, least recently used entries are evicted first. Any committed write clears it:
+    # our own through PartsDatabase.transaction, other processes' through PRAGMA data_version.
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_rows=200000):
+        self.max_rows = max_rows
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    @classmethod
+    def for_path(cls, path):
+        if path == ':memory:' or path.startswith('file:'):
+            return cls()
+        key = os.path.abspath(path)
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls._shared[key] = cls()
+            return cache
+
+    def get(self, key):
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key, rows, generation):
+        # generation is the one seen before the rows were read; if the cache was cleared
+        # since, the rows may predate that write and are not kept
+        size = max(len(rows), 1)
+        with self._lock:
+            if generation != self.generation or size > self.max_rows:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= max(len(old), 1)
+            self._entries[key] = rows
+            self._size += size
+            while self._size > self.max_rows:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= max(len(evicted), 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.generation += 1
+
+
+class QueryStats:
+    # Latency histogram and row count per statement, keyed on the whitespace collapsed SQL,
+    # plus a log of the statements slower than slow_ms with their EXPLAIN QUERY PLAN.
+    # One instance can be shared by the connections of several threads.
+    BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, enabled=True, slow_ms=100, slow_log_size=100):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._slow = deque(maxlen=slow_log_size)
+
+    def record(self, connection, sql, params, seconds, rows):
+        ms = seconds * 1000
+        key = " ".join(sql.split())
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                                                 'histogram': [0] * (len(self.BUCKETS_MS) + 1)}
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['rows'] += rows
+            entry['histogram'][bisect_left(self.BUCKETS_MS, ms)] += 1
+        if self.slow_ms is not None and ms >= self.slow_ms:
+            slow = {'sql': key, 'params': repr(params)[:200], 'ms': ms, 'rows': rows, 'time': time.time(),
+                    'plan': self.explain(connection, sql, params)}
+            with self._lock:
+                self._slow.append(slow)
+
+    @staticmethod
+    def explain(connection, sql, params):
+        # a plain cursor, so the EXPLAIN is not recorded itself
+        if params is None:
+            return []
+        try:
+            cursor = sqlite3.Cursor(connection)
+            plan = cursor.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            cursor.close()
+        except sqlite3.Error as e:
+            return [str(e)]
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in plan:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return lines
+
+    def snapshot(self):
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            statements = [dict(entry, sql=sql, mean_ms=entry['total_ms'] / entry['count'],
+                               histogram=dict(zip(labels, entry['histogram'])))
+                          for sql, entry in self._statements.items()]
+            slow = list(self._slow)
+        statements.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return {'enabled': self.enabled, 'slow_ms': self.slow_ms, 'statements': statements, 'slow': slow}
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times a statement from execute until its rows run out, the cursor is reused or
+    # closed, and reports it to the connection's QueryStats. Rows read by iterating
+    # the cursor are not counted.
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        stats = self.connection.stats
+        if not stats.enabled:
+            return super().execute(sql, parameters)
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = time.perf_counter() - start
+        if self.description is None:
+            stats.record(self.connection, sql, parameters, elapsed, max(self.rowcount, 0))
+        else:
+            self._pending = [sql, parameters, elapsed, 0]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = self.connection.stats
+        if not stats.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        stats.record(self.connection, sql, None, time.perf_counter() - start, max(self.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._pending[2] += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._pending is None:
+            return super().fetchmany(size)
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._pending[2] += time.perf_counter() - start
+        self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._pending[2] += time.perf_counter() - start
+        self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            self.connection.stats.record(self.connection, *pending)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # connection whose cursors, including the implicit ones of execute(), report to stats
+    stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConflictError(Exception):
+    # a save found the module or station changed by another connection since it was loaded
+    pass
+
+
+class PartsDatabase:
+    # text columns indexed by the parts_fts full-text table
+    FTS_COLUMNS = ('part_name', 'part_vendor', 'part_description', 'part_spec', 'part_category')
+    # the trigram tokenizer cannot match tokens shorter than this
+    FTS_MIN_TOKEN = 3
+    # column headers recognised by store_from_excel, compared without whitespace
+    IMPORT_HEADERS = {
+        'part_is_standard': ('標準件/非標準件', '標準件', 'part_is_standard'),
+        'part_name': ('零件名稱', '名稱', 'part_name'),
+        'part_vendor': ('品牌', 'part_vendor'),
+        'part_description': ('零件描述', '描述', 'part_description'),
+        'part_spec': ('規格型號', '規格', 'part_spec'),
+        'part_category': ('類別', 'part_category'),
+    }
+    IMPORT_COLUMNS = ('part_is_standard', 'part_name', 'part_vendor', 'part_description', 'part_spec', 'part_category')
+    ROLLUP_HEADERS = ['id', '標準件', '名稱', '品牌', '描述', '規格', '類別', '數量']
+    WHERE_USED_HEADERS = ['類型', 'id', '名稱', '數量']
+    MODULE_CONTENTS_HEADERS = ROLLUP_HEADERS
+    STATION_CONTENTS_HEADERS = ['id', '名稱', '歸屬', '數量']
+    # data rows of an .xlsx sheet, below the header row
+    XLSX_MAX_ROWS = 1048575
+    TABLE_COLUMNS = {
+        'parts': ('part_id', 'part_is_standard', 'part_name', 'part_vendor', 'part_description', 'part_spec',
+                  'part_category'),
+        'modules': ('module_id', 'module_name', 'module_belonging', 'revision'),
+        'stations': ('station_id', 'station_name', 'revision'),
+    }
+    # larger search results are not cached, they are read block by block instead
+    CACHE_ROW_LIMIT = 2000
+    # Connection profile, any of these can be overridden per connection: PartsDatabase(cache_size=-64000).
+    # WAL lets the GUI, the worker thread and other users read while one connection writes,
+    # but only when every connection is on the same host as the file: its index lives in
+    # shared memory (and so does mmap), which a network share does not provide. A database
+    # on a share (is_network_path) keeps SQLite's own defaults instead, NETWORK_PRAGMAS.
+    # BOMMER_JOURNAL_MODE (or journal_mode=..., the --journal-mode options) decides for
+    # every path; all programs opening one file must agree, a share opened as a local path
+    # on the file server itself included.
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    NETWORK_PRAGMAS = {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+    }
+    # secondary indexes on the foreign key and filter columns, the UNIQUE constraints
+    # already cover modules_parts(module_id) and stations_modules(station_id)
+    INDEXES = {
+        'idx_modules_parts_part': 'modules_parts(part_id)',
+        'idx_stations_modules_module': 'stations_modules(module_id)',
+        'idx_parts_category': 'parts(part_category)',
+        'idx_modules_belonging': 'modules(module_belonging)',
+    }
+    # indexes that let search_page read a page sorted by a parts column without sorting
+    # the whole result, module and station names are covered by their UNIQUE constraints
+    SORT_INDEXES = {
+        'idx_parts_standard': 'parts(part_is_standard)',
+        'idx_parts_name': 'parts(part_name)',
+        'idx_parts_vendor': 'parts(part_vendor)',
+        'idx_parts_description': 'parts(part_description)',
+        'idx_parts_spec': 'parts(part_spec)',
+    }
+    # Schema migrations as (version, description, method). migrate() runs the ones above
+    # the database's PRAGMA user_version in order, each in its own transaction together
+    # with the version bump. Only ever append steps, released ones must stay as they are.
+    MIGRATIONS = (
+        (1, 'base tables', '_migrate_base_tables'),
+        (2, 'secondary indexes', 'create_indexes'),
+        (3, 'parts_fts full-text index', 'create_fts'),
+        (4, 'revision counters on modules and stations', '_migrate_revisions'),
+        (5, 'sort indexes on parts columns', 'create_sort_indexes'),
+        (6, 'station_part_totals kept by triggers', 'create_part_totals'),
+        (7, 'normalized part specs and their trigram index', 'create_spec_index'),
+    )
+    # similar_parts: candidates are the parts sharing most of this many of the rarest
+    # trigrams of the spec (one typo changes at most three), and the similarity
+    # (SequenceMatcher ratio of the normalized specs) a candidate needs; at 0.9 model
+    # numbers one digit apart (VHK2-08F-08F, VHK3-08F-08F) already count as similar
+    SIMILAR_TRIGRAMS = 6
+    SIMILAR_CANDIDATES = 50
+    SIMILAR_RATIO = 0.95
+    # the total quantity of every part in a station, (station_id, part_id, quantity, links)
+    # where links counts the module rows it comes from, so the row goes when the last one does
+    PART_TOTALS_QUERY = '''
+        SELECT sm.station_id, mp.part_id, SUM(IFNULL(sm.quantity, 0) * IFNULL(mp.quantity, 0)), COUNT(*)
+        FROM stations_modules AS sm
+        JOIN modules_parts AS mp ON mp.module_id = sm.module_id
+        GROUP BY sm.station_id, mp.part_id
+    '''
+
+    def __init__(self, path="parts.db", auto_migrate=True, stats=None, check_same_thread=True, **pragmas):
+        self.path = path
+        # autocommit mode: transactions are only opened explicitly by transaction()
+        # without a QueryStats the connection is a plain one and instrumentation costs nothing
+        # check_same_thread=False for a connection handed between threads, one at a time
+        self.stats = stats
+        self.check_same_thread = check_same_thread
+        self.pragmas = dict(self.default_pragmas(path), **pragmas)
+        self._connect()
+        self._transaction_depth = 0
+        self.search_cache = SearchCache()
+        self.catalog_cache = CatalogCache.for_path(path)
+        self._data_version = None
+        self._rollup_matrix = None
+        if auto_migrate:
+            try:
+                self.migrate()
+            except sqlite3.Error as e:
+                print(e)
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('parts_fts', 'parts_spec_fts')")
+        tables = {row[0] for row in self.cursor.fetchall()}
+        self.fts_enabled = 'parts_fts' in tables
+        self.spec_fts_enabled = 'parts_spec_fts' in tables
+
+    def _connect(self):
+        if self.stats is None:
+            self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=self.check_same_thread)
+        else:
+            self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=self.check_same_thread,
+                                        factory=InstrumentedConnection)
+            self.conn.stats = self.stats
+        self.cursor = self.conn.cursor()
+        self.apply_pragmas(self.pragmas)
+
+    def set_stats(self, stats):
+        # Reopens the connection as an instrumented one reporting to stats, or a plain one
+        # for None, so queries only pay for the timing while someone looks at it. Call it
+        # between transactions, from the thread that uses the connection.
+        if stats is self.stats:
+            return
+        if self._transaction_depth:
+            raise sqlite3.OperationalError("cannot reopen the connection inside a transaction")
+        self.conn.close()
+        self.stats = stats
+        self._connect()
+        # data_version is counted per connection
+        self._data_version = None
+
+    @contextmanager
+    def transaction(self):
+        # Groups the writes made inside the with block into one transaction (one commit).
+        # Nested blocks become savepoints, so an inner failure rolls back only its own
+        # writes when the caller handles the exception.
+        depth = self._transaction_depth
+        if depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        else:
+            self.conn.execute(f"SAVEPOINT sp_{depth}")
+        self._transaction_depth += 1
+        try:
+            yield self.cursor
+        except BaseException:
+            self._transaction_depth = depth
+            if depth == 0:
+                self.conn.execute("ROLLBACK")
+            else:
+                self.conn.execute(f"ROLLBACK TO sp_{depth}")
+                self.conn.execute(f"RELEASE sp_{depth}")
+            raise
+        self._transaction_depth = depth
+        if depth == 0:
+            self.conn.execute("COMMIT")
+            self.catalog_cache.clear()
+        else:
+            self.conn.execute(f"RELEASE sp_{depth}")
+
+    @classmethod
+    def default_pragmas(cls, path):
+        pragmas = dict(cls.DEFAULT_PRAGMAS)
+        if is_network_path(path):
+            pragmas.update(cls.NETWORK_PRAGMAS)
+        journal_mode = os.environ.get('BOMMER_JOURNAL_MODE')
+        if journal_mode:
+            pragmas['journal_mode'] = journal_mode
+        return pragmas
+
+    def apply_pragmas(self, pragmas):
+        for name, value in pragmas.items():
+            if value is None:
+                continue
+            if name == 'journal_mode':
+                if str(value).upper() not in JOURNAL_MODES:
+                    raise ValueError(f"journal mode must be one of {', '.join(JOURNAL_MODES)}, not {value}")
+                try:
+                    # leaving WAL needs the file to itself, while others have it open the mode stays
+                    mode = self.conn.execute(f"PRAGMA journal_mode = {value}").fetchone()[0]
+                except sqlite3.OperationalError as e:
+                    mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+                    print(f"{self.path} stays in journal mode {mode}: {e}")
+                continue
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def schema_version(self):
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def migrate(self, dry_run=False):
+        # Returns the (version, description) steps that were applied, or with dry_run
+        # the ones that would be. A failing step is rolled back and stops the run, the
+        # database then stays at the last version that went through. The version is read
+        # again once the step holds the write lock, so when two programs open an old
+        # database at once the second one skips the steps the first applied. Without
+        # FTS5 the full-text tables are left out (searches fall back to LIKE) but the
+        # rest of the schema goes on; they are created by a later run that has FTS5.
+        current = self.schema_version()
+        latest = self.MIGRATIONS[-1][0]
+        if current > latest:
+            print(f"{self.path} has schema version {current}, newer than this program's {latest}")
+        pending = [(version, description) for version, description, _ in self.MIGRATIONS if version > current]
+        if dry_run:
+            return pending
+        for version, description, method in self.MIGRATIONS:
+            if version <= current:
+                continue
+            with self.transaction():
+                if self.schema_version() >= version:
+                    continue
+                getattr(self, method)()
+                self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+        self.create_missing_fts()
+        return pending
+
+    def create_missing_fts(self):
+        # the full-text tables an earlier run on a SQLite without FTS5 had to leave out
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('parts_fts', 'parts_spec_fts')")
+        tables = {row[0] for row in self.cursor.fetchall()}
+        version = self.schema_version()
+        missing = 'parts_fts' not in tables and version >= 3 or 'parts_spec_fts' not in tables and version >= 7
+        if not missing or not fts5_trigram_available():
+            return
+        with self.transaction():
+            if 'parts_fts' not in tables and version >= 3:
+                self.create_fts()
+                if version >= 7:
+                    self._narrow_fts_update()
+            if 'parts_spec_fts' not in tables and version >= 7:
+                self.create_spec_fts()
+
+    def _migrate_base_tables(self):
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parts (
+            part_id INTEGER PRIMARY KEY UNIQUE,
+            part_is_standard text,
+            part_name text,
+            part_vendor text,
+            part_description text,
+            part_spec text,
+            part_category text,
+            unique (part_name, part_vendor, part_description, part_spec)
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modules (
+            module_id INTEGER PRIMARY KEY,
+            module_name text UNIQUE,
+            module_belonging text
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modules_parts (
+            module_id INTEGER,
+            part_id INTEGER,
+            quantity INTEGER,
+            FOREIGN KEY(module_id) REFERENCES modules(module_id),
+            FOREIGN KEY(part_id) REFERENCES parts(part_id),
+            unique (module_id, part_id)
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stations (
+            station_id INTEGER PRIMARY KEY,
+            station_name text UNIQUE
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stations_modules (
+            station_id INTEGER,
+            module_id INTEGER,
+            quantity INTEGER,
+            FOREIGN KEY(station_id) REFERENCES stations(station_id),
+            FOREIGN KEY(module_id) REFERENCES modules(module_id),
+            unique (station_id, module_id)
+        )
+        ''')
+
+    def _migrate_revisions(self):
+        # bumped by every write to a module or station and its contents, saves compare it
+        # to the revision they were loaded at to detect concurrent changes
+        self.cursor.execute("ALTER TABLE modules ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self.cursor.execute("ALTER TABLE stations ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+    def create_indexes(self):
+        for name, target in self.INDEXES.items():
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    def create_sort_indexes(self):
+        for name, target in self.SORT_INDEXES.items():
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    def create_part_totals(self):
+        # station_part_totals is what PART_TOTALS_QUERY gives, kept current row by row by
+        # triggers on the two link tables; an update is handled as a delete and an insert
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS station_part_totals (
+            station_id INTEGER,
+            part_id INTEGER,
+            quantity INTEGER,
+            links INTEGER,
+            PRIMARY KEY (station_id, part_id)
+        ) WITHOUT ROWID
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_station_part_totals_part ON station_part_totals(part_id)")
+        add_module_part = '''
+            INSERT INTO station_part_totals (station_id, part_id, quantity, links)
+            SELECT sm.station_id, new.part_id, IFNULL(sm.quantity, 0) * IFNULL(new.quantity, 0), 1
+            FROM stations_modules AS sm WHERE sm.module_id = new.module_id
+            ON CONFLICT (station_id, part_id) DO UPDATE SET quantity = quantity + excluded.quantity, links = links + 1;
+        '''
+        remove_module_part = '''
+            UPDATE station_part_totals
+            SET quantity = quantity - IFNULL(old.quantity, 0) * IFNULL((
+                    SELECT sm.quantity FROM stations_modules AS sm
+                    WHERE sm.station_id = station_part_totals.station_id AND sm.module_id = old.module_id), 0),
+                links = links - 1
+            WHERE part_id = old.part_id
+              AND station_id IN (SELECT station_id FROM stations_modules WHERE module_id = old.module_id);
+            DELETE FROM station_part_totals WHERE part_id = old.part_id AND links = 0;
+        '''
+        add_station_module = '''
+            INSERT INTO station_part_totals (station_id, part_id, quantity, links)
+            SELECT new.station_id, mp.part_id, IFNULL(new.quantity, 0) * IFNULL(mp.quantity, 0), 1
+            FROM modules_parts AS mp WHERE mp.module_id = new.module_id
+            ON CONFLICT (station_id, part_id) DO UPDATE SET quantity = quantity + excluded.quantity, links = links + 1;
+        '''
+        remove_station_module = '''
+            UPDATE station_part_totals
+            SET quantity = quantity - IFNULL(old.quantity, 0) * IFNULL((
+                    SELECT mp.quantity FROM modules_parts AS mp
+                    WHERE mp.module_id = old.module_id AND mp.part_id = station_part_totals.part_id), 0),
+                links = links - 1
+            WHERE station_id = old.station_id
+              AND part_id IN (SELECT part_id FROM modules_parts WHERE module_id = old.module_id);
+            DELETE FROM station_part_totals WHERE station_id = old.station_id AND links = 0;
+        '''
+        triggers = {
+            'modules_parts_totals_insert': ('AFTER INSERT ON modules_parts', add_module_part),
+            'modules_parts_totals_delete': ('AFTER DELETE ON modules_parts', remove_module_part),
+            'modules_parts_totals_update': ('AFTER UPDATE OF module_id, part_id, quantity ON modules_parts',
+                                            remove_module_part + add_module_part),
+            'stations_modules_totals_insert': ('AFTER INSERT ON stations_modules', add_station_module),
+            'stations_modules_totals_delete': ('AFTER DELETE ON stations_modules', remove_station_module),
+            'stations_modules_totals_update': ('AFTER UPDATE OF station_id, module_id, quantity ON stations_modules',
+                                               remove_station_module + add_station_module),
+        }
+        for name, (event, body) in triggers.items():
+            self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+        self.rebuild_part_totals()
+
+    def rebuild_part_totals(self):
+        # recomputes station_part_totals from the link tables, returns its row count
+        with self.transaction():
+            self.cursor.execute("DELETE FROM station_part_totals")
+            self.cursor.execute(f"INSERT INTO station_part_totals (station_id, part_id, quantity, links) "
+                                f"{self.PART_TOTALS_QUERY}")
+            self.cursor.execute("SELECT COUNT(*) FROM station_part_totals")
+            return self.cursor.fetchone()[0]
+
+    def check_part_totals(self):
+        # (station_id, part_id, stored quantity, expected quantity) of every row of
+        # station_part_totals that differs from the link tables, None for a missing row
+        self.cursor.execute(f'''
+            WITH expected (station_id, part_id, quantity, links) AS ({self.PART_TOTALS_QUERY})
+            SELECT e.station_id, e.part_id, t.quantity, e.quantity
+            FROM expected AS e
+            LEFT JOIN station_part_totals AS t ON t.station_id = e.station_id AND t.part_id = e.part_id
+            WHERE t.quantity IS NOT e.quantity OR t.links IS NOT e.links
+            UNION ALL
+            SELECT t.station_id, t.part_id, t.quantity, NULL
+            FROM station_part_totals AS t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM stations_modules AS sm
+                JOIN modules_parts AS mp ON mp.module_id = sm.module_id
+                WHERE sm.station_id = t.station_id AND mp.part_id = t.part_id
+            )
+            ORDER BY 1, 2
+        ''')
+        return self.cursor.fetchall()
+
+    def create_spec_index(self):
+        # part_spec_norm holds normalize_spec(part_spec), written by every method that
+        # stores a part; parts_spec_fts is its trigram index for similar_parts (without
+        # positions, only which parts have a trigram is asked) and parts_spec_vocab tells
+        # how many parts contain each trigram
+        self.cursor.execute("ALTER TABLE parts ADD COLUMN part_spec_norm text")
+        self._narrow_fts_update()
+        self.normalize_specs()
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_parts_spec_norm ON parts(part_spec_norm)")
+        if fts5_trigram_available():
+            self.create_spec_fts()
+        else:
+            print("no FTS5 trigram tokenizer in this SQLite, similar_parts only finds equal specs")
+
+    def _narrow_fts_update(self):
+        # parts_fts only needs reindexing when one of its columns changes, not on every
+        # update of part_spec_norm
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'parts_fts_update'")
+        if self.cursor.fetchone() is None:
+            return
+        columns = ", ".join(self.FTS_COLUMNS)
+        new_columns = ", ".join(f"new.{column}" for column in self.FTS_COLUMNS)
+        old_columns = ", ".join(f"old.{column}" for column in self.FTS_COLUMNS)
+        self.cursor.execute("DROP TRIGGER parts_fts_update")
+        self.cursor.execute(f'''
+        CREATE TRIGGER parts_fts_update AFTER UPDATE OF {columns} ON parts BEGIN
+            INSERT INTO parts_fts (parts_fts, rowid, {columns}) VALUES ('delete', old.part_id, {old_columns});
+            INSERT INTO parts_fts (rowid, {columns}) VALUES (new.part_id, {new_columns});
+        END
+        ''')
+
+    def create_spec_fts(self):
+        self.cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS parts_spec_fts USING fts5(
+            part_spec_norm, content='parts', content_rowid='part_id', tokenize='trigram', detail='none'
+        )
+        ''')
+        self.cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS parts_spec_vocab USING fts5vocab(parts_spec_fts, 'row')")
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parts_spec_fts_insert AFTER INSERT ON parts BEGIN
+            INSERT INTO parts_spec_fts (rowid, part_spec_norm) VALUES (new.part_id, new.part_spec_norm);
+        END
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parts_spec_fts_delete AFTER DELETE ON parts BEGIN
+            INSERT INTO parts_spec_fts (parts_spec_fts, rowid, part_spec_norm)
+            VALUES ('delete', old.part_id, old.part_spec_norm);
+        END
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parts_spec_fts_update AFTER UPDATE OF part_spec_norm ON parts BEGIN
+            INSERT INTO parts_spec_fts (parts_spec_fts, rowid, part_spec_norm)
+            VALUES ('delete', old.part_id, old.part_spec_norm);
+            INSERT INTO parts_spec_fts (rowid, part_spec_norm) VALUES (new.part_id, new.part_spec_norm);
+        END
+        ''')
+        self.cursor.execute("INSERT INTO parts_spec_fts (parts_spec_fts) VALUES ('rebuild')")
+
+    def normalize_specs(self, batch_size=10000):
+        # fills part_spec_norm of the parts written without it (by other programs), returns how many
+        with self.transaction():
+            self.cursor.execute("SELECT part_id, part_spec FROM parts WHERE part_spec_norm IS NULL")
+            rows = self.cursor.fetchall()
+            for start in range(0, len(rows), batch_size):
+                self.cursor.executemany("UPDATE parts SET part_spec_norm = ? WHERE part_id = ?",
+                                        [(normalize_spec(spec), part_id)
+                                         for part_id, spec in rows[start:start + batch_size]])
+        return len(rows)
+
+    def create_fts(self):
+        # trigram tokenizing gives substring matches on CJK text, which has no word breaks
+        columns = ", ".join(self.FTS_COLUMNS)
+        new_columns = ", ".join(f"new.{column}" for column in self.FTS_COLUMNS)
+        old_columns = ", ".join(f"old.{column}" for column in self.FTS_COLUMNS)
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'parts_fts'")
+        exists = self.cursor.fetchone() is not None
+        if not exists and not fts5_trigram_available():
+            # SQLite builds without fts5/trigram (before 3.34): searches fall back to LIKE
+            # and create_missing_fts adds the table once the program runs on a newer one
+            print("no FTS5 trigram tokenizer in this SQLite, searches fall back to LIKE")
+            return
+        self.cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5(
+            {columns}, content='parts', content_rowid='part_id', tokenize='trigram'
+        )
+        ''')
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parts_fts_insert AFTER INSERT ON parts BEGIN
+            INSERT INTO parts_fts (rowid, {columns}) VALUES (new.part_id, {new_columns});
+        END
+        ''')
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parts_fts_delete AFTER DELETE ON parts BEGIN
+            INSERT INTO parts_fts (parts_fts, rowid, {columns}) VALUES ('delete', old.part_id, {old_columns});
+        END
+        ''')
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parts_fts_update AFTER UPDATE ON parts BEGIN
+            INSERT INTO parts_fts (parts_fts, rowid, {columns}) VALUES ('delete', old.part_id, {old_columns});
+            INSERT INTO parts_fts (rowid, {columns}) VALUES (new.part_id, {new_columns});
+        END
+        ''')
+        if not exists:
+            self.cursor.execute("INSERT INTO parts_fts (parts_fts) VALUES ('rebuild')")
+
+    def store_part(self, part_is_standard, part_name, part_vendor, part_description, part_spec, part_category):
+        self.search_cache.invalidate('parts')
+        with self.transaction():
+            self.cursor.execute('''
+               INSERT INTO parts (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category, part_spec_norm) VALUES(?, ?, ?, ?, ?, ?, ?)
+            ''', (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category,
+                  normalize_spec(part_spec)))
+        return self.cursor.lastrowid
+
+    @staticmethod
+    def _import_cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+
+    @classmethod
+    def read_catalog(cls, path, sheet=None):
+        # Yields (sheet, row_number, cells) for every row of an .xlsx/.csv catalog,
+        # with cells ordered as IMPORT_COLUMNS. Rows above the header row and
+        # sheets without one (e.g. version history) are skipped.
+        if os.path.splitext(path)[1].lower() == '.csv':
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                yield from cls._read_catalog_rows(None, csv.reader(f))
+            return
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                if sheet is None or worksheet.title == sheet:
+                    yield from cls._read_catalog_rows(worksheet.title, worksheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+    @classmethod
+    def _read_catalog_rows(cls, sheet, rows):
+        aliases = {"".join(alias.split()): column for column, names in cls.IMPORT_HEADERS.items() for alias in names}
+        positions = None
+        for row_number, row in enumerate(rows, start=1):
+            if positions is None:
+                header = {aliases.get("".join(str(cell).split())): index
+                          for index, cell in enumerate(row) if cell is not None}
+                if 'part_name' in header:
+                    positions = [header.get(column) for column in cls.IMPORT_COLUMNS]
+                continue
+            cells = [cls._import_cell(row[index]) if index is not None and index < len(row) else ''
+                     for index in positions]
+            if any(cells):
+                yield sheet, row_number, cells
+
+    @classmethod
+    def read_catalog_batches(cls, path, sheet=None, batch_size=10000):
+        # Yields (batch, rejected) as read_catalog goes: lists of up to batch_size valid
+        # rows, IMPORT_COLUMNS followed by the normalized spec, and the (sheet, row_number,
+        # reason) of the rows left out since the last one.
+        spec = cls.IMPORT_COLUMNS.index('part_spec')
+        batch, rejected = [], []
+        for sheet_name, row_number, cells in cls.read_catalog(path, sheet):
+            if not cells[1]:
+                rejected.append((sheet_name, row_number, 'missing part name'))
+                continue
+            cells.append(normalize_spec(cells[spec]))
+            batch.append(cells)
+            if len(batch) >= batch_size:
+                yield batch, rejected
+                batch, rejected = [], []
+        if batch or rejected:
+            yield batch, rejected
+
+    def _import_sql(self, on_conflict):
+        # Rows that collide with the (name, vendor, description, spec) unique key are left
+        # alone with on_conflict='skip' or get their standard/category overwritten with 'upsert'.
+        columns = ", ".join(self.IMPORT_COLUMNS + ('part_spec_norm',))
+        if on_conflict == 'skip':
+            return f"INSERT OR IGNORE INTO parts ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        if on_conflict == 'upsert':
+            return f'''
+                INSERT INTO parts ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (part_name, part_vendor, part_description, part_spec) DO UPDATE SET
+                    part_is_standard = excluded.part_is_standard,
+                    part_category = excluded.part_category
+                WHERE parts.part_is_standard IS NOT excluded.part_is_standard
+                   OR parts.part_category IS NOT excluded.part_category
+            '''
+        raise ValueError(f"on_conflict must be 'skip' or 'upsert', not {on_conflict!r}")
+
+    def _store_import_batch(self, sql, batch, report):
+        # new rows always get ids above the previous maximum, which tells them from updated ones
+        self.cursor.execute("SELECT COALESCE(MAX(part_id), 0) FROM parts")
+        last_id = self.cursor.fetchone()[0]
+        self.cursor.executemany(sql, batch)
+        changed = self.cursor.rowcount
+        self.cursor.execute("SELECT COUNT(*) FROM parts WHERE part_id > ?", (last_id,))
+        inserted = self.cursor.fetchone()[0]
+        report['inserted'] += inserted
+        report['updated'] += changed - inserted
+        report['unchanged'] += len(batch) - changed
+
+    def store_from_excel(self, path, on_conflict='skip', sheet=None, batch_size=10000):
+        # Imports a vendor catalog into parts in one transaction, see _import_sql for on_conflict.
+        self.search_cache.invalidate('parts')
+        sql = self._import_sql(on_conflict)
+        report = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': []}
+        with self.transaction():
+            for batch, rejected in self.read_catalog_batches(path, sheet, batch_size):
+                report['rejected'].extend(rejected)
+                if batch:
+                    self._store_import_batch(sql, batch, report)
+        return report
+
+    def import_catalogs(self, paths, on_conflict='skip', sheet=None, workers=None, batch_size=10000, progress=None):
+        # Imports many catalogs at once. Worker processes (workers, default one per core)
+        # read and validate the files in parallel and pass row batches through a bounded
+        # queue to this connection, the only writer, which stores each batch in its own
+        # transaction as it arrives. progress(path, report, done) is called after every batch
+        # and once more when the file is done.
+        # Returns {path: report} with the counts of store_from_excel and 'error', the
+        # message if the file could not be read; what was read of it before stays imported.
+        self.search_cache.invalidate('parts')
+        sql = self._import_sql(on_conflict)
+        reports = {path: {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': [], 'error': None}
+                   for path in paths}
+        workers = min(workers or os.cpu_count() or 1, len(reports)) or 1
+        context = multiprocessing.get_context('spawn')
+        batches = context.Queue(maxsize=workers * 2)
+        remaining = len(reports)
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_import_worker,
+                                 initargs=(batches,)) as executor:
+            futures = [executor.submit(_read_import_file, path, sheet, batch_size) for path in reports]
+            try:
+                while remaining:
+                    try:
+                        path, batch, rejected, error = batches.get(timeout=1)
+                    except queue.Empty:
+                        # a worker that died never reports its file
+                        for future in futures:
+                            if future.done() and future.exception() is not None:
+                                raise future.exception()
+                        continue
+                    report = reports[path]
+                    report['rejected'].extend(rejected)
+                    if batch:
+                        with self.transaction():
+                            self._store_import_batch(sql, batch, report)
+                    if batch is None:
+                        report['error'] = error
+                        remaining -= 1
+                    if progress is not None:
+                        progress(path, report, batch is None)
+            except BaseException:
+                # let the running workers finish their file into the void, they may be
+                # waiting on the full queue
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                raise
+        return reports
+
+    def store_module(self, module_name, module_belonging):
+        self.search_cache.invalidate('modules')
+        with self.transaction():
+            self.cursor.execute('''
+               INSERT INTO modules (module_name, module_belonging) VALUES(?, ?)
+            ''', (module_name, module_belonging))
+        return self.cursor.lastrowid
+
+    def store_module_parts(self, module_id, part_id, quantity):
+        self.store_module_parts_many(module_id, [{'id': part_id, 'quantity': quantity}])
+
+    def store_module_parts_many(self, module_id, parts):
+        with self.transaction():
+            self.cursor.execute("UPDATE modules SET revision = revision + 1 WHERE module_id = ?", (module_id,))
+            self.cursor.executemany('''
+               INSERT INTO modules_parts (module_id, part_id, quantity) VALUES(?, ?, ?)
+            ''', [(module_id, part['id'], part['quantity']) for part in parts])
+
+    def store_station(self, station_name):
+        self.search_cache.invalidate('stations')
+        with self.transaction():
+            self.cursor.execute('''
+               INSERT INTO stations (station_name) VALUES(?)
+            ''', (station_name,))
+        return self.cursor.lastrowid
+
+    def store_station_modules(self, station_id, module_id, quantity):
+        self.store_station_modules_many(station_id, [{'id': module_id, 'quantity': quantity}])
+
+    def store_station_modules_many(self, station_id, modules):
+        with self.transaction():
+            self.cursor.execute("UPDATE stations SET revision = revision + 1 WHERE station_id = ?", (station_id,))
+            self.cursor.executemany('''
+               INSERT INTO stations_modules (station_id, module_id, quantity) VALUES(?, ?, ?)
+            ''', [(station_id, module['id'], module['quantity']) for module in modules])
+
+    def delete_part(self, part_id, cascade=False) -> bool:
+        # A part still used by a module is only deleted with cascade, which also takes
+        # it out of those modules. Returns whether the part was deleted.
+        self.search_cache.invalidate('parts')
+        query = "DELETE FROM parts WHERE part_id = ?"
+        try:
+            with self.transaction():
+                if cascade:
+                    self.cursor.execute('''
+                        UPDATE modules SET revision = revision + 1
+                        WHERE module_id IN (SELECT module_id FROM modules_parts WHERE part_id = ?)
+                    ''', (part_id,))
+                    self.cursor.execute("DELETE FROM modules_parts WHERE part_id = ?", (part_id,))
+                elif self.part_in_use(part_id):
+                    print(f"part {part_id} is used by a module")
+                    return False
+                self.cursor.execute(query, (part_id,))
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+    def delete_module(self, module_id, cascade=False) -> bool:
+        # same as delete_part for a module still used by a station
+        self.search_cache.invalidate('modules')
+        try:
+            with self.transaction():
+                if cascade:
+                    self.search_cache.invalidate('stations')
+                    self.cursor.execute('''
+                        UPDATE stations SET revision = revision + 1
+                        WHERE station_id IN (SELECT station_id FROM stations_modules WHERE module_id = ?)
+                    ''', (module_id,))
+                    self.cursor.execute("DELETE FROM stations_modules WHERE module_id = ?", (module_id,))
+                elif self.module_in_use(module_id):
+                    print(f"module {module_id} is used by a station")
+                    return False
+                self.cursor.execute("DELETE FROM modules_parts WHERE module_id = ?", (module_id,))
+                self.cursor.execute("DELETE FROM modules WHERE module_id = ?", (module_id,))
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+    def delete_station(self, station_id):
+        self.search_cache.invalidate('stations')
+        with self.transaction():
+            self.cursor.execute("DELETE FROM stations_modules WHERE station_id = ?", (station_id,))
+            self.cursor.execute("DELETE FROM stations WHERE station_id = ?", (station_id,))
+
+    @classmethod
+    def _build_search(cls, table, key, fields_values):
+        query = f"SELECT {', '.join(cls.TABLE_COLUMNS[table])} FROM {table}"
+        conditions = []
+        values = []
+        for field, value in fields_values:
+            if value is not None:
+                if field.endswith('_id'):
+                    conditions.append(f"{field} = ?")
+                    values.append(value)
+                else:
+                    conditions.append(f"{field} LIKE ?")
+                    values.append(f"%{value}%")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {key}"
+        return query, values
+
+    def iter_rows(self, query, params=(), arraysize=1000):
+        # streams a result set on its own cursor instead of materializing it with fetchall
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(arraysize)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def fetch_rows(self, query, params, limit):
+        self.cursor.execute(query + " LIMIT ?", list(params) + [limit])
+        return self.cursor.fetchall()
+
+    def search_part_query(self, fields_values):
+        return self._build_search("parts", "part_id", fields_values)
+
+    def search_part_ranked_query(self, fields_values):
+        # Every whitespace separated token of a value has to occur in its column.
+        # Tokens long enough for the trigram index go through parts_fts ranked by bm25,
+        # the rest are LIKE filters on the matches. Without any such token (or without
+        # FTS5) this is the plain LIKE substring search.
+        tokens = self._search_terms('parts', fields_values)
+        fts_tokens = self._fts_tokens(tokens)
+        if not fts_tokens:
+            return self._build_search("parts", "part_id", tokens)
+        columns = ", ".join(f"parts.{column}" for column in self.TABLE_COLUMNS['parts'])
+        query = f"SELECT {columns} FROM parts_fts JOIN parts ON parts.part_id = parts_fts.rowid WHERE parts_fts MATCH ?"
+        values = [self._fts_match(fts_tokens)]
+        for field, value in tokens:
+            if (field, value) in fts_tokens:
+                continue
+            if field.endswith('_id'):
+                query += f" AND parts.{field} = ?"
+                values.append(value)
+            else:
+                query += f" AND parts.{field} LIKE ?"
+                values.append(f"%{value}%")
+        query += " ORDER BY bm25(parts_fts), parts.part_id"
+        return query, values
+
+    def _fts_tokens(self, tokens):
+        # the search tokens parts_fts can match, none without FTS5
+        if not self.fts_enabled:
+            return []
+        # part_category only has a handful of values, filtering on it beats ranking it
+        return [(field, value) for field, value in tokens
+                if field in self.FTS_COLUMNS and field != 'part_category' and len(value) >= self.FTS_MIN_TOKEN]
+
+    @staticmethod
+    def _fts_match(fts_tokens):
+        return " AND ".join(f'{field} : "{value.replace(chr(34), chr(34) * 2)}"' for field, value in fts_tokens)
+
+    def _search_conditions(self, table, fields_values):
+        # WHERE conditions of a search, parts tokens long enough for parts_fts filter through it
+        key = self.TABLE_COLUMNS[table][0]
+        tokens = self._search_terms(table, fields_values)
+        fts_tokens = self._fts_tokens(tokens) if table == 'parts' else []
+        conditions = []
+        values = []
+        if fts_tokens:
+            conditions.append(f"{key} IN (SELECT rowid FROM parts_fts WHERE parts_fts MATCH ?)")
+            values.append(self._fts_match(fts_tokens))
+        for field, value in tokens:
+            if (field, value) in fts_tokens:
+                continue
+            if field.endswith('_id'):
+                conditions.append(f"{field} = ?")
+                values.append(value)
+            else:
+                conditions.append(f"{field} LIKE ?")
+                values.append(f"%{value}%")
+        return conditions, values
+
+    @staticmethod
+    def _page_segments(key, sort, descending, after):
+        # The (condition, params, order by) segments the rest of a sorted search is read from,
+        # starting at the keyset cursor. NULL sort values come first ascending and last
+        # descending, as in ORDER BY; they are their own segment so both walk an index.
+        order = "DESC" if descending else "ASC"
+        op = "<" if descending else ">"
+        if sort == key:
+            return [(f"{key} {op} ?" if after else None, [after[1]] if after else [], f"{key} {order}")]
+        null_segment = (f"{sort} IS NULL AND {key} {op} ?" if after and after[0] is None else f"{sort} IS NULL",
+                        [after[1]] if after and after[0] is None else [], f"{key} {order}")
+        if after is None or after[0] is None:
+            value_segment = (f"{sort} IS NOT NULL", [], f"{sort} {order}, {key} {order}")
+        else:
+            value_segment = (f"({sort}, {key}) {op} (?, ?)", list(after), f"{sort} {order}, {key} {order}")
+        if descending:
+            return [null_segment] if after and after[0] is None else [value_segment, null_segment]
+        return [null_segment, value_segment] if after is None or after[0] is None else [value_segment]
+
+    def search_page(self, table, fields_values, sort=None, descending=False, after=None, page_size=256):
+        # Reads one page of a search ordered by sort (a column of TABLE_COLUMNS[table]) and
+        # then id. Returns (rows, cursor): pass cursor as after to get the next page, it is
+        # None after the last one. A page costs the same however deep into the result it is.
+        columns = self.TABLE_COLUMNS[table]
+        sort = sort or columns[0]
+        if sort not in columns:
+            raise ValueError(f"cannot sort {table} by {sort}")
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1, not {page_size}")
+        self.check_data_version()
+        conditions, values = self._search_conditions(table, fields_values)
+        rows = []
+        for condition, params, order_by in self._page_segments(columns[0], sort, descending, after):
+            where = conditions + [condition] if condition else conditions
+            query = f"SELECT {', '.join(columns)} FROM {table}"
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            self.cursor.execute(query + f" ORDER BY {order_by} LIMIT ?",
+                                values + params + [page_size - len(rows)])
+            rows.extend(self.cursor.fetchall())
+            if len(rows) == page_size:
+                last = rows[-1]
+                return rows, (last[columns.index(sort)], last[0])
+        return rows, None
+
+    def _search_terms(self, table, fields_values):
+        # the (field, value) pairs a row must contain to match a search
+        terms = []
+        for field, value in fields_values:
+            if value is None:
+                continue
+            if table == 'parts' and field in self.FTS_COLUMNS:
+                terms.extend((field, token) for token in str(value).split())
+            else:
+                terms.append((field, value))
+        return terms
+
+    def _row_matches(self, table, row, terms):
+        columns = self.TABLE_COLUMNS[table]
+        for field, value in terms:
+            cell = row[columns.index(field)]
+            if field.endswith('_id'):
+                if str(cell) != str(value):
+                    return False
+            elif str(value).lower() not in ('' if cell is None else str(cell)).lower():
+                return False
+        return True
+
+    def search_query(self, table, fields_values):
+        if table == 'parts':
+            return self.search_part_ranked_query(fields_values)
+        return self._build_search(table, table[:-1] + '_id', fields_values)
+
+    def check_data_version(self):
+        # data_version changes when another connection (another process, or the other
+        # thread's connection) has committed since we last looked; our cached rows may
+        # then be stale
+        self.cursor.execute("PRAGMA data_version")
+        version = self.cursor.fetchone()[0]
+        if self._data_version is not None and version != self._data_version:
+            self.catalog_cache.clear()
+            for table in self.TABLE_COLUMNS:
+                self.search_cache.invalidate(table)
+        self._data_version = version
+
+    def _cached_rows(self, key, query, params):
+        self.check_data_version()
+        rows = self.catalog_cache.get(key)
+        if rows is None:
+            generation = self.catalog_cache.generation
+            self.cursor.execute(query, params)
+            rows = tuple(self.cursor.fetchall())
+            self.catalog_cache.put(key, rows, generation)
+        return list(rows)
+
+    def get_part(self, part_id):
+        rows = self._cached_rows(('part', int(part_id)),
+                                 f"SELECT {', '.join(self.TABLE_COLUMNS['parts'])} FROM parts WHERE part_id = ?",
+                                 (part_id,))
+        return rows[0] if rows else None
+
+    def get_module(self, module_id):
+        rows = self._cached_rows(('module', int(module_id)), "SELECT * FROM modules WHERE module_id = ?",
+                                 (module_id,))
+        return rows[0] if rows else None
+
+    def get_station(self, station_id):
+        rows = self._cached_rows(('station', int(station_id)), "SELECT * FROM stations WHERE station_id = ?",
+                                 (station_id,))
+        return rows[0] if rows else None
+
+    def search_cached(self, table, fields_values, block_size=256):
+        # Returns (rows, complete). Results of up to CACHE_ROW_LIMIT rows are returned
+        # whole and cached; for larger ones only the first block_size rows by id come back.
+        self.check_data_version()
+        fields_values = tuple(tuple(pair) for pair in fields_values)
+        rows = self.search_cache.get(table, fields_values)
+        if rows is None:
+            superset = self.search_cache.find_superset(table, fields_values)
+            if superset is not None:
+                terms = self._search_terms(table, fields_values)
+                rows = [row for row in superset if self._row_matches(table, row, terms)]
+                self.search_cache.put(table, fields_values, rows)
+        if rows is not None:
+            return rows, True
+        cursor = self.conn.execute(*self.search_query(table, fields_values))
+        rows = cursor.fetchmany(self.CACHE_ROW_LIMIT + 1)
+        cursor.close()
+        if len(rows) > self.CACHE_ROW_LIMIT:
+            # too many to rank as a whole: the first search_page in id order, the caller
+            # reads on from its keyset cursor
+            return self.search_page(table, fields_values, page_size=block_size)[0], False
+        self.search_cache.put(table, fields_values, rows)
+        return rows, True
+
+    def search_part_ranked(self, fields_values):
+        query, values = self.search_part_ranked_query(fields_values)
+        self.cursor.execute(query, values)
+        return self.cursor.fetchall()
+
+    def search_part(self, fields_values):
+        query, values = self.search_part_query(fields_values)
+        self.cursor.execute(query, values)
+        return self.cursor.fetchall()
+
+    def search_module_query(self, fields_values):
+        return self._build_search("modules", "module_id", fields_values)
+
+    def search_module(self, fields_values):
+        query, values = self.search_module_query(fields_values)
+        self.cursor.execute(query, values)
+        return self.cursor.fetchall()
+
+    def search_module_parts(self, module_id):
+        try:
+            self.cursor.execute('''
+                SELECT part_id, quantity
+                FROM modules_parts
+                WHERE module_id = ?
+            ''', (module_id,))
+        except Exception as e:
+            print(e)
+        return self.cursor.fetchall()
+
+    @staticmethod
+    def module_contents_query(module_id):
+        return '''
+            SELECT p.part_id, p.part_is_standard, p.part_name, p.part_vendor, p.part_description,
+                   p.part_spec, p.part_category, mp.quantity
+            FROM modules_parts AS mp
+            JOIN parts AS p ON p.part_id = mp.part_id
+            WHERE mp.module_id = ?
+            ORDER BY p.part_id
+        ''', [module_id]
+
+    def search_module_contents(self, module_id):
+        return self._cached_rows(('module_contents', int(module_id)), *self.module_contents_query(module_id))
+
+    def search_station_query(self, fields_values):
+        return self._build_search("stations", "station_id", fields_values)
+
+    def search_station(self, fields_values):
+        query, values = self.search_station_query(fields_values)
+        self.cursor.execute(query, values)
+        return self.cursor.fetchall()
+
+    def search_station_modules(self, station_id):
+        try:
+            self.cursor.execute('''
+                SELECT module_id, quantity
+                FROM stations_modules
+                WHERE station_id = ?
+            ''', (station_id,))
+        except Exception as e:
+            print(e)
+        return self.cursor.fetchall()
+
+    @staticmethod
+    def station_contents_query(station_id):
+        return '''
+            SELECT m.module_id, m.module_name, m.module_belonging, sm.quantity
+            FROM stations_modules AS sm
+            JOIN modules AS m ON m.module_id = sm.module_id
+            WHERE sm.station_id = ?
+            ORDER BY m.module_id
+        ''', [station_id]
+
+    def search_station_contents(self, station_id):
+        return self._cached_rows(('station_contents', int(station_id)), *self.station_contents_query(station_id))
+
+    def part_in_use(self, part_id):
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM modules_parts WHERE part_id = ?)", (part_id,))
+        return bool(self.cursor.fetchone()[0])
+
+    def module_in_use(self, module_id):
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM stations_modules WHERE module_id = ?)", (module_id,))
+        return bool(self.cursor.fetchone()[0])
+
+    @staticmethod
+    def part_where_used_query(part_id):
+        # the modules containing the part, then the stations containing those modules with
+        # the part's total quantity per station; both go through part_id indexes
+        return '''
+            SELECT '模組', m.module_id, m.module_name, mp.quantity
+            FROM modules_parts AS mp
+            JOIN modules AS m ON m.module_id = mp.module_id
+            WHERE mp.part_id = ?
+            UNION ALL
+            SELECT '站位', s.station_id, s.station_name, t.quantity
+            FROM station_part_totals AS t
+            JOIN stations AS s ON s.station_id = t.station_id
+            WHERE t.part_id = ?
+            ORDER BY 1, 2
+        ''', [part_id, part_id]
+
+    @staticmethod
+    def module_where_used_query(module_id):
+        return '''
+            SELECT '站位', s.station_id, s.station_name, sm.quantity
+            FROM stations_modules AS sm
+            JOIN stations AS s ON s.station_id = sm.station_id
+            WHERE sm.module_id = ?
+            ORDER BY s.station_id
+        ''', [module_id]
+
+    def part_where_used(self, part_id):
+        self.cursor.execute(*self.part_where_used_query(part_id))
+        return self.cursor.fetchall()
+
+    def module_where_used(self, module_id):
+        self.cursor.execute(*self.module_where_used_query(module_id))
+        return self.cursor.fetchall()
+
+    @staticmethod
+    def rollup_query(stations):
+        # total quantity of every part needed to build the given stations: a list of
+        # station ids (one of each) or a {station_id: count} demand, summed over their
+        # rows of station_part_totals
+        if not isinstance(stations, dict):
+            stations = dict.fromkeys(stations, 1)
+        return '''
+            SELECT p.part_id, p.part_is_standard, p.part_name, p.part_vendor, p.part_description,
+                   p.part_spec, p.part_category, t.quantity
+            FROM (
+                SELECT spt.part_id, SUM(d.value * spt.quantity) AS quantity
+                FROM json_each(?) AS d
+                JOIN station_part_totals AS spt ON spt.station_id = CAST(d.key AS INTEGER)
+                GROUP BY spt.part_id
+            ) AS t
+            JOIN parts AS p ON p.part_id = t.part_id
+            ORDER BY t.part_id
+        ''', [json.dumps({int(station_id): count for station_id, count in stations.items()})]
+
+    def _spec_candidates(self, norm):
+        # ids of the parts sharing the most of the rarest trigrams of a normalized spec,
+        # none without parts_spec_fts
+        trigrams = sorted({norm[i:i + 3] for i in range(len(norm) - 2)})
+        if not trigrams or not self.spec_fts_enabled:
+            return []
+        self.cursor.execute(f"SELECT term, doc FROM parts_spec_vocab WHERE term IN ({', '.join('?' * len(trigrams))})",
+                            trigrams)
+        counts = dict(self.cursor.fetchall())
+        rare = sorted(counts, key=counts.get)[:self.SIMILAR_TRIGRAMS]
+        if not rare:
+            return []
+        # counting matched terms per row is cheaper than ranking an OR query with bm25
+        matches = " UNION ALL ".join(["SELECT rowid FROM parts_spec_fts WHERE parts_spec_fts MATCH ?"] * len(rare))
+        self.cursor.execute(f"SELECT rowid FROM ({matches}) GROUP BY rowid ORDER BY COUNT(*) DESC LIMIT ?",
+                            [f'"{trigram}"' for trigram in rare] + [self.SIMILAR_CANDIDATES])
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def similar_parts(self, part_spec, exclude_id=None, vendor=None, min_ratio=None):
+        # Parts whose spec is the same as part_spec once normalized, or close to it, as
+        # (similarity, parts row) best first, only those of vendor (normalized too) when
+        # it is given. Same ones come from idx_parts_spec_norm, close ones from
+        # parts_spec_fts, neither reads more of parts than the matches.
+        min_ratio = self.SIMILAR_RATIO if min_ratio is None else min_ratio
+        vendor = None if vendor is None else normalize_spec(vendor)
+        vendor_column = self.TABLE_COLUMNS['parts'].index('part_vendor')
+        norm = normalize_spec(part_spec)
+        if not norm:
+            return []
+        columns = ", ".join(self.TABLE_COLUMNS['parts'])
+        self.cursor.execute(f'''
+            SELECT {columns}, part_spec_norm FROM parts
+            WHERE part_spec_norm = ? OR part_id IN (SELECT value FROM json_each(?))
+        ''', (norm, json.dumps(self._spec_candidates(norm) if min_ratio < 1 else [])))
+        similar = []
+        for row in self.cursor.fetchall():
+            if exclude_id is not None and str(row[0]) == str(exclude_id):
+                continue
+            if vendor is not None and normalize_spec(row[vendor_column]) != vendor:
+                continue
+            ratio = 1.0 if row[-1] == norm else SequenceMatcher(None, norm, row[-1] or '').ratio()
+            if ratio >= min_ratio:
+                similar.append((round(ratio, 3), row[:-1]))
+        similar.sort(key=lambda match: (-match[0], match[1][0]))
+        return similar
+
+    def duplicate_parts(self):
+        # Groups of parts with the same normalized spec, vendor and name, as {group id:
+        # [(parts row, number of modules using it)]} with the one to keep first: the most
+        # used, then the oldest. The group id is the lowest part id in it, so it stays the
+        # same between a report and the merge of the groups picked from it.
+        columns = ", ".join(self.TABLE_COLUMNS['parts'])
+        self.cursor.execute(f'''
+            SELECT {columns}, part_spec_norm,
+                   (SELECT COUNT(*) FROM modules_parts AS mp WHERE mp.part_id = parts.part_id)
+            FROM parts
+            WHERE part_spec_norm IN (
+                SELECT part_spec_norm FROM parts WHERE part_spec_norm != ''
+                GROUP BY part_spec_norm HAVING COUNT(*) > 1
+            )
+            ORDER BY part_spec_norm, part_id
+        ''')
+        name = self.TABLE_COLUMNS['parts'].index('part_name')
+        vendor = self.TABLE_COLUMNS['parts'].index('part_vendor')
+        groups = OrderedDict()
+        for row in self.cursor.fetchall():
+            key = (row[-2], normalize_spec(row[vendor]), normalize_spec(row[name]))
+            groups.setdefault(key, []).append((row[:-2], row[-1]))
+        return OrderedDict((min(row[0] for row, _ in group), sorted(group, key=lambda part: (-part[1], part[0][0])))
+                           for group in groups.values() if len(group) > 1)
+
+    def merge_parts(self, keep_id, duplicate_ids):
+        # Moves every module's use of the duplicates to keep_id, adding up the quantities
+        # of a module that already had it, and deletes the duplicates. Returns how many
+        # modules_parts rows were moved.
+        duplicates = json.dumps([int(part_id) for part_id in duplicate_ids if int(part_id) != int(keep_id)])
+        self.search_cache.invalidate('parts')
+        self.search_cache.invalidate('modules')
+        with self.transaction():
+            if self.get_part(keep_id) is None:
+                raise KeyError(f"no part with id {keep_id}")
+            in_duplicates = "part_id IN (SELECT value FROM json_each(?))"
+            self.cursor.execute(f'''
+                UPDATE modules SET revision = revision + 1
+                WHERE module_id IN (SELECT module_id FROM modules_parts WHERE {in_duplicates})
+            ''', (duplicates,))
+            self.cursor.execute(f'''
+                INSERT INTO modules_parts (module_id, part_id, quantity)
+                SELECT module_id, ?, SUM(quantity) FROM modules_parts WHERE {in_duplicates} GROUP BY module_id
+                ON CONFLICT (module_id, part_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (keep_id, duplicates))
+            self.cursor.execute(f"DELETE FROM modules_parts WHERE {in_duplicates}", (duplicates,))
+            moved = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM parts WHERE {in_duplicates}", (duplicates,))
+        return moved
+
+    def station_ids(self, station_names):
+        ids = []
+        for name in station_names:
+            self.cursor.execute("SELECT station_id FROM stations WHERE station_name = ?", (name,))
+            row = self.cursor.fetchone()
+            if row is None:
+                raise KeyError(f"no station named {name!r}")
+            ids.append(row[0])
+        return ids
+
+    def rollup_stations(self, stations):
+        self.cursor.execute(*self.rollup_query(stations))
+        return self.cursor.fetchall()
+
+    def rollup_summary(self, stations):
+        # (number of different parts, total quantity) of a rollup
+        query, params = self.rollup_query(stations)
+        self.cursor.execute(f"SELECT COUNT(*), IFNULL(SUM(quantity), 0) FROM ({query})", params)
+        return self.cursor.fetchone()
+
+    def rollup_matrix(self):
+        # The sparse matrix rollup engine (needs numpy and scipy) for many demands at once,
+        # loaded on first use and brought up to date with the database on every call.
+        if self._rollup_matrix is None:
+            from rollup_matrix import RollupMatrix
+            self._rollup_matrix = RollupMatrix(self)
+        else:
+            self._rollup_matrix.refresh()
+        return self._rollup_matrix
+
+    def export_query(self, query, params, headers, path, progress=None, progress_every=5000):
+        # Streams a result set from the cursor into an .xlsx (openpyxl write-only workbook)
+        # or .csv file, chosen by the extension, so memory stays flat however many rows
+        # there are. progress(done, total) is called every progress_every rows; an
+        # exception raised from it aborts the export. The rows go to a temporary file next
+        # to path that replaces it only once complete, so an aborted export leaves an
+        # existing file as it was. Returns the number of rows written.
+        total = None
+        if progress is not None:
+            self.cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+            total = self.cursor.fetchone()[0]
+            progress(0, total)
+        xlsx = os.path.splitext(path)[1].lower() == '.xlsx'
+        count = 0
+        # not mkstemp, whose file would keep its owner-only mode after the replace
+        directory, name = os.path.split(os.path.abspath(path))
+        temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        sheet = None
+        try:
+            if xlsx:
+                from openpyxl import Workbook
+                workbook = Workbook(write_only=True)
+                sheet = workbook.create_sheet('BOM')
+                sheet.append(headers)
+                write = sheet.append
+            else:
+                f = open(temp_path, 'w', newline='', encoding='utf-8-sig')
+                writer = csv.writer(f)
+                writer.writerow(headers)
+                write = writer.writerow
+            try:
+                for row in self.iter_rows(query, params):
+                    if xlsx and count == self.XLSX_MAX_ROWS:
+                        raise ValueError(f"more than {self.XLSX_MAX_ROWS} rows do not fit in an .xlsx sheet, export to .csv")
+                    write(row)
+                    count += 1
+                    if progress is not None and count % progress_every == 0:
+                        progress(count, total)
+                if xlsx:
+                    workbook.save(temp_path)
+            finally:
+                if not xlsx:
+                    f.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if sheet is not None and sheet._writer is not None and not sheet.closed:
+                # until saved the sheet's rows sit in a temporary file of openpyxl's
+                sheet.close()
+                sheet._writer.cleanup()
+            raise
+        if progress is not None:
+            progress(count, total)
+        return count
+
+    def export_module(self, module_id, path, progress=None):
+        return self.export_query(*self.module_contents_query(module_id), self.MODULE_CONTENTS_HEADERS, path, progress)
+
+    def export_station(self, station_id, path, progress=None):
+        return self.export_query(*self.station_contents_query(station_id), self.STATION_CONTENTS_HEADERS, path,
+                                 progress)
+
+    def export_rollup(self, stations, path, progress=None):
+        return self.export_query(*self.rollup_query(stations), self.ROLLUP_HEADERS, path, progress)
+
+    def edit_part(self, part_is_standard, part_name, part_vendor, part_description, part_spec, part_category, part_id):
+        self.search_cache.invalidate('parts')
+        sql = "UPDATE parts SET part_is_standard = ?, part_name = ?, part_vendor = ?, part_description = ?, part_spec = ?, part_category = ?, part_spec_norm = ? WHERE part_id = ?"
+        with self.transaction():
+            self.cursor.execute(sql, (part_is_standard, part_name, part_vendor, part_description, part_spec, part_category,
+                                      normalize_spec(part_spec), part_id))
+
+    def edit_module(self, module_name, module_cate, module_id):
+        self.search_cache.invalidate('modules')
+        try:
+            sql = "UPDATE modules SET module_name = ?, module_belonging = ?, revision = revision + 1 WHERE module_id = ?"
+            with self.transaction():
+                self.cursor.execute(sql, (module_name, module_cate, module_id))
+        except Exception as e:
+            print(e)
+
+    def _save_contents(self, table, owner_column, item_column, owner_id, changed, removed):
+        # Writes only the difference to the stored contents: removed links are deleted,
+        # added and changed ones upserted. An upsert with an unchanged quantity writes nothing.
+        if removed:
+            self.cursor.executemany(f"DELETE FROM {table} WHERE {owner_column} = ? AND {item_column} = ?",
+                                    [(owner_id, item_id) for item_id in removed])
+        if changed:
+            self.cursor.executemany(f'''
+                INSERT INTO {table} ({owner_column}, {item_column}, quantity) VALUES(?, ?, ?)
+                ON CONFLICT({owner_column}, {item_column}) DO UPDATE SET quantity = excluded.quantity
+                WHERE quantity IS NOT excluded.quantity
+            ''', [(owner_id, item['id'], item['quantity']) for item in changed])
+
+    @staticmethod
+    def _contents_diff(current, items):
+        # (changed, removed) turning the stored {id: quantity} into the complete list items
+        wanted = {int(item['id']): item for item in items}
+        removed = [item_id for item_id in current if item_id not in wanted]
+        changed = [item for item_id, item in wanted.items()
+                   if item_id not in current or str(current[item_id]) != str(item['quantity'])]
+        return changed, removed
+
+    def _bump_revision(self, table, key, row_id, revision, assignments=(), params=()):
+        # Bumps the row's revision, together with the given column updates. With a revision
+        # the row must still be at it, otherwise someone else saved in between.
+        sql = f"UPDATE {table} SET {''.join(f'{column} = ?, ' for column in assignments)}revision = revision + 1 " \
+              f"WHERE {key} = ?"
+        params = list(params) + [row_id]
+        if revision is not None:
+            sql += " AND revision = ?"
+            params.append(revision)
+        self.cursor.execute(sql, params)
+        if self.cursor.rowcount == 0:
+            if revision is None:
+                raise KeyError(f"{table} {row_id} does not exist")
+            raise ConflictError(f"{table} {row_id} was changed or removed since revision {revision}")
+        self.cursor.execute(f"SELECT revision FROM {table} WHERE {key} = ?", (row_id,))
+        return self.cursor.fetchone()[0]
+
+    def edit_module_parts(self, module_id, parts):
+        try:
+            with self.transaction():
+                changed, removed = self._contents_diff(dict(self.search_module_parts(module_id)), parts)
+                self._bump_revision('modules', 'module_id', module_id, None)
+                self._save_contents('modules_parts', 'module_id', 'part_id', module_id, changed, removed)
+        except (sqlite3.Error, KeyError) as e:
+            print(e)
+
+    def save_module(self, module_id, module_name, module_cate, changed, removed, revision=None):
+        # Saves the header and the content changes (parts added or with a new quantity as
+        # {'id', 'quantity'}, removed part ids) in one transaction. Raises ConflictError when
+        # the module is no longer at revision, returns the new revision or None on failure.
+        self.search_cache.invalidate('modules')
+        try:
+            with self.transaction():
+                new_revision = self._bump_revision('modules', 'module_id', module_id, revision,
+                                                   ('module_name', 'module_belonging'), (module_name, module_cate))
+                self._save_contents('modules_parts', 'module_id', 'part_id', module_id, changed, removed)
+            return new_revision
+        except sqlite3.Error as e:
+            print(e)
+            return None
+
+    def edit_station(self, station_name, module_id):
+        self.search_cache.invalidate('stations')
+        try:
+            sql = "UPDATE stations SET station_name = ?, revision = revision + 1 WHERE station_id = ?"
+            with self.transaction():
+                self.cursor.execute(sql, (station_name, module_id))
+        except Exception as e:
+            print(e)
+
+    def edit_station_modules(self, station_id, modules):
+        try:
+            with self.transaction():
+                changed, removed = self._contents_diff(dict(self.search_station_modules(station_id)), modules)
+                self._bump_revision('stations', 'station_id', station_id, None)
+                self._save_contents('stations_modules', 'station_id', 'module_id', station_id, changed, removed)
+        except (sqlite3.Error, KeyError) as e:
+            print(e)
+
+    def save_station(self, station_id, station_name, changed, removed, revision=None):
+        # same as save_module, with module ids
+        self.search_cache.invalidate('stations')
+        try:
+            with self.transaction():
+                new_revision = self._bump_revision('stations', 'station_id', station_id, revision,
+                                                   ('station_name',), (station_name,))
+                self._save_contents('stations_modules', 'station_id', 'module_id', station_id, changed, removed)
+            return new_revision
+        except sqlite3.Error as e:
+            print(e)
+            return None
+
+    def stats_snapshot(self):
+        return None if self.stats is None else self.stats.snapshot()
+
+    def vacuum(self):
+        # rewrites the file without free pages, returns the sizes in bytes before and after
+        before = os.path.getsize(self.path)
+        self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("PRAGMA optimize")
+        return before, os.path.getsize(self.path)
+
+    def close(self):
+        try:
+            # refresh planner statistics for the indexes the session actually used, which
+            # writes, so not from a query_only connection
+            if str(self.pragmas.get('query_only', 'OFF')).upper() not in ('ON', '1', 'TRUE'):
+                self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            print(e)
+        self.conn.close()
+
+
+# import_catalogs worker processes, they send (path, batch, rejected, error) to the
+# writer; batch None marks the end of a file
+_import_queue = None
+
+
+def _init_import_worker(batches):
+    global _import_queue
+    _import_queue = batches
+
+
+def _read_import_file(path, sheet, batch_size):
+    error = None
+    try:
+        for batch, rejected in PartsDatabase.read_catalog_batches(path, sheet, batch_size):
+            _import_queue.put((path, batch, rejected, None))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    _import_queue.put((path, None, [], error))
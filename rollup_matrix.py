@@ -0,0 +1,177 @@
+import json
+
+import numpy as np
+from scipy import sparse
+
+
+def _resized(matrix, shape):
+    if matrix.shape == shape:
+        return matrix
+    matrix = matrix.tocsr(copy=True)
+    matrix.resize(shape)
+    return matrix
+
+
+def _replace_rows(matrix, row_ids, replacement):
+    # matrix with the rows row_ids replaced by the rows of replacement, built from the CSR
+    # arrays: the unchanged runs of rows between them are copied as whole slices
+    order = np.argsort(row_ids)
+    row_ids = np.asarray(row_ids, dtype=np.int64)[order]
+    replacement = _resized(replacement, (len(row_ids), matrix.shape[1]))[order]
+    counts = np.diff(matrix.indptr)
+    counts[row_ids] = np.diff(replacement.indptr)
+    indptr = np.zeros(len(counts) + 1, dtype=matrix.indptr.dtype)
+    np.cumsum(counts, out=indptr[1:])
+    indices, data = [], []
+    start = 0
+    for new_row, row in enumerate(row_ids):
+        for target, source in ((indices, matrix.indices), (data, matrix.data)):
+            target.append(source[matrix.indptr[start]:matrix.indptr[row]])
+        for target, source in ((indices, replacement.indices), (data, replacement.data)):
+            target.append(source[replacement.indptr[new_row]:replacement.indptr[new_row + 1]])
+        start = row + 1
+    indices.append(matrix.indices[matrix.indptr[start]:])
+    data.append(matrix.data[matrix.indptr[start]:])
+    return sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=matrix.shape)
+
+
+class RollupMatrix:
+    # stations_modules and modules_parts held as sparse station x module and module x part
+    # quantity matrices, indexed by the ids themselves, and their product station x part.
+    # A demand {station_id: count} then rolls up with one vector-matrix product, and a
+    # batch of demands with one matrix product. refresh() brings the matrices up to date
+    # by comparing the revision counters of modules and stations, so only the rows of
+    # what changed (in any connection) are read again.
+
+    def __init__(self, db):
+        self.db = db
+        self.generation = None
+        self.load()
+
+    def _links(self, table, owner, item, owner_ids=None):
+        # (owner ids, item ids, quantities) of a link table, of every owner or only the given ones
+        query = f"SELECT {owner}, {item}, IFNULL(CAST(quantity AS INTEGER), 0) FROM {table}"
+        params = ()
+        if owner_ids is not None:
+            query += f" WHERE {owner} IN (SELECT value FROM json_each(?))"
+            params = (json.dumps([int(owner_id) for owner_id in owner_ids]),)
+        links = np.array(self.db.conn.execute(query, params).fetchall(), dtype=np.int64).reshape(-1, 3)
+        return links[:, 0], links[:, 1], links[:, 2]
+
+    def _revisions(self, table, key):
+        return dict(self.db.conn.execute(f"SELECT {key}, revision FROM {table}").fetchall())
+
+    def _max_id(self, table, key):
+        return self.db.conn.execute(f"SELECT IFNULL(MAX({key}), 0) FROM {table}").fetchone()[0]
+
+    def _shapes(self):
+        stations = self._max_id('stations', 'station_id') + 1
+        modules = self._max_id('modules', 'module_id') + 1
+        parts = self._max_id('parts', 'part_id') + 1
+        if self.generation is not None:
+            # ids of removed rows keep their (now empty) row or column
+            stations = max(stations, self.station_modules.shape[0])
+            modules = max(modules, self.module_parts.shape[0])
+            parts = max(parts, self.module_parts.shape[1])
+        return stations, modules, parts
+
+    def load(self):
+        # the generation is read first, a commit while loading makes the next refresh look again
+        self.db.check_data_version()
+        generation = self.db.catalog_cache.generation
+        self.module_revisions = self._revisions('modules', 'module_id')
+        self.station_revisions = self._revisions('stations', 'station_id')
+        self.generation = None
+        stations, modules, parts = self._shapes()
+        rows, columns, quantities = self._links('stations_modules', 'station_id', 'module_id')
+        self.station_modules = sparse.csr_matrix((quantities, (rows, columns)), shape=(stations, modules))
+        rows, columns, quantities = self._links('modules_parts', 'module_id', 'part_id')
+        self.module_parts = sparse.csr_matrix((quantities, (rows, columns)), shape=(modules, parts))
+        self.station_parts = (self.station_modules @ self.module_parts).tocsr()
+        self.generation = generation
+
+    @staticmethod
+    def _changed(before, after):
+        changed = [row_id for row_id, revision in after.items() if before.get(row_id) != revision]
+        return changed + [row_id for row_id in before if row_id not in after]
+
+    def refresh(self):
+        # Returns whether the matrices changed. Nothing is read unless some connection
+        # committed since the last load or refresh.
+        self.db.check_data_version()
+        generation = self.db.catalog_cache.generation
+        if generation == self.generation:
+            return False
+        module_revisions = self._revisions('modules', 'module_id')
+        station_revisions = self._revisions('stations', 'station_id')
+        changed_modules = self._changed(self.module_revisions, module_revisions)
+        changed_stations = self._changed(self.station_revisions, station_revisions)
+        stations, modules, parts = self._shapes()
+        self.module_revisions = module_revisions
+        self.station_revisions = station_revisions
+        self.generation = generation
+        if not (changed_modules or changed_stations) and (stations, parts) == self.station_parts.shape:
+            return False
+        # stations built from a changed module, as they were before the change
+        affected = set(changed_stations)
+        old_columns = [module_id for module_id in changed_modules if module_id < self.station_modules.shape[1]]
+        if old_columns:
+            affected.update(np.unique(self.station_modules[:, old_columns].nonzero()[0]).tolist())
+        self.station_modules = _resized(self.station_modules, (stations, modules))
+        self.module_parts = _resized(self.module_parts, (modules, parts))
+        self.station_parts = _resized(self.station_parts, (stations, parts))
+        if changed_modules:
+            rows, columns, quantities = self._links('modules_parts', 'module_id', 'part_id', changed_modules)
+            index = {module_id: row for row, module_id in enumerate(changed_modules)}
+            replacement = sparse.csr_matrix((quantities, ([index[row] for row in rows], columns)),
+                                            shape=(len(changed_modules), parts))
+            self.module_parts = _replace_rows(self.module_parts, changed_modules, replacement)
+        if changed_stations:
+            rows, columns, quantities = self._links('stations_modules', 'station_id', 'module_id', changed_stations)
+            index = {station_id: row for row, station_id in enumerate(changed_stations)}
+            replacement = sparse.csr_matrix((quantities, ([index[row] for row in rows], columns)),
+                                            shape=(len(changed_stations), modules))
+            self.station_modules = _replace_rows(self.station_modules, changed_stations, replacement)
+        affected = sorted(affected)
+        if affected:
+            self.station_parts = _replace_rows(self.station_parts, affected,
+                                               self.station_modules[affected] @ self.module_parts)
+        return True
+
+    def demand_matrix(self, demands):
+        # one row per {station_id: count} demand; unknown stations raise KeyError
+        rows, columns, counts = [], [], []
+        for row, demand in enumerate(demands):
+            for station_id, count in demand.items():
+                if int(station_id) not in self.station_revisions:
+                    raise KeyError(f"no station with id {station_id}")
+                rows.append(row)
+                columns.append(int(station_id))
+                counts.append(count)
+        return sparse.csr_matrix((counts, (rows, columns)), shape=(len(demands), self.station_parts.shape[0]))
+
+    def rollup_many(self, demands):
+        # demands x parts matrix of the total quantity of every part each demand needs
+        return (self.demand_matrix(demands) @ self.station_parts).tocsr()
+
+    @staticmethod
+    def totals(row):
+        # [(part_id, quantity)] of one row of rollup_many, by part id
+        row = row.tocsr()
+        order = np.argsort(row.indices)
+        return [(int(part_id), quantity.item()) for part_id, quantity in zip(row.indices[order], row.data[order])
+                if quantity]
+
+    def rollup(self, demand):
+        return self.totals(self.rollup_many([demand])[0])
+
+    def rows(self, totals):
+        # totals [(part_id, quantity)] joined back to parts, as rows of PartsDatabase.ROLLUP_HEADERS
+        quantities = dict(totals)
+        rows = []
+        for start in range(0, len(totals), 10000):
+            ids = json.dumps([part_id for part_id, _ in totals[start:start + 10000]])
+            rows.extend(row + (quantities[row[0]],) for row in self.db.conn.execute(
+                f"SELECT {', '.join(self.db.TABLE_COLUMNS['parts'])} FROM parts "
+                f"WHERE part_id IN (SELECT value FROM json_each(?)) ORDER BY part_id", (ids,)))
+        return rows
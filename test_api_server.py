@@ -0,0 +1,131 @@
+import asyncio
+import http.client
+import json
+import sqlite3
+from urllib.parse import quote
+
+import pytest
+
+from api_server import MAX_PAGE_SIZE, ApiServer
+
+
+@pytest.fixture
+def api(db, bom):
+    # (request(method, path, body) -> (status, json), bom) against an ApiServer on a free port
+    db.close()
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(ApiServer(db.path, readers=2).start(port=0))
+
+    def request(method, path, body=None):
+        def send():
+            connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+            connection.request(method, path, None if body is None else json.dumps(body))
+            response = connection.getresponse()
+            result = response.status, json.loads(response.read())
+            connection.close()
+            return result
+        return loop.run_until_complete(loop.run_in_executor(None, send))
+    yield request, bom
+    loop.run_until_complete(server.close())
+    # lets the closed connections' transports finish before the loop goes
+    loop.run_until_complete(asyncio.sleep(0.01))
+    loop.close()
+
+
+def store_station(name):
+    return {'op': 'store_station', 'args': {'station_name': name}}
+
+
+def test_search(api):
+    request, (parts, module_id, station_id) = api
+    status, result = request('GET', '/search/parts?vendor=SMC')
+    assert status == 200
+    assert [row[0] for row in result['rows']] == parts
+    status, result = request('GET', '/search/parts?sort=part_spec&desc=1&limit=1')
+    assert status == 200 and [row[0] for row in result['rows']] == [parts[1]]
+    after = quote(json.dumps(result['next']))
+    status, result = request('GET', f'/search/parts?sort=part_spec&desc=1&limit=1&after={after}')
+    assert [row[0] for row in result['rows']] == [parts[0]]
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_search_limit_below_one(api, limit):
+    request, _ = api
+    assert request('GET', f'/search/parts?sort=part_name&limit={limit}')[0] == 400
+
+
+def test_search_limit_is_capped(api):
+    request, _ = api
+    status, result = request('GET', f'/search/parts?sort=part_name&limit={MAX_PAGE_SIZE * 10}')
+    assert status == 200 and len(result['rows']) == 2
+
+
+def test_batch(api):
+    request, (parts, module_id, station_id) = api
+    status, result = request('POST', '/batch', {'operations': [
+        store_station('s2'),
+        {'op': 'save_module', 'args': {'module_id': module_id, 'module_name': 'm1', 'module_cate': 'Robot',
+                                       'changed': [{'id': parts[0], 'quantity': 4}], 'removed': [],
+                                       'revision': 1}},
+    ]})
+    assert status == 200 and result['results'] == [station_id + 1, 2]
+    status, result = request('GET', f'/modules/{module_id}')
+    assert result['revision'] == 2 and [row[-1] for row in result['rows']] == [4, 5]
+
+
+def test_batch_conflict(api):
+    request, (parts, module_id, station_id) = api
+    status, _ = request('POST', '/batch', {'operations': [
+        store_station('s2'),
+        {'op': 'save_module', 'args': {'module_id': module_id, 'module_name': 'm1', 'module_cate': 'Robot',
+                                       'changed': [], 'removed': [], 'revision': 0}},
+    ]})
+    assert status == 409
+    assert request('GET', '/search/stations?name=s2')[1]['rows'] == []
+
+
+def test_batch_integrity_error(api):
+    request, _ = api
+    status, result = request('POST', '/batch', {'operations': [store_station('s2'), store_station('s2')]})
+    assert status == 409 and 'UNIQUE' in result['error']
+    assert request('GET', '/search/stations?name=s2')[1]['rows'] == []
+
+
+def test_batch_failed_operation_rolls_back(api):
+    request, (parts, module_id, station_id) = api
+    status, _ = request('POST', '/batch', {'operations': [
+        store_station('s2'), {'op': 'delete_part', 'args': {'part_id': parts[0]}}]})
+    assert status == 409
+    assert request('GET', '/search/stations?name=s2')[1]['rows'] == []
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    {'operations': 'store_station'},
+    {'operations': [{'op': 'vacuum'}]},
+    {'operations': [{'op': 'store_station', 'args': {'name': 's2'}}]},
+    {'operations': [{'op': 'store_station', 'args': ['s2']}]},
+])
+def test_batch_bad_body(api, body):
+    request, _ = api
+    assert request('POST', '/batch', body)[0] == 400
+
+
+def test_error_statuses(api):
+    request, _ = api
+    assert request('GET', '/parts/999')[0] == 404
+    assert request('GET', '/nowhere')[0] == 404
+    assert request('POST', '/metrics')[0] == 405
+    assert request('GET', '/search/parts?sort=nope')[0] == 400
+    status, result = request('GET', '/metrics')
+    assert status == 200 and result['routes']['GET /parts/{id}']['errors'] == 1
+
+
+def test_readers_are_read_only(db):
+    db.close()
+    server = ApiServer(db.path, readers=1)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            server.readers[0].store_station('s2')
+    finally:
+        asyncio.run(server.close())
@@ -0,0 +1,71 @@
+import csv
+import glob
+import os
+import tempfile
+
+import pytest
+
+from parts_database import PartsDatabase
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(csv.reader(f))
+
+
+def temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+
+def test_export_csv(db, bom, tmp_path):
+    parts, module_id, station_id = bom
+    path = tmp_path / 'm1.csv'
+    assert db.export_module(module_id, str(path)) == 2
+    rows = read_csv(path)
+    assert rows[0] == PartsDatabase.MODULE_CONTENTS_HEADERS
+    assert [(row[0], row[-1]) for row in rows[1:]] == [(str(parts[0]), '3'), (str(parts[1]), '5')]
+    assert temp_files(tmp_path) == []
+
+
+def test_export_xlsx(db, bom, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    parts, module_id, station_id = bom
+    path = tmp_path / 's1.xlsx'
+    progress = []
+    assert db.export_station(station_id, str(path), lambda done, total: progress.append((done, total))) == 1
+    assert progress == [(0, 1), (1, 1)]
+    rows = list(openpyxl.load_workbook(path).active.values)
+    assert list(rows[0]) == PartsDatabase.STATION_CONTENTS_HEADERS
+    assert rows[1][0] == module_id and rows[1][-1] == 2
+
+
+@pytest.mark.parametrize('name', ['m1.csv', 'm1.xlsx'])
+def test_aborted_export_keeps_the_file(db, bom, tmp_path, name):
+    parts, module_id, station_id = bom
+    path = tmp_path / name
+    path.write_bytes(b'earlier export')
+
+    def cancel(done, total):
+        if done:
+            raise InterruptedError
+    openpyxl_files = set(glob.glob(os.path.join(tempfile.gettempdir(), 'openpyxl.*')))
+    with pytest.raises(InterruptedError):
+        db.export_query(*db.module_contents_query(module_id), PartsDatabase.MODULE_CONTENTS_HEADERS, str(path),
+                        cancel, progress_every=1)
+    assert path.read_bytes() == b'earlier export'
+    assert temp_files(tmp_path) == []
+    assert set(glob.glob(os.path.join(tempfile.gettempdir(), 'openpyxl.*'))) == openpyxl_files
+
+
+def test_too_many_rows_for_xlsx(db, bom, tmp_path, monkeypatch):
+    pytest.importorskip('openpyxl')
+    parts, module_id, station_id = bom
+    monkeypatch.setattr(PartsDatabase, 'XLSX_MAX_ROWS', 1)
+    path = tmp_path / 'm1.xlsx'
+    path.write_bytes(b'earlier export')
+    with pytest.raises(ValueError):
+        db.export_module(module_id, str(path))
+    assert path.read_bytes() == b'earlier export'
+    assert temp_files(tmp_path) == []
+    # the same rows fit a .csv
+    assert db.export_module(module_id, str(tmp_path / 'm1.csv')) == 2
@@ -0,0 +1,92 @@
+import csv
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+def write_xlsx(path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'catalog'
+    sheet.append(['SMC 2024'])
+    sheet.append(['標準件/非標準件', '零件名稱', '品牌', '零件描述', '規格型號', '類別'])
+    sheet.append(['標準件', '三通手動閥', 'SMC', '無洩氣', 'VHK3-08F-08F', '氣動元件'])
+    sheet.append(['標準件', '兩通手動閥', 'SMC', '無洩氣', 'VHK2-08F-08F', '氣動元件'])
+    sheet.append([None, None, None, None, None, None])
+    sheet.append(['標準件', None, 'SMC', '無名', 'X-1', '氣動元件'])
+    sheet.append(['標準件', '接頭', 'SMC', None, 8.0, '氣動元件'])
+    # a sheet without a header row is not read
+    workbook.create_sheet('history').append(['2024-01-01', 'first release'])
+    workbook.save(path)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['標準件', '名稱', '品牌', '描述', '規格', '類別'])
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def catalogs(tmp_path):
+    xlsx = str(tmp_path / 'smc.xlsx')
+    write_xlsx(xlsx)
+    airtac = str(tmp_path / 'airtac.csv')
+    write_csv(airtac, [['標準件', '氣缸', 'Airtac', '雙作用', 'SC32x50', '氣動元件'],
+                       ['標準件', '氣缸', 'Airtac', '雙作用', 'SC32x50', '氣動元件'],
+                       ['標準件', '氣缸', 'Airtac', '雙作用', 'SC32x100', '氣動元件']])
+    return xlsx, airtac
+
+
+def parts(db):
+    db.cursor.execute("SELECT part_name, part_vendor, part_spec, part_category, part_spec_norm FROM parts "
+                      "ORDER BY part_name, part_spec")
+    return db.cursor.fetchall()
+
+
+def test_import_catalogs(db, catalogs):
+    xlsx, airtac = catalogs
+    progress = []
+    reports = db.import_catalogs([xlsx, airtac], workers=2, batch_size=2,
+                                 progress=lambda path, report, done: progress.append((path, done)))
+    assert reports[xlsx] == {'inserted': 3, 'updated': 0, 'unchanged': 0,
+                             'rejected': [('catalog', 6, 'missing part name')], 'error': None}
+    assert reports[airtac] == {'inserted': 2, 'updated': 0, 'unchanged': 1, 'rejected': [], 'error': None}
+    assert sorted(path for path, done in progress if done) == sorted([xlsx, airtac])
+    assert parts(db) == [
+        ('三通手動閥', 'SMC', 'VHK3-08F-08F', '氣動元件', 'vhk308f08f'),
+        ('兩通手動閥', 'SMC', 'VHK2-08F-08F', '氣動元件', 'vhk208f08f'),
+        ('接頭', 'SMC', '8', '氣動元件', '8'),
+        ('氣缸', 'Airtac', 'SC32x100', '氣動元件', 'sc32x100'),
+        ('氣缸', 'Airtac', 'SC32x50', '氣動元件', 'sc32x50'),
+    ]
+    # imported parts are found by the full-text search
+    assert [row[2] for row in db.search_part([('part_name', '手動閥')])] == ['三通手動閥', '兩通手動閥']
+
+
+def test_import_again(db, catalogs, tmp_path):
+    xlsx, airtac = catalogs
+    db.import_catalogs([airtac], workers=1)
+    write_csv(airtac, [['標準件', '氣缸', 'Airtac', '雙作用', 'SC32x50', '氣缸'],
+                       ['標準件', '氣缸', 'Airtac', '雙作用', 'SC32x100', '氣動元件']])
+    report = db.import_catalogs([airtac], workers=1)[airtac]
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 0, 2)
+    report = db.import_catalogs([airtac], on_conflict='upsert', workers=1)[airtac]
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 1, 1)
+    assert [row[3] for row in parts(db)] == ['氣動元件', '氣缸']
+
+
+def test_unreadable_catalog(db, catalogs, tmp_path):
+    xlsx, airtac = catalogs
+    broken = str(tmp_path / 'broken.xlsx')
+    with open(broken, 'wb') as f:
+        f.write(b'not a workbook')
+    reports = db.import_catalogs([broken, airtac, str(tmp_path / 'missing.csv')], workers=2)
+    assert reports[broken]['error'] and reports[str(tmp_path / 'missing.csv')]['error'].startswith('FileNotFoundError')
+    assert reports[airtac]['inserted'] == 2 and reports[airtac]['error'] is None
+
+
+def test_bad_on_conflict(db, catalogs):
+    with pytest.raises(ValueError):
+        db.import_catalogs(list(catalogs), on_conflict='replace')
@@ -0,0 +1,47 @@
+import pytest
+
+
+@pytest.fixture
+def duplicates(db):
+    # one valve entered three times, differently written, and the same spec from another vendor
+    parts = [db.store_part('標準件', name, vendor, 'd', spec, '氣動元件') for name, vendor, spec in [
+        ('兩通手動閥', 'SMC', 'VHK2-08F-08F'),
+        ('兩通手動閥', 'smc', 'vhk2 08f 08f'),
+        ('兩通手動閥', 'ＳＭＣ', 'ＶＨＫ２－０８Ｆ－０８Ｆ'),
+        ('兩通手動閥', 'Airtac', 'VHK2-08F-08F'),
+    ]]
+    m1 = db.store_module('m1', 'Robot')
+    db.store_module_parts_many(m1, [{'id': parts[0], 'quantity': 2}, {'id': parts[1], 'quantity': 3}])
+    m2 = db.store_module('m2', 'Robot')
+    db.store_module_parts_many(m2, [{'id': parts[1], 'quantity': 1}, {'id': parts[2], 'quantity': 4}])
+    station_id = db.store_station('s1')
+    db.store_station_modules_many(station_id, [{'id': m1, 'quantity': 1}, {'id': m2, 'quantity': 2}])
+    return parts, m1, m2, station_id
+
+
+def test_duplicate_parts(db, duplicates):
+    parts, m1, m2, station_id = duplicates
+    groups = db.duplicate_parts()
+    assert list(groups) == [parts[0]]
+    # the most used first, then the oldest
+    assert [(row[0], modules) for row, modules in groups[parts[0]]] == [(parts[1], 2), (parts[0], 1), (parts[2], 1)]
+
+
+def test_merge_parts(db, duplicates):
+    parts, m1, m2, station_id = duplicates
+    assert db.merge_parts(parts[1], [parts[0], parts[1], parts[2]]) == 2
+    assert db.search_module_parts(m1) == [(parts[1], 5)]
+    assert db.search_module_parts(m2) == [(parts[1], 5)]
+    assert db.get_part(parts[0]) is None and db.get_part(parts[2]) is None
+    assert db.get_part(parts[3]) is not None
+    assert [db.get_module(module_id)[3] for module_id in (m1, m2)] == [2, 2]
+    assert db.check_part_totals() == []
+    assert db.duplicate_parts() == {}
+
+
+def test_merge_into_missing_part(db, duplicates):
+    parts, m1, m2, station_id = duplicates
+    with pytest.raises(KeyError):
+        db.merge_parts(999, [parts[0]])
+    assert db.search_module_parts(m1) == [(parts[0], 2), (parts[1], 3)]
+    assert db.get_part(parts[0]) is not None
@@ -0,0 +1,73 @@
+import sqlite3
+
+import parts_database
+from parts_database import PartsDatabase, normalize_spec
+
+LATEST = PartsDatabase.MIGRATIONS[-1][0]
+
+
+def tables(db):
+    db.cursor.execute("SELECT name FROM sqlite_master")
+    return {row[0] for row in db.cursor.fetchall()}
+
+
+def test_fresh_database_is_latest(db):
+    assert db.schema_version() == LATEST
+    assert [version for version, _, _ in PartsDatabase.MIGRATIONS] == list(range(1, LATEST + 1))
+    assert db.migrate(dry_run=True) == []
+    assert db.migrate() == []
+    assert {'parts_fts', 'parts_spec_fts', 'station_part_totals'} <= tables(db)
+
+
+def test_old_database_migrates(tmp_path, monkeypatch):
+    # a database written by a program that knew migrations up to 6, with parts in it
+    path = str(tmp_path / 'old.db')
+    monkeypatch.setattr(PartsDatabase, 'MIGRATIONS', PartsDatabase.MIGRATIONS[:6])
+    old = PartsDatabase(path)
+    old.cursor.executemany("INSERT INTO parts (part_name, part_vendor, part_spec) VALUES (?, ?, ?)",
+                           [('valve', 'SMC', 'VHK2-08F-08F'), ('resistor', 'Yageo', '1.5KΩ')])
+    old.close()
+    monkeypatch.undo()
+    db = PartsDatabase(path, auto_migrate=False)
+    assert db.migrate(dry_run=True) == [(7, PartsDatabase.MIGRATIONS[6][1])]
+    assert [version for version, _ in db.migrate()] == [7]
+    assert db.schema_version() == LATEST
+    db.cursor.execute("SELECT part_spec, part_spec_norm FROM parts")
+    assert all(norm == normalize_spec(spec) for spec, norm in db.cursor.fetchall())
+    assert [row[2] for _, row in db.similar_parts('vhk2 08f 08f', min_ratio=1.0)] == ['valve']
+    assert [row[2] for _, row in db.similar_parts('1.5kΩ', min_ratio=1.0)] == ['resistor']
+    db.close()
+
+
+def test_applied_step_is_skipped(db):
+    # another program migrated between our version check and the write lock
+    db.cursor.execute(f"PRAGMA user_version = {LATEST - 1}")
+    other = sqlite3.connect(db.path)
+    other.execute(f"PRAGMA user_version = {LATEST}")
+    other.close()
+    original = db.schema_version
+    versions = iter([LATEST - 1])
+    db.schema_version = lambda: next(versions, None) or original()
+    assert db.migrate() == [(LATEST, PartsDatabase.MIGRATIONS[-1][1])]
+    db.cursor.execute("SELECT COUNT(*) FROM pragma_table_info('parts') WHERE name = 'part_spec_norm'")
+    assert db.cursor.fetchone()[0] == 1
+
+
+def test_without_fts5(tmp_path, monkeypatch):
+    path = str(tmp_path / 'nofts.db')
+    monkeypatch.setattr(parts_database, 'fts5_trigram_available', lambda: False)
+    db = PartsDatabase(path)
+    assert db.schema_version() == LATEST
+    assert not db.fts_enabled and not db.spec_fts_enabled
+    assert not {'parts_fts', 'parts_spec_fts'} & tables(db)
+    db.store_part('標準件', '三通手動閥', 'SMC', 'd', 'VHK3-08F-08F', '氣動元件')
+    assert [row[2] for row in db.search_part([('part_name', '手動')])] == ['三通手動閥']
+    assert len(db.similar_parts('VHK3-08F-08F', min_ratio=1.0)) == 1
+    db.close()
+    # the next run on a SQLite with FTS5 adds the tables it left out
+    monkeypatch.undo()
+    db = PartsDatabase(path)
+    assert db.fts_enabled and db.spec_fts_enabled
+    assert [row[2] for row in db.search_part([('part_name', '手動')])] == ['三通手動閥']
+    assert len(db.similar_parts('VHK3-08F-08G', min_ratio=0.9)) == 1
+    db.close()
@@ -0,0 +1,34 @@
+import pytest
+
+from parts_database import normalize_spec
+
+
+@pytest.mark.parametrize('spec, other', [
+    ('1.5KΩ', '15KΩ'),
+    ('M6x1.5', 'M6x15'),
+    ('1/2', '12'),
+    ('0.5mm', '05mm'),
+])
+def test_separators_between_digits_are_kept(spec, other):
+    assert normalize_spec(spec) != normalize_spec(other)
+
+
+@pytest.mark.parametrize('spec, other', [
+    ('Ф8', 'Φ8'),
+    ('ф8', 'φ8'),
+    ('⌀8', 'Φ8'),
+    ('VHK2-08F-08F', 'vhk2 08f 08f'),
+    ('VHK2-08F-08F', 'ＶＨＫ２－０８Ｆ－０８Ｆ'),
+    ('M6x1.5', 'Ｍ６ｘ１．５'),
+])
+def test_variants_of_one_spec_are_equal(spec, other):
+    assert normalize_spec(spec) == normalize_spec(other)
+
+
+def test_normalize_spec():
+    assert normalize_spec('1.5KΩ') == '1.5kω'
+    assert normalize_spec('M6x1.5') == 'm6x1.5'
+    assert normalize_spec('1/2"') == '1/2'
+    assert normalize_spec('Ф8') == 'φ8'
+    assert normalize_spec('end.') == 'end'
+    assert normalize_spec(None) == ''
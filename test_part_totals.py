@@ -0,0 +1,48 @@
+def totals(db):
+    db.cursor.execute("SELECT station_id, part_id, quantity FROM station_part_totals")
+    return {(station_id, part_id): quantity for station_id, part_id, quantity in db.cursor.fetchall()}
+
+
+def test_totals_follow_links(db, bom):
+    parts, module_id, station_id = bom
+    assert totals(db) == {(station_id, parts[0]): 6, (station_id, parts[1]): 10}
+    # a second module sharing a part, in the same station and in another one
+    other_id = db.store_module('m2', 'Robot')
+    db.store_module_parts(other_id, parts[0], 1)
+    db.store_station_modules(station_id, other_id, 4)
+    second_id = db.store_station('s2')
+    db.store_station_modules(second_id, module_id, 1)
+    assert totals(db) == {(station_id, parts[0]): 10, (station_id, parts[1]): 10,
+                          (second_id, parts[0]): 3, (second_id, parts[1]): 5}
+    assert db.check_part_totals() == []
+    # quantities changed and links removed on both link tables
+    assert db.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': 7}], [parts[1]], 1) == 2
+    assert db.save_station(station_id, 's1', [{'id': module_id, 'quantity': 1}], [], 2) == 3
+    assert totals(db) == {(station_id, parts[0]): 11, (second_id, parts[0]): 7}
+    assert db.check_part_totals() == []
+    assert db.delete_module(other_id, cascade=True)
+    db.delete_station(second_id)
+    assert totals(db) == {(station_id, parts[0]): 7}
+    assert db.delete_part(parts[0], cascade=True)
+    assert totals(db) == {}
+
+
+def test_null_quantity_counts_as_zero(db, bom):
+    parts, module_id, station_id = bom
+    db.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': None}], [], 1)
+    assert totals(db)[(station_id, parts[0])] == 0
+    db.save_station(station_id, 's1', [{'id': module_id, 'quantity': None}], [], 1)
+    assert totals(db) == {(station_id, parts[0]): 0, (station_id, parts[1]): 0}
+    assert db.check_part_totals() == []
+
+
+def test_check_and_rebuild(db, bom):
+    parts, module_id, station_id = bom
+    db.cursor.execute("UPDATE station_part_totals SET quantity = 1 WHERE part_id = ?", (parts[0],))
+    db.cursor.execute("DELETE FROM station_part_totals WHERE part_id = ?", (parts[1],))
+    db.cursor.execute("INSERT INTO station_part_totals VALUES (?, 999, 1, 1)", (station_id,))
+    assert sorted(db.check_part_totals(), key=lambda row: row[1]) == [
+        (station_id, parts[0], 1, 6), (station_id, parts[1], None, 10), (station_id, 999, 1, None)]
+    assert db.rebuild_part_totals() == 2
+    assert db.check_part_totals() == []
+    assert totals(db) == {(station_id, parts[0]): 6, (station_id, parts[1]): 10}
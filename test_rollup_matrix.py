@@ -0,0 +1,23 @@
+
+def test_rollup_matches_sql(db, bom):
+    parts, module_id, station_id = bom
+    matrix = db.rollup_matrix()
+    assert matrix.rollup({station_id: 1}) == [(parts[0], 6), (parts[1], 10)]
+    assert matrix.rollup({station_id: 3}) == [(part_id, quantity) for part_id, *_, quantity
+                                                in db.rollup_stations({station_id: 3})]
+
+
+def test_null_quantity_counts_as_zero(db, bom):
+    parts, module_id, station_id = bom
+    db.save_module(module_id, 'm1', 'Robot', [{'id': parts[1], 'quantity': None}], [], 1)
+    matrix = db.rollup_matrix()
+    assert matrix.rollup({station_id: 1}) == [(parts[0], 6)]
+    assert [row[-1] for row in db.rollup_stations([station_id])] == [6, 0]
+
+
+def test_refresh_reads_changed_modules(db, bom):
+    parts, module_id, station_id = bom
+    matrix = db.rollup_matrix()
+    db.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': 4}], [parts[1]], 1)
+    assert db.rollup_matrix() is matrix
+    assert matrix.rollup({station_id: 1}) == [(parts[0], 8)]
@@ -0,0 +1,62 @@
+import pytest
+
+from parts_database import ConflictError, PartsDatabase
+
+
+@pytest.fixture
+def other(db):
+    # a second program on the same file
+    other = PartsDatabase(db.path)
+    yield other
+    other.close()
+
+
+def test_save_module_at_revision(db, bom):
+    parts, module_id, station_id = bom
+    assert db.save_module(module_id, 'm1b', 'Conveyor', [{'id': parts[0], 'quantity': 4}], [parts[1]], 1) == 2
+    assert db.get_module(module_id) == (module_id, 'm1b', 'Conveyor', 2)
+    assert db.search_module_parts(module_id) == [(parts[0], 4)]
+
+
+def test_save_module_conflict(db, other, bom):
+    parts, module_id, station_id = bom
+    assert other.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': 9}], [], 1) == 2
+    with pytest.raises(ConflictError):
+        db.save_module(module_id, 'm1b', 'Conveyor', [{'id': parts[0], 'quantity': 4}], [parts[1]], 1)
+    # nothing of the stale save was written
+    assert db.get_module(module_id) == (module_id, 'm1', 'Robot', 2)
+    assert db.search_module_parts(module_id) == [(parts[0], 9), (parts[1], 5)]
+    assert db.check_part_totals() == []
+    # saved again on top of the other program's changes
+    assert db.save_module(module_id, 'm1b', 'Robot', [], [parts[1]], 2) == 3
+
+
+def test_save_station_conflict(db, other, bom):
+    parts, module_id, station_id = bom
+    assert other.save_station(station_id, 's1', [{'id': module_id, 'quantity': 5}], [], 1) == 2
+    with pytest.raises(ConflictError):
+        db.save_station(station_id, 's1b', [], [module_id], 1)
+    assert db.get_station(station_id) == (station_id, 's1', 2)
+    assert db.search_station_modules(station_id) == [(module_id, 5)]
+    assert db.save_station(station_id, 's1b', [], [module_id], 2) == 3
+    assert db.search_station_modules(station_id) == []
+
+
+def test_save_removed(db, other, bom):
+    parts, module_id, station_id = bom
+    other.delete_station(station_id)
+    assert other.delete_module(module_id)
+    with pytest.raises(ConflictError):
+        db.save_module(module_id, 'm1', 'Robot', [], [], 1)
+    with pytest.raises(ConflictError):
+        db.save_station(station_id, 's1', [], [], 1)
+    # without a revision there is nothing to conflict with, only a missing row
+    with pytest.raises(KeyError):
+        db.save_module(module_id, 'm1', 'Robot', [], [], None)
+
+
+def test_save_without_revision(db, other, bom):
+    parts, module_id, station_id = bom
+    other.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': 9}], [], 1)
+    assert db.save_module(module_id, 'm1', 'Robot', [{'id': parts[0], 'quantity': 4}], [], None) == 3
+    assert db.search_module_parts(module_id) == [(parts[0], 4), (parts[1], 5)]
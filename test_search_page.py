@@ -0,0 +1,70 @@
+import pytest
+
+from parts_database import PartsDatabase
+
+
+@pytest.fixture
+def parts(db):
+    # vendors with ties and NULLs, names some of which a search matches
+    vendors = ['SMC', None, 'Misumi', 'SMC', None, 'Airtac', 'Misumi', 'SMC'] * 3
+    db.cursor.executemany("INSERT INTO parts (part_name, part_vendor, part_spec) VALUES (?, ?, ?)",
+                          [(f"valve{i}" if i % 3 else f"cylinder{i}", vendor, f"S-{i}")
+                           for i, vendor in enumerate(vendors)])
+    db.cursor.execute(f"SELECT {', '.join(PartsDatabase.TABLE_COLUMNS['parts'])} FROM parts")
+    return db.cursor.fetchall()
+
+
+def read_all(db, fields_values, sort, descending, page_size):
+    rows, after = db.search_page('parts', fields_values, sort, descending, None, page_size)
+    pages = [rows]
+    while after is not None:
+        assert len(rows) == page_size
+        rows, after = db.search_page('parts', fields_values, sort, descending, after, page_size)
+        pages.append(rows)
+    return [row for page in pages for row in page]
+
+
+def expected(rows, column, descending):
+    # ORDER BY column, part_id: NULLs first ascending and last descending
+    index = PartsDatabase.TABLE_COLUMNS['parts'].index(column)
+    ordered = sorted(rows, key=lambda row: (row[index] is not None, row[index] or '', row[0]))
+    return ordered[::-1] if descending else ordered
+
+
+@pytest.mark.parametrize('page_size', [1, 4, 5, 100])
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('column', ['part_id', 'part_vendor', 'part_name'])
+def test_pages_cover_the_order(db, parts, column, descending, page_size):
+    assert read_all(db, [], column, descending, page_size) == expected(parts, column, descending)
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_of_a_search(db, parts, descending):
+    matching = [row for row in parts if 'valve' in row[2]]
+    assert read_all(db, [('part_name', 'valve')], 'part_vendor', descending, 3) == \
+        expected(matching, 'part_vendor', descending)
+    assert read_all(db, [('part_name', 'valve'), ('part_vendor', 'SMC')], 'part_vendor', descending, 2) == \
+        expected([row for row in matching if row[3] == 'SMC'], 'part_vendor', descending)
+
+
+def test_cursor_survives_inserts(db, parts):
+    # rows added before the cursor do not shift the next page, as OFFSET would
+    first, after = db.search_page('parts', [], 'part_vendor', False, None, 5)
+    db.cursor.execute("INSERT INTO parts (part_name, part_vendor) VALUES ('valve', NULL)")
+    rest = read_all(db, [], 'part_vendor', False, 100)
+    second, _ = db.search_page('parts', [], 'part_vendor', False, after, 5)
+    assert second == rest[rest.index(first[-1]) + 1:][:5]
+
+
+def test_last_page_and_empty_result(db, parts):
+    rows, after = db.search_page('parts', [], 'part_name', False, None, len(parts))
+    assert len(rows) == len(parts)
+    assert db.search_page('parts', [], 'part_name', False, after, len(parts)) == ([], None)
+    assert db.search_page('parts', [('part_name', 'nothing')], 'part_name', False, None, 5) == ([], None)
+
+
+def test_bad_arguments(db, parts):
+    with pytest.raises(ValueError):
+        db.search_page('parts', [], 'part_id; DROP TABLE parts', False, None, 5)
+    with pytest.raises(ValueError):
+        db.search_page('parts', [], 'part_name', False, None, 0)